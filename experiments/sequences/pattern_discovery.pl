@@ -138,14 +138,21 @@ for ($i=0; $i<$config_size; ++$i) {
                     if ($p->{CLUSTER_ALGORITHM}) {
                         my @dist_matrix_batch_jobs = ();
 
+                        # distances are only computed between unique local patterns, the mapping expands them back
+                        my $unique_local_patterns_path = "$grid_config_dir/unique_patterns.json";
+                        my $pattern_mapping_path = "$grid_config_dir/pattern_mapping.json";
+                        my $deduplicate_patterns_job = runjobs([$find_local_patterns_job], "$experiment_prefix/deduplicate_patterns", {SGE_VIRTUAL_FREE => ["4G", "8G"]},
+                                                               ["$p->{PYTHON3} $p->{$SUBGRAPH_PATTERN_MATCHING_PYTHONPATH}/clustering/deduplicate_patterns.py --input_graphs $serialized_local_patterns_path " .
+                                                                "--output_graphs $unique_local_patterns_path --output_mapping $pattern_mapping_path"]);
+
                         my $batch_subdir = "$grid_config_dir/dist_matrices";
-                        my $create_batch_output_dir = runjobs([$find_local_patterns_job], "$experiment_prefix/create_batch_output", { SCRIPT => 1 }, ["mkdir -p $batch_subdir"]);
+                        my $create_batch_output_dir = runjobs([$deduplicate_patterns_job], "$experiment_prefix/create_batch_output", { SCRIPT => 1 }, ["mkdir -p $batch_subdir"]);
 
                         for (my $i = 0; $i < $p->{NUM_BATCHES}; $i++) {
 
                             my $dist_matrix_batch_job = runjobs([$create_batch_output_dir], "$experiment_prefix/dist_matrix_batch/$i", {SGE_VIRTUAL_FREE => ["4G", "8G"]},
                                                     ["$p->{PYTHON3} $p->{$SUBGRAPH_PATTERN_MATCHING_PYTHONPATH}/clustering/distance_matrix_batch.py --num_batches $p->{NUM_BATCHES} " .
-                                                     "--stripe $i --output_file_path $batch_subdir/dist_matrix_split_$i --input_graphs $serialized_local_patterns_path"]);
+                                                     "--stripe $i --output_file_path $batch_subdir/dist_matrix_split_$i --input_graphs $unique_local_patterns_path"]);
                             push(@dist_matrix_batch_jobs, $dist_matrix_batch_job);
                         }
 
@@ -157,12 +164,12 @@ for ($i=0; $i<$config_size; ++$i) {
                         my $clustering_job = runjobs([$combine_matrices_job], "$experiment_prefix/cluster_graphs", {SGE_VIRTUAL_FREE => ["4G"]},
                                                      ["$p->{PYTHON3} $p->{$SUBGRAPH_PATTERN_MATCHING_PYTHONPATH}/clustering/cluster_graphs.py  " .
                                                      "--distance_matrix $grid_config_dir/combined_distance_matrix.np " .
-                                                      "--output $grid_config_dir/labels.json --cluster_option $p->{CLUSTER_ALGORITHM} "]);
+                                                      "--output $grid_config_dir/labels.json --cluster_option $p->{CLUSTER_ALGORITHM} --pattern_mapping $pattern_mapping_path"]);
 
                         my $generalize_patterns_job = runjobs([$clustering_job], "$experiment_prefix/generalize_patterns", {SGE_VIRTUAL_FREE => ["4G"]},
                                      ["$p->{PYTHON3} $p->{$SUBGRAPH_PATTERN_MATCHING_PYTHONPATH}/generalize_patterns.py  " .
                                      "--local_patterns_json $serialized_local_patterns_path --distance_matrix $grid_config_dir/combined_distance_matrix.np " .
-                                      "--labels $grid_config_dir/labels.json --output $grid_config_dir/patterns --strategy $p->{GENERALIZATION_STRATEGY} " .
+                                      "--labels $grid_config_dir/labels.json --pattern_mapping $pattern_mapping_path --output $grid_config_dir/patterns --strategy $p->{GENERALIZATION_STRATEGY} " .
                                       "$p->{MIN_SUPPORT_VECTORS} $p->{MIN_NUM_VERTICES} $p->{MAX_NUM_VERTICES}"]);
                         push(@generalized_patterns_jobs, $generalize_patterns_job);
                     } else {
@@ -1,21 +1,85 @@
+SPLITS = ('TRAIN', 'DEV', 'TEST')
+
+
+class LazySplit():
+    '''annotations of a corpus split, ingested on first access'''
+
+    def __init__(self, iter_annotations=None, annotations=None):
+        '''
+        :param iter_annotations: function() -> iterable of annotation.annotation.Annotation, ingests the split
+        :param annotations: None or list[annotation.annotation.Annotation] of an already ingested split
+        '''
+
+        self._iter_annotations = iter_annotations
+        self._annotations = annotations
+
+    def annotations(self):
+        '''
+        :return: list[annotation.annotation.Annotation], ingested on the first call
+        '''
+
+        if self._annotations is None:
+            self._annotations = list(self._iter_annotations())
+        return self._annotations
+
+    def iter_annotations(self):
+        '''
+        :return: iterator over the annotations, ingesting them one document at a time (without keeping them) unless
+                 they were already materialized
+        '''
+
+        if self._annotations is not None:
+            return iter(self._annotations)
+        return iter(self._iter_annotations())
+
 
 class AnnotationCorpus():
 
     def __init__(self, train_annotations, dev_annotations, test_annotations):
         '''
 
-        :param train_annotations: list[annotation.annotation.Annotation]
-        :param dev_annotations: list[annotation.annotation.Annotation]
-        :param test_annotations: list[annotation.annotation.Annotation]
+        :param train_annotations: list[annotation.annotation.Annotation] or LazySplit
+        :param dev_annotations: list[annotation.annotation.Annotation] or LazySplit
+        :param test_annotations: list[annotation.annotation.Annotation] or LazySplit
+        '''
+
+        self._splits = {}
+        for split, annotations in zip(SPLITS, (train_annotations, dev_annotations, test_annotations)):
+            if not isinstance(annotations, LazySplit):
+                annotations = LazySplit(annotations=annotations)
+            self._splits[split] = annotations
+
+    @property
+    def train_annotations(self):
+        return self.get_annotations('TRAIN')
+
+    @property
+    def dev_annotations(self):
+        return self.get_annotations('DEV')
+
+    @property
+    def test_annotations(self):
+        return self.get_annotations('TEST')
+
+    def get_annotations(self, split):
+        '''
+        :param split: 'TRAIN', 'DEV', 'TEST'
+        :return: list[annotation.annotation.Annotation], the split is ingested on first access
+        '''
+
+        return self._splits[split].annotations()
+
+    def iter_annotations(self, split):
+        '''
+        :param split: 'TRAIN', 'DEV', 'TEST'
+        :return: iterator over the annotations of the split, streamed from ingestion if it wasn't accessed before
         '''
 
-        self.train_annotations = train_annotations
-        self.dev_annotations = dev_annotations
-        self.test_annotations = test_annotations
+        return self._splits[split].iter_annotations()
 
     def get_categories(self):
         categories = set()
-        for annotation in self.train_annotations:
+        for annotation in self.iter_annotations('TRAIN'):
             categories.add(annotation.category)
 
         return list(categories)
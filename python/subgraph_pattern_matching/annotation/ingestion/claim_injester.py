@@ -1,8 +1,10 @@
 from ..annotation_base import ClaimFrameAnnotation, EventTriggerAnnotation, MentionAnnotation
 from ..ingestion.ingester import DocumentIngester
 from ...decode import extract_patterns_from_nx_graph, prepare_patterns, serif_doc_to_nx_graphs
+from ...constants.special_symbols import ID_DELIMITER
 from ...graph_builder import GraphBuilder
 from ...match_wrapper import MatchCorpus
+from ...utils.claim_cache import ClaimCache, pattern_set_fingerprint
 
 AIDA_CLAIMS = {
     'TRAIN': '/nfs/raid83/u13/caml/users/mselvagg_ad/experiments/expts/doc_processing/LDC2021E11.4-8-2022/text_analytics/serifxml/serif_list.train',
@@ -18,8 +20,26 @@ AIDA_CLAIMS_SMALL = {
 
 class ClaimIngester(DocumentIngester):
 
-    def __init__(self, parse_types=None):
-        super().__init__(parse_types=parse_types)
+    def __init__(self, parse_types=None, graph_cache_dir=None, workers=1, claim_cache_dir=None):
+        '''
+        :param claim_cache_dir: None or directory to cache extracted claims in (see utils.claim_cache.ClaimCache),
+                                defaults to graph_cache_dir
+        '''
+
+        super().__init__(parse_types=parse_types, graph_cache_dir=graph_cache_dir, workers=workers)
+        self.prepared_patterns = None  # claim extraction patterns, prepared once on first use
+        self.patterns_fingerprint = None
+
+        claim_cache_dir = claim_cache_dir or graph_cache_dir
+        self.claim_cache = ClaimCache(claim_cache_dir) if claim_cache_dir else None
+
+        # claims are extracted from DP+MDP graphs: reuse the ingested graphs if they have those layers (the extra
+        # layers can't be matched by the claim patterns), otherwise build DP+MDP graphs on the side
+        if self.graph_builder.dp and self.graph_builder.mdp:
+            self.claim_graph_builder = None
+        else:
+            self.claim_graph_builder = GraphBuilder(dp=True, amr=False, mdp=True, tdp=False,
+                                                    graph_cache_dir=graph_cache_dir)
 
     def ingest_aida(self, small=False):
         if small:
@@ -51,21 +71,51 @@ class ClaimIngester(DocumentIngester):
 
         return [token_node_id_to_token_id[token.id] for token in head_node_candidates]
 
-    def docs_to_annotations(self, serif_docs, nx_graphs):
+    def get_prepared_patterns(self):
+        if self.prepared_patterns is None:  # splits are ingested one document at a time
+            self.prepared_patterns = prepare_patterns(add_author_patterns=False)
+            self.patterns_fingerprint = pattern_set_fingerprint(self.prepared_patterns)
+        return self.prepared_patterns
+
+    def extract_claims(self, serif_doc, nx_graph, serifxml_path=None):
+        '''
+        :param nx_graph: ingested graph of serif_doc
+        :param serifxml_path: None or path serif_doc was read from, to read through the claim cache
+        :return: list[(conceiver match node id, event match node id)]
+        '''
+
+        prepared_patterns = self.get_prepared_patterns()
+
+        if self.claim_cache is not None and serifxml_path is not None:
+            claims = self.claim_cache.get(serifxml_path, self.patterns_fingerprint)
+            if claims is not None:
+                return claims
+
+        if self.claim_graph_builder is not None:
+            nx_graph = serif_doc_to_nx_graphs(serif_doc=serif_doc, graph_builder=self.claim_graph_builder,
+                                              serifxml_path=serifxml_path)[0]
+        serif_doc_claim_matches = extract_patterns_from_nx_graph(nx_graph=nx_graph,
+                                                                 serif_doc=serif_doc,
+                                                                 serif_sentence=None,
+                                                                 patterns=prepared_patterns)
+        claims = MatchCorpus(serif_doc_claim_matches).to_conceiver_event_match_node_ids()
+
+        if self.claim_cache is not None and serifxml_path is not None:
+            self.claim_cache.put(serifxml_path, self.patterns_fingerprint, claims)
+
+        return claims
+
+    def docs_to_annotations(self, serif_docs, nx_graphs, serifxml_paths=None):
 
         annotations_for_split = []
-        mdp_gb = GraphBuilder(dp=True, amr=False, mdp=True, tdp=False)  # DP+MDP (for claim extraction) by default
-        prepared_patterns = prepare_patterns(add_author_patterns=False)
-
-        for serif_doc, nx_graph in zip(serif_docs, nx_graphs):
-            mdp_nx_graphs = serif_doc_to_nx_graphs(serif_doc=serif_doc, graph_builder=mdp_gb)
-            serif_doc_claim_matches = extract_patterns_from_nx_graph(nx_graph=mdp_nx_graphs[0],
-                                                                     serif_doc=serif_doc,
-                                                                     serif_sentence=None,
-                                                                     patterns=prepared_patterns)
-
-            serif_doc_claim_match_corpus = MatchCorpus(serif_doc_claim_matches)
-            conceiver_event_mtras = serif_doc_claim_match_corpus.to_mtra_pairs()
+        if serifxml_paths is None:
+            serifxml_paths = [None] * len(serif_docs)
+
+        for serif_doc, nx_graph, serifxml_path in zip(serif_docs, nx_graphs, serifxml_paths):
+            conceiver_event_mtras = [(serif_doc.lookup_id(conceiver_node_id.split(ID_DELIMITER)[-1]),
+                                      serif_doc.lookup_id(event_node_id.split(ID_DELIMITER)[-1]))
+                                     for conceiver_node_id, event_node_id
+                                     in self.extract_claims(serif_doc, nx_graph, serifxml_path=serifxml_path)]
             for (conceiver_mtra, event_mtra) in conceiver_event_mtras:
 
                 if conceiver_mtra.mention is None or event_mtra.event_mention is None:
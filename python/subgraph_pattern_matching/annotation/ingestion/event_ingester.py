@@ -23,8 +23,8 @@ AIDA_TEST = {
 
 class EventIngester(DocumentIngester):
 
-    def __init__(self, parse_types=None):
-        super().__init__(parse_types=parse_types)
+    def __init__(self, parse_types=None, graph_cache_dir=None, workers=1):
+        super().__init__(parse_types=parse_types, graph_cache_dir=graph_cache_dir, workers=workers)
 
     def ingest_ace(self, language='english'):
 
@@ -38,7 +38,7 @@ class EventIngester(DocumentIngester):
     def ingest_aida(self):
         return self.ingest_serifxmls_from_list(AIDA_TEST)
 
-    def docs_to_annotations(self, serif_docs, nx_graphs):
+    def docs_to_annotations(self, serif_docs, nx_graphs, serifxml_paths=None):
 
         annotations_for_split = []
 
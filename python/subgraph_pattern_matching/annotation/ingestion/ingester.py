@@ -1,46 +1,129 @@
+import math
+import multiprocessing
 from abc import ABC
 from abc import abstractmethod
 
-from annotation.annotation_corpus import AnnotationCorpus
+from annotation.annotation_corpus import AnnotationCorpus, LazySplit
 from graph_builder import GraphBuilder
 from tqdm import tqdm
+from utils.graph_encoding import decode_graph, encode_graph
 
 import serifxml3
 
 
+# per-process state of ingest workers, set up once by init_ingest_worker
+_worker_state = {}
+
+
+def init_ingest_worker(graph_builder_kwargs, serifxml_path=None):
+    '''
+    :param graph_builder_kwargs: kwargs to build the worker's graph_builder.GraphBuilder with
+    :param serifxml_path: None or path of a single (large) serifxml whose sentences the worker converts in chunks
+    '''
+
+    _worker_state['graph_builder'] = GraphBuilder(**graph_builder_kwargs)
+    if serifxml_path is not None:
+        _worker_state['serif_doc'] = serifxml3.Document(serifxml_path)
+        _worker_state['amr_relations_cache'] = {}
+
+
+def build_document_graph_in_worker(serifxml_path):
+    '''
+    :param serifxml_path: path of a serifxml
+    :return: document graph in the encoding of utils.graph_encoding.encode_graph
+    '''
+
+    serif_doc = serifxml3.Document(serifxml_path)
+    nx_graph = _worker_state['graph_builder'].serif_doc_to_networkx(serif_doc, serifxml_path=serifxml_path)
+
+    return encode_graph(nx_graph)
+
+
+def build_sentence_graphs_in_worker(sentence_range):
+    '''
+    :param sentence_range: (start, end) indices of sentences of the worker's serifxml
+    :return: list of sentence graphs in the encoding of utils.graph_encoding.encode_graph
+    '''
+
+    start, end = sentence_range
+    graph_builder = _worker_state['graph_builder']
+    amr_relations_cache = _worker_state['amr_relations_cache']
+
+    return [encode_graph(graph_builder.serif_sentence_to_networkx(serif_sentence, amr_relations_cache=amr_relations_cache))
+            for serif_sentence in _worker_state['serif_doc'].sentences[start:end]]
+
+
 class Ingester(ABC):
 
-    def __init__(self, parse_types=None):
+    def __init__(self, parse_types=None, graph_cache_dir=None, workers=1):
         '''
         :param parse_types: None or {'dp': True, 'mdp': False, 'tdp': False, 'amr': True}
+        :param graph_cache_dir: None or directory to cache built graphs in (see utils.graph_cache.GraphCache)
+        :param workers: number of processes to build graphs with
         '''
 
         if not parse_types:
-            self.graph_builder = GraphBuilder(dp=True, amr=True, mdp=False, tdp=False)
+            self.graph_builder_kwargs = dict(dp=True, amr=True, mdp=False, tdp=False, graph_cache_dir=graph_cache_dir)
         else:  # custom parse types
-            self.graph_builder = GraphBuilder(**parse_types)
+            self.graph_builder_kwargs = dict(graph_cache_dir=graph_cache_dir, **parse_types)
+        self.graph_builder = GraphBuilder(**self.graph_builder_kwargs)
+        self.workers = workers
 
 
 class SentenceIngester(Ingester):
 
-    def __init__(self, parse_types=None):
-        super().__init__(parse_types=parse_types)
+    def __init__(self, parse_types=None, graph_cache_dir=None, workers=1):
+        super().__init__(parse_types=parse_types, graph_cache_dir=graph_cache_dir, workers=workers)
 
     def ingest_serifxml(self, data):
-        train_serif_doc = serifxml3.Document(data['TRAIN'])
-        train_nx_graphs = self.graph_builder.serif_doc_to_networkx_per_sentence(train_serif_doc)
+        '''
+        :param data: {'TRAIN': serifxml path, 'DEV': serifxml path, 'TEST': serifxml path}
+        :return: annotation.annotation_corpus.AnnotationCorpus whose splits are ingested on first access
+        '''
 
-        dev_serif_doc = serifxml3.Document(data['DEV'])
-        dev_nx_graphs = self.graph_builder.serif_doc_to_networkx_per_sentence(dev_serif_doc)
+        # train_annotations = LazySplit(lambda: self.iter_split_annotations(data['TRAIN']))
+        # dev_annotations = LazySplit(lambda: self.iter_split_annotations(data['DEV']))
+        test_annotations = LazySplit(lambda: self.iter_split_annotations(data['TEST']))
 
-        test_serif_doc = serifxml3.Document(data['TEST'])
-        test_nx_graphs = self.graph_builder.serif_doc_to_networkx_per_sentence(test_serif_doc)
+        return AnnotationCorpus(test_annotations, test_annotations, test_annotations)
 
-        # train_annotations = self.split_to_annotations(train_serif_doc, train_nx_graphs)
-        # dev_annotations = self.split_to_annotations(dev_serif_doc, dev_nx_graphs)
-        test_annotations = self.split_to_annotations(test_serif_doc, test_nx_graphs)
+    def iter_split_annotations(self, serifxml_path):
+        '''
+        :param serifxml_path: path of the serifxml holding every sentence of a split
+        :return: generator of annotation.annotation.Annotation
+        '''
 
-        return AnnotationCorpus(test_annotations, test_annotations, test_annotations)
+        serif_doc = serifxml3.Document(serifxml_path)
+        nx_graphs = self.get_nx_graphs_per_sentence(serif_doc, serifxml_path)
+
+        yield from self.split_to_annotations(serif_doc, nx_graphs)
+
+    def get_nx_graphs_per_sentence(self, serif_doc, serifxml_path):
+        '''
+        :param serif_doc: serifxml3.serif.theory.Document read from serifxml_path
+        :param serifxml_path: path of the serifxml
+        :return: list[networkx.classes.digraph.DiGraph], one per sentence
+        '''
+
+        if self.workers <= 1:
+            return self.graph_builder.serif_doc_to_networkx_per_sentence(serif_doc, serifxml_path=serifxml_path)
+
+        def build_graphs():
+            # every worker reads the serifxml once and converts chunks of its sentences
+            num_sentences = len(serif_doc.sentences)
+            chunk_size = max(1, math.ceil(num_sentences / (self.workers * 4)))
+            sentence_ranges = [(start, min(start + chunk_size, num_sentences))
+                               for start in range(0, num_sentences, chunk_size)]
+
+            nx_graphs = []
+            with multiprocessing.Pool(self.workers, initializer=init_ingest_worker,
+                                      initargs=(self.graph_builder_kwargs, serifxml_path)) as pool:
+                for encoded_graphs in tqdm(pool.imap(build_sentence_graphs_in_worker, sentence_ranges),
+                                           total=len(sentence_ranges), desc='building nx graphs from serif'):
+                    nx_graphs.extend(decode_graph(encoded_graph) for encoded_graph in encoded_graphs)
+            return nx_graphs
+
+        return self.graph_builder.read_through_graph_cache(serifxml_path, per_sentence=True, build_graphs=build_graphs)
 
     @abstractmethod
     def split_to_annotations(self, split_serif_doc, split_nx_graphs):
@@ -55,39 +138,74 @@ class SentenceIngester(Ingester):
 
 class DocumentIngester(Ingester):
 
-    def __init__(self, parse_types=None):
-        super().__init__(parse_types=parse_types)
+    def __init__(self, parse_types=None, graph_cache_dir=None, workers=1):
+        super().__init__(parse_types=parse_types, graph_cache_dir=graph_cache_dir, workers=workers)
 
     def ingest_serifxmls_from_list(self, data):
-        train_serif_docs, train_nx_graphs = self.get_nx_graphs_from_serif_list(data['TRAIN'])
-        dev_serif_docs, dev_nx_graphs = self.get_nx_graphs_from_serif_list(data['DEV'])
-        test_serif_docs, test_nx_graphs = self.get_nx_graphs_from_serif_list(data['TEST'])
+        '''
+        :param data: {'TRAIN': serifxml list path, 'DEV': serifxml list path, 'TEST': serifxml list path}
+        :return: annotation.annotation_corpus.AnnotationCorpus whose splits are ingested on first access
+        '''
 
-        train_annotations = self.docs_to_annotations(train_serif_docs, train_nx_graphs)
-        dev_annotations = self.docs_to_annotations(dev_serif_docs, dev_nx_graphs)
-        test_annotations = self.docs_to_annotations(test_serif_docs, test_nx_graphs)
+        train_annotations = LazySplit(lambda: self.iter_split_annotations(data['TRAIN']))
+        dev_annotations = LazySplit(lambda: self.iter_split_annotations(data['DEV']))
+        test_annotations = LazySplit(lambda: self.iter_split_annotations(data['TEST']))
 
         return AnnotationCorpus(train_annotations, dev_annotations, test_annotations)
 
+    def iter_split_annotations(self, serif_list):
+        '''
+        :param serif_list: path of a list of the serifxmls of a split
+        :return: generator of annotation.annotation.Annotation, ingesting one document at a time
+        '''
+
+        for serifxml_path, serif_doc, nx_graph in self.iter_nx_graphs_from_serif_list(serif_list):
+            yield from self.docs_to_annotations([serif_doc], [nx_graph], serifxml_paths=[serifxml_path])
+
     def get_nx_graphs_from_serif_list(self, serif_list):
         serif_docs = []
         nx_graphs = []
+        for _, serif_doc, nx_graph in self.iter_nx_graphs_from_serif_list(serif_list):
+            serif_docs.append(serif_doc)
+            nx_graphs.append(nx_graph)
+        return serif_docs, nx_graphs
+
+    def iter_nx_graphs_from_serif_list(self, serif_list):
+        '''
+        :param serif_list: path of a list of serifxmls
+        :return: generator of (serifxml path, serifxml3.serif.theory.Document, networkx.classes.digraph.DiGraph) in list
+                 order
+        '''
+
         with open(serif_list, 'r') as serif_list_file:
             lines = serif_list_file.readlines()
-            for line in tqdm(lines, desc='building nx graphs from serif'):
-                serif_doc = serifxml3.Document(line.strip())
-                nx_graph = self.graph_builder.serif_doc_to_networkx(serif_doc)
-                nx_graphs.append(nx_graph)
-                serif_docs.append(serif_doc)
-        return serif_docs, nx_graphs
+
+        if self.workers > 1:
+            # workers read and convert documents ahead, while the serif docs for the annotations are read here
+            serifxml_paths = [line.strip() for line in lines]
+            with multiprocessing.Pool(self.workers, initializer=init_ingest_worker,
+                                      initargs=(self.graph_builder_kwargs,)) as pool:
+                encoded_graphs = pool.imap(build_document_graph_in_worker, serifxml_paths)
+                for serifxml_path, encoded_graph in tqdm(zip(serifxml_paths, encoded_graphs),
+                                                         total=len(serifxml_paths),
+                                                         desc='building nx graphs from serif'):
+                    yield serifxml_path, serifxml3.Document(serifxml_path), decode_graph(encoded_graph)
+            return
+
+        for line in tqdm(lines, desc='building nx graphs from serif'):
+            serifxml_path = line.strip()
+            serif_doc = serifxml3.Document(serifxml_path)
+            nx_graph = self.graph_builder.serif_doc_to_networkx(serif_doc, serifxml_path=serifxml_path)
+            yield serifxml_path, serif_doc, nx_graph
 
     @abstractmethod
-    def docs_to_annotations(self, serif_docs, nx_graphs):
+    def docs_to_annotations(self, serif_docs, nx_graphs, serifxml_paths=None):
         '''
 
 
         :param serif_docs: list[serifxml3.serif.theory.Document]
         :param nx_graphs: list[networkx.classes.digraph.DiGraph]
+        :param serifxml_paths: None or list of the paths the serif_docs were read from (for caching derived annotations)
         :return: annotation.annotation_corpus.AnnotationCorpus
         '''
         pass
\ No newline at end of file
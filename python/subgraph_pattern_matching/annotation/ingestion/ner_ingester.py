@@ -17,8 +17,8 @@ CONLL_SPANISH = {
 
 class NERIngester(SentenceIngester):
 
-    def __init__(self, parse_types=None):
-        super().__init__(parse_types=parse_types)
+    def __init__(self, parse_types=None, graph_cache_dir=None, workers=1):
+        super().__init__(parse_types=parse_types, graph_cache_dir=graph_cache_dir, workers=workers)
 
     def ingest_conll(self, language='english'):
 
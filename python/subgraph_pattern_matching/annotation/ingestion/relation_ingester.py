@@ -11,8 +11,8 @@ TACRED = {
 
 class RelationIngester(SentenceIngester):
 
-    def __init__(self, parse_types=None):
-        super().__init__(parse_types=parse_types)
+    def __init__(self, parse_types=None, graph_cache_dir=None, workers=1):
+        super().__init__(parse_types=parse_types, graph_cache_dir=graph_cache_dir, workers=workers)
 
     def ingest_tacred(self):
         return self.ingest_serifxml(TACRED)
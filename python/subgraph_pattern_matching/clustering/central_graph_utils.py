@@ -29,6 +29,23 @@ def get_biggest_graph_per_cluster(labels, digraph_list):
     return cluster_num_to_largest_graph_index
 
 
+# Returns the clusters whose total distances (see get_central_graph_per_cluster) include distances that are only lower
+# bounds (see condensed_distance_matrix.load_exact_flags)
+def get_clusters_with_bounded_distances(labels, exact):
+
+    cluster_lists = {}
+    for i, label in enumerate(labels):
+        if label != -1:
+            cluster_lists.setdefault(label, []).append(i)
+
+    bounded_clusters = []
+    for cluster_num, cluster_list in cluster_lists.items():
+        if any(not all(exact[graph_index][cluster_list]) for graph_index in cluster_list):
+            bounded_clusters.append(cluster_num)
+
+    return bounded_clusters
+
+
 # Returns the index of the most central graph in each cluster
 def get_central_graph_per_cluster(labels, distance_matrix):
 
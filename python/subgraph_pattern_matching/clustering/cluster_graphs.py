@@ -3,9 +3,15 @@ import enum
 import json
 
 import numpy as np
+from condensed_distance_matrix import CondensedDistanceMatrix, load_distance_cutoff, load_distance_matrix, \
+    load_exact_flags
 from kneed import KneeLocator
+from pattern_mapping import PatternMapping
 from sklearn.cluster import DBSCAN
-from sklearn.neighbors import NearestNeighbors
+
+
+# entries of the distance matrix searched for nearest neighbors at a time, bounds the memory of the temporary arrays
+NEAREST_NEIGHBOR_BLOCK_ENTRIES = 1 << 22
 
 
 class ClusterOptions(enum.Enum):
@@ -37,14 +43,62 @@ def group_identical_structures(distance_matrix):
 
     return labels
 
-def dbscan_cluster(distance_matrix):
+def nearest_neighbor_distances(distance_matrix, weights):
+    '''
+    Distance of every pattern to its nearest neighbor (the 2nd nearest point, the 1st being the pattern itself), as if
+    every unique structure were repeated weights times
+
+    :param distance_matrix: square ndarray of distances between unique structures
+    :param weights: ndarray, number of patterns of every unique structure
+    :return: sorted ndarray with one distance per pattern
+    '''
+
+    row_len = len(distance_matrix)
+    block_rows = max(1, NEAREST_NEIGHBOR_BLOCK_ENTRIES // max(1, row_len))
+
+    distances = np.empty(row_len, dtype=distance_matrix.dtype)
+    for block_start in range(0, row_len, block_rows):
+        block = distance_matrix[block_start:block_start + block_rows]
+
+        nearest = block.min(axis=1)
+        at_nearest = block == nearest[:, None]
+        second_nearest = np.where(at_nearest, np.inf, block).min(axis=1)
+        # the nearest distance is also the 2nd nearest if two patterns are at it, e.g. the pattern and a duplicate of it
+        distances[block_start:block_start + len(block)] = np.where(at_nearest @ weights >= 2, nearest, second_nearest)
+
+    return np.sort(np.repeat(distances, weights))
+
+
+def count_bounded_within(distance_matrix, exact, epsilon):
+    '''
+    :param distance_matrix: square ndarray or condensed_distance_matrix.CondensedDistanceMatrix
+    :param exact: matching bools of whether each distance is exact (see condensed_distance_matrix.load_exact_flags)
+    :return: int, number of entries at most epsilon that are only lower bounds, i.e. that DBSCAN can't trust
+    '''
+
+    count = 0
+    for row, exact_row in zip(distance_matrix, exact):
+        count += int(np.count_nonzero((np.asarray(row) <= epsilon) & ~np.asarray(exact_row, dtype=bool)))
+    return count
+
+
+def dbscan_cluster(distance_matrix, weights=None, exact=None, distance_cutoff=None):
+    '''
+    :param distance_matrix: square ndarray or condensed_distance_matrix.CondensedDistanceMatrix
+    :param weights: None or ndarray, number of patterns of every row (see pattern_mapping.PatternMapping), each row
+                    counts as that many identical samples
+    :param exact: None or matching bools of whether each distance is exact rather than a lower bound
+    :param distance_cutoff: None or float, the cutoff the distances were computed with, above which they may be bounds
+    :return: list[int], cluster label of every row
+    '''
+
+    if isinstance(distance_matrix, CondensedDistanceMatrix):  # sklearn needs the square matrix
+        distance_matrix = distance_matrix.to_square()
+    if weights is None:
+        weights = np.ones(len(distance_matrix), dtype=int)
 
     # Finds elbow point of NearestNeighbors graph to find optimal epsilon value
-    neigh = NearestNeighbors(n_neighbors=2, metric="precomputed")
-    nbrs = neigh.fit(distance_matrix)
-    distances, indices = nbrs.kneighbors(distance_matrix)
-    distances = np.sort(distances, axis=0)
-    distances = distances[:, 1]
+    distances = nearest_neighbor_distances(distance_matrix, weights)
     kneedle = KneeLocator([i for i in range(len(distances))], distances, S=1.0, curve="convex", direction="increasing")
     # kneedle.plot_knee()
     # plt.show()
@@ -53,8 +107,21 @@ def dbscan_cluster(distance_matrix):
     if epsilon <= 0:
         epsilon = 5
 
+    if distance_cutoff is not None:
+        num_above_cutoff = int(np.count_nonzero(distances > distance_cutoff))
+        if num_above_cutoff:
+            print("{} of {} nearest neighbor distances are above the distance cutoff {} and may be lower bounds".format(
+                num_above_cutoff, len(distances), distance_cutoff))
+        if epsilon > distance_cutoff:
+            print("Warning: epsilon {} is above the distance cutoff {}".format(epsilon, distance_cutoff))
+    if exact is not None:
+        num_bounded = count_bounded_within(distance_matrix, exact, epsilon)
+        if num_bounded:
+            raise ValueError("{} distances within epsilon {} are only lower bounds, recompute the distance matrix with "
+                             "a --distance_cutoff of at least {}".format(num_bounded, epsilon, epsilon))
+
     clustering = DBSCAN(eps=epsilon, min_samples=5, metric="precomputed")
-    clustering.fit(distance_matrix)
+    clustering.fit(distance_matrix, sample_weight=weights)
 
     core_samples_mask = np.zeros_like(clustering.labels_, dtype=bool)
     core_samples_mask[clustering.core_sample_indices_] = True
@@ -62,7 +129,7 @@ def dbscan_cluster(distance_matrix):
 
     # Number of clusters in labels, ignoring noise if present
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
-    n_noise = list(labels).count(-1)
+    n_noise = int(weights[labels == -1].sum())
 
     print("Estimated number of clusters: {}".format(n_clusters))
     print("Estimated number of noise points: {}".format(n_noise))
@@ -70,24 +137,42 @@ def dbscan_cluster(distance_matrix):
     return labels.tolist()
 
 
-def cluster_patterns(distance_matrix, cluster_option=ClusterOptions.DBSCAN):
+def cluster_patterns(distance_matrix, cluster_option=ClusterOptions.DBSCAN, pattern_mapping=None, exact=None,
+                     distance_cutoff=None):
+    '''
+    :param distance_matrix: square ndarray or condensed_distance_matrix.CondensedDistanceMatrix
+    :param cluster_option: ClusterOptions.X
+    :param pattern_mapping: None or pattern_mapping.PatternMapping if distance_matrix is between unique structures
+    :param exact: None or matching bools of whether each distance is exact rather than a lower bound
+    :param distance_cutoff: None or float, the cutoff the distances were computed with
+    :return: list[int], cluster label of every pattern
+    '''
+
+    weights = pattern_mapping.weights if pattern_mapping is not None else None
 
     if cluster_option == ClusterOptions.DBSCAN:
-        labels = dbscan_cluster(distance_matrix)
+        labels = dbscan_cluster(distance_matrix, weights, exact=exact, distance_cutoff=distance_cutoff)
     elif cluster_option == ClusterOptions.IdenticalStructures:
+        # duplicates share every distance, so grouping unique structures groups their patterns alike; lower bounds
+        #  are above a (non-negative) cutoff, so never 0
         labels = group_identical_structures(distance_matrix)
     else:
         raise NotImplementedError("Cluster method {} not implemented".format(cluster_option))
 
+    if pattern_mapping is not None:
+        labels = pattern_mapping.expand_labels(labels)
+
     return labels
 
 
 def main(args):
 
-    with open(args.distance_matrix, 'rb') as f:
-        distance_matrix = np.load(f)
+    distance_matrix = load_distance_matrix(args.distance_matrix)
+    pattern_mapping = PatternMapping.load(args.pattern_mapping) if args.pattern_mapping else None
 
-    labels = cluster_patterns(distance_matrix, ClusterOptions[args.cluster_option])
+    labels = cluster_patterns(distance_matrix, ClusterOptions[args.cluster_option], pattern_mapping,
+                              exact=load_exact_flags(args.distance_matrix),
+                              distance_cutoff=load_distance_cutoff(args.distance_matrix))
 
     with open(args.output, 'w') as f:
         json.dump(labels, f, indent=4)
@@ -99,6 +184,9 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--distance_matrix', type=str, required=True)
     parser.add_argument('-o', '--output', type=str, required=True)
     parser.add_argument('-c', '--cluster_option', type=str, default="DBSCAN")
+    parser.add_argument('--pattern_mapping', type=str, default=None,
+                        help='json PatternMapping from deduplicate_patterns.py if the distance matrix is between '
+                             'unique local patterns, labels are written for every local pattern')
     args = parser.parse_args()
 
     main(args)
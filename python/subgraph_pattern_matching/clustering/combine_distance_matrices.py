@@ -2,30 +2,127 @@ import argparse
 import os
 
 import numpy as np
+from condensed_distance_matrix import CondensedDistanceMatrix, exact_path, load_distance_cutoff, row_offset, \
+    save_distance_cutoff, size_from_condensed_size
 
 
-def combine_distance_matrices(distance_matrices, num_batches):
+# entries of the output combined per chunk of rows, bounds the memory of the chunk's index arrays
+BLOCK_ENTRIES = 1 << 21
+
+
+def default_block_rows(row_len):
+    return max(1, BLOCK_ENTRIES // max(1, row_len))
+
+
+def combine_distance_matrices(distance_matrices, num_batches, block_rows=None):
+    '''
+    :param distance_matrices: list of the square distance matrices of the stripes (of distance_metrics.
+                              create_distance_matrix), in stripe order; only a chunk of rows of each is read at a time,
+                              so they can be memory-mapped
+    :param num_batches: int
+    :param block_rows: None or number of rows combined at a time
+    :return: square float ndarray
+    '''
+
     row_len = distance_matrices[0].shape[0]
+    block_rows = block_rows or default_block_rows(row_len)
 
     combined_distance_matrix = np.empty((row_len, row_len), float)
-    for i in range(row_len):
-        for j in range(i, row_len):
-            batch_num = (i * row_len + j) % num_batches
-            combined_distance_matrix[i][j] = distance_matrices[batch_num][i][j]
-            if j != i:
-                combined_distance_matrix[j][i] = combined_distance_matrix[i][j]
+    combined_flat = combined_distance_matrix.reshape(-1)
+
+    for block_start in range(0, row_len, block_rows):
+        block_end = min(block_start + block_rows, row_len)
+        flat_start, flat_end = block_start * row_len, block_end * row_len
+
+        # stripe batch_num owns the entries whose flat index i * row_len + j is batch_num modulo num_batches, i.e.
+        #  every num_batches-th entry of the chunk (entries below the diagonal are overwritten below)
+        for batch_num, distance_matrix in enumerate(distance_matrices):
+            first = flat_start + (batch_num - flat_start) % num_batches
+            combined_flat[first:flat_end:num_batches] = distance_matrix.reshape(-1)[first:flat_end:num_batches]
+
+        # mirror the upper triangle: columns left of the chunk come from the (already combined) rows above it
+        combined_distance_matrix[block_start:block_end, :block_start] = \
+            combined_distance_matrix[:block_start, block_start:block_end].T
+        diagonal_block = combined_distance_matrix[block_start:block_end, block_start:block_end]
+        lower = np.tril_indices(block_end - block_start, -1)
+        diagonal_block[lower] = diagonal_block.T[lower]
 
     return combined_distance_matrix
 
+def combine_stripe_distances(stripe_distances, num_batches, output_file_path, block_rows=None):
+    '''
+    :param stripe_distances: list of the 1D stripe distances (or exact flags) of distance_metrics.
+                             create_stripe_distances, in stripe order; only a chunk of each is read at a time, so they
+                             can be memory-mapped
+    :param num_batches: int
+    :param output_file_path: str, .npy file the condensed distance matrix is written to (through a memory map)
+    :param block_rows: None or number of rows combined at a time
+    :return: condensed_distance_matrix.CondensedDistanceMatrix
+    '''
+
+    row_len = size_from_condensed_size(sum(len(distances) for distances in stripe_distances))
+    block_rows = block_rows or default_block_rows(row_len)
+
+    combined_distance_matrix = CondensedDistanceMatrix.create(output_file_path, row_len, dtype=stripe_distances[0].dtype)
+    combined_values = combined_distance_matrix.values
+
+    stripe_positions = [0] * num_batches  # next distance of each stripe (stripes hold their entries in row order)
+    for block_start in range(0, row_len, block_rows):
+        block_end = min(block_start + block_rows, row_len)
+        condensed_start, condensed_end = row_offset(block_start, row_len), row_offset(block_end, row_len)
+
+        # (i, j) and owning stripe of every entry of the chunk's rows of the upper triangle
+        rows = np.arange(block_start, block_end)
+        row_lengths = row_len - rows
+        i = np.repeat(rows, row_lengths)
+        j = np.arange(condensed_start, condensed_end) - np.repeat(row_offset(rows, row_len), row_lengths) + i
+        owners = (i * row_len + j) % num_batches
+
+        # entries of the chunk grouped by owner, each group in row order like the stripe's own distances
+        owner_order = np.argsort(owners.astype(np.uint16) if num_batches <= 1 << 16 else owners, kind='stable')
+        owner_counts = np.bincount(owners, minlength=num_batches)
+
+        block = np.empty(condensed_end - condensed_start, combined_values.dtype)
+        group_start = 0
+        for stripe, distances in enumerate(stripe_distances):
+            count = owner_counts[stripe]
+            block[owner_order[group_start:group_start + count]] = \
+                distances[stripe_positions[stripe]:stripe_positions[stripe] + count]
+            stripe_positions[stripe] += count
+            group_start += count
+        combined_values[condensed_start:condensed_end] = block
+
+    for stripe, distances in enumerate(stripe_distances):
+        assert stripe_positions[stripe] == len(distances), \
+            "stripe {} doesn't hold a distance matrix of {} rows".format(stripe, row_len)
+
+    combined_values.flush()
+    return combined_distance_matrix
+
+
 def main(args):
 
-    distance_matrices = []
-    for index in range(args.num_batches):
-        with open(os.path.join(args.input_dir_path, "dist_matrix_split_{}".format(index)), 'rb') as f:
-            dist_matrix = np.load(f)
-            distance_matrices.append(dist_matrix)
+    stripe_paths = [os.path.join(args.input_dir_path, "dist_matrix_split_{}".format(index))
+                    for index in range(args.num_batches)]
+    distance_matrices = [np.load(stripe_path, mmap_mode='r') for stripe_path in stripe_paths]
+
+    if distance_matrices[0].ndim == 1:  # condensed stripes
+        combine_stripe_distances(distance_matrices, args.num_batches, args.output_file_path,
+                                 block_rows=args.block_rows)
+
+        # stripes computed with a distance cutoff flag which of their distances are exact
+        if all(os.path.exists(exact_path(stripe_path)) for stripe_path in stripe_paths):
+            distance_cutoffs = set(load_distance_cutoff(stripe_path) for stripe_path in stripe_paths)
+            if len(distance_cutoffs) != 1:
+                raise ValueError("stripes were computed with different distance cutoffs: {}".format(distance_cutoffs))
+            combine_stripe_distances([np.load(exact_path(stripe_path), mmap_mode='r') for stripe_path in stripe_paths],
+                                     args.num_batches, exact_path(args.output_file_path), block_rows=args.block_rows)
+            save_distance_cutoff(args.output_file_path, distance_cutoffs.pop())
+        return
 
-    combined_distance_matrix = combine_distance_matrices(distance_matrices, args.num_batches)
+    # square matrices of older stripe jobs
+    combined_distance_matrix = combine_distance_matrices(distance_matrices, args.num_batches,
+                                                         block_rows=args.block_rows)
 
     with open(args.output_file_path, 'wb') as f:
         np.save(f, combined_distance_matrix)
@@ -36,6 +133,8 @@ if __name__ == '__main__':
     parser.add_argument('--num_batches', type=int, required=True)
     parser.add_argument('--input_dir_path', type=str, required=True)
     parser.add_argument('--output_file_path', type=str, required=True)
+    parser.add_argument('--block_rows', type=int, default=None, help='rows to combine at a time (default: about '
+                                                                      '{} entries)'.format(BLOCK_ENTRIES))
     args = parser.parse_args()
 
     main(args)
@@ -0,0 +1,219 @@
+import json
+import math
+import os
+
+import numpy as np
+
+
+# distances are stored as float32: half the size of float64, and far more precise than the edit distances need
+DISTANCE_DTYPE = np.float32
+
+
+def condensed_size(n):
+    '''
+    :param n: int, number of rows of the square distance matrix
+    :return: int, number of entries of its upper triangle (including the diagonal)
+    '''
+
+    return n * (n + 1) // 2
+
+
+def size_from_condensed_size(size):
+    '''
+    :param size: int, output of condensed_size
+    :return: int, number of rows of the square distance matrix
+    '''
+
+    n = (math.isqrt(8 * size + 1) - 1) // 2
+    if condensed_size(n) != size:
+        raise ValueError("{} is not the size of a condensed distance matrix".format(size))
+    return n
+
+
+def row_offset(i, n):
+    '''
+    :param i: int or ndarray of row indices
+    :param n: int, number of rows of the square distance matrix
+    :return: condensed index of (i, i), the first entry of row i of the upper triangle
+    '''
+
+    return i * n - i * (i - 1) // 2
+
+
+def stripe_columns(i, n, stripe, num_batches):
+    '''
+    Columns j >= i of row i owned by stripe, i.e. with (i * n + j) % num_batches == stripe
+
+    :return: ndarray of column indices
+    '''
+
+    first_j = i + (stripe - i * n - i) % num_batches
+    return np.arange(first_j, n, num_batches)
+
+
+def stripe_size(n, stripe, num_batches):
+    '''
+    :return: int, number of upper triangle entries owned by stripe
+    '''
+
+    i = np.arange(n)
+    first_j = i + (stripe - i * n - i) % num_batches
+    return int(np.maximum(0, (n - first_j + num_batches - 1) // num_batches).sum())
+
+
+class CondensedDistanceMatrix():
+    '''
+    Symmetric n x n distance matrix stored as its upper triangle (including the diagonal), row by row, in a 1D float32
+    array of condensed_size(n) entries: usually a .npy file memory-mapped with np.load(path, mmap_mode='r'), so
+    entries and rows are read from disk as needed instead of loading (or writing) the whole square matrix.
+
+    Supports the ndarray operations the clustering code uses: len, shape, iterating over rows, [i] (a row) and [i, j].
+    '''
+
+    def __init__(self, values):
+        '''
+        :param values: 1D ndarray (or memmap) of condensed_size(n) distances
+        '''
+
+        self.values = values
+        self.n = size_from_condensed_size(len(values))
+
+    @classmethod
+    def create(cls, path, n, dtype=DISTANCE_DTYPE):
+        '''
+        :param path: str, .npy file to create, filled with nan (distances not yet written), or zeros for non-float dtypes
+        :param n: int, number of rows of the square distance matrix
+        :param dtype: numpy dtype of the entries, e.g. bool for the exact flags of distances (see exact_path)
+        :return: CondensedDistanceMatrix writable through a memory map of path
+        '''
+
+        values = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(condensed_size(n),))
+        if np.issubdtype(values.dtype, np.floating):
+            values[:] = np.nan
+        return cls(values)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        '''
+        :param path: str, .npy file of a condensed distance matrix
+        :param mmap_mode: np.load mmap_mode, None to read the whole file into memory
+        :return: CondensedDistanceMatrix
+        '''
+
+        return cls(np.load(path, mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def shape(self):
+        return self.n, self.n
+
+    def index(self, i, j):
+        '''
+        :return: condensed index of entry (i, j) (or (j, i))
+        '''
+
+        if i > j:
+            i, j = j, i
+        return row_offset(i, self.n) + j - i
+
+    def row(self, i):
+        '''
+        :return: ndarray of the n distances of row i (column i of the rows above it, then row i of the upper triangle)
+        '''
+
+        above = np.arange(i)
+        row = np.empty(self.n, dtype=self.values.dtype)
+        row[:i] = self.values[row_offset(above, self.n) + i - above]
+        row[i:] = self.values[row_offset(i, self.n):row_offset(i + 1, self.n)]
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            return self.values[self.index(i, j)]
+        return self.row(key)
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self.row(i)
+
+    def to_square(self):
+        '''
+        :return: square float32 ndarray, for code that needs the full matrix (e.g. sklearn's precomputed metrics)
+        '''
+
+        square = np.empty((self.n, self.n), dtype=self.values.dtype)
+        for i in range(self.n):
+            upper = self.values[row_offset(i, self.n):row_offset(i + 1, self.n)]
+            square[i, i:] = upper
+            square[i:, i] = upper
+        return square
+
+
+def exact_path(path):
+    '''
+    :param path: str, file of (stripe or combined) distances
+    :return: str, file of the matching bool flags of which distances are exact (not bounds)
+    '''
+
+    root, ext = os.path.splitext(path)
+    return root + "_exact" + ext
+
+
+def cutoff_path(path):
+    '''
+    :param path: str, file of (stripe or combined) distances
+    :return: str, json file of the distance cutoff they were computed with (see distance_metrics.create_stripe_distances)
+    '''
+
+    root, ext = os.path.splitext(path)
+    return root + "_cutoff.json"
+
+
+def save_distance_cutoff(path, distance_cutoff):
+    '''
+    :param path: str, file of (stripe or combined) distances
+    :param distance_cutoff: float, above which the distances flagged as not exact (see exact_path) are lower bounds
+    '''
+
+    with open(cutoff_path(path), 'w') as f:
+        json.dump({'distance_cutoff': distance_cutoff}, f)
+
+
+def load_distance_cutoff(path):
+    '''
+    :param path: str, file of (stripe or combined) distances
+    :return: float, or None if the distances were computed without a cutoff
+    '''
+
+    if not os.path.exists(cutoff_path(path)):
+        return None
+    with open(cutoff_path(path), 'r') as f:
+        return json.load(f)['distance_cutoff']
+
+
+def load_exact_flags(path):
+    '''
+    :param path: str, .npy file of a distance matrix
+    :return: CondensedDistanceMatrix (or square ndarray) of bools, whether each distance is exact rather than a lower
+             bound, or None if every distance is exact
+    '''
+
+    if not os.path.exists(exact_path(path)):
+        return None
+    return load_distance_matrix(exact_path(path))
+
+
+def load_distance_matrix(path):
+    '''
+    :param path: str, .npy file of a condensed distance matrix or (for matrices combined before condensed stripes) of
+                 a square one
+    :return: CondensedDistanceMatrix memory-mapped from path, or square ndarray
+    '''
+
+    values = np.load(path, mmap_mode='r')
+    if values.ndim == 1:
+        return CondensedDistanceMatrix(values)
+    return np.asarray(values)
@@ -0,0 +1,100 @@
+import argparse
+
+import networkx as nx
+from pattern_mapping import PatternMapping
+from ..utils.io_utils import deserialize_patterns, serialize_patterns
+
+
+WL_ITERATIONS = 3
+
+
+def compared_attrs(patterns):
+    '''
+    :param patterns: list[patterns.pattern.Pattern]
+    :return: (sorted node attrs, sorted edge attrs) compared by the node_match / edge_match of any of the patterns
+    '''
+
+    node_attrs = set()
+    edge_attrs = set()
+    for pattern in patterns:
+        node_attrs.update(pattern._node_attrs or [])
+        edge_attrs.update(pattern._edge_attrs or [])
+
+    return sorted(node_attrs), sorted(edge_attrs)
+
+
+def labeled_structure(pattern, node_attrs, edge_attrs):
+    '''
+    :return: networkx.classes.digraph.DiGraph with the structure of pattern's graph and a 'label' attribute holding
+             the values of node_attrs (edge_attrs) of every node (edge)
+    '''
+
+    G = nx.DiGraph()
+    for node_id, attrs in pattern.pattern_graph.nodes(data=True):
+        G.add_node(node_id, label=repr([(attr, attrs[attr]) for attr in node_attrs if attr in attrs]))
+    for u, v, attrs in pattern.pattern_graph.edges(data=True):
+        G.add_edge(u, v, label=repr([(attr, attrs[attr]) for attr in edge_attrs if attr in attrs]))
+
+    return G
+
+
+def deduplicate_patterns(patterns):
+    '''
+    Groups patterns that are identical for the distance metrics and clustering: isomorphic graphs whose nodes and
+    edges agree on every attribute any pattern compares, and which compare the same attributes themselves. Candidates
+    are found by Weisfeiler-Lehman hash and verified with an exact isomorphism test, so hash collisions never merge
+    different structures.
+
+    :param patterns: list[patterns.pattern.Pattern]
+    :return: PatternMapping
+    '''
+
+    node_attrs, edge_attrs = compared_attrs(patterns)
+
+    hash_to_uniques = {}  # hash -> list of (unique index, labeled structure)
+    pattern_to_unique = []
+    representatives = []
+
+    for i, pattern in enumerate(patterns):
+        structure = labeled_structure(pattern, node_attrs, edge_attrs)
+        structure_hash = (nx.weisfeiler_lehman_graph_hash(structure, node_attr='label', edge_attr='label',
+                                                          iterations=WL_ITERATIONS),
+                          tuple(sorted(pattern._node_attrs or [])), tuple(sorted(pattern._edge_attrs or [])))
+
+        candidates = hash_to_uniques.setdefault(structure_hash, [])
+        for unique, candidate_structure in candidates:
+            if nx.is_isomorphic(structure, candidate_structure,
+                                node_match=lambda n1, n2: n1['label'] == n2['label'],
+                                edge_match=lambda e1, e2: e1['label'] == e2['label']):
+                pattern_to_unique.append(unique)
+                break
+        else:
+            unique = len(representatives)
+            candidates.append((unique, structure))
+            pattern_to_unique.append(unique)
+            representatives.append(i)
+
+    return PatternMapping(pattern_to_unique, representatives)
+
+
+def main(args):
+    patterns = deserialize_patterns(args.input_graphs, is_file_path=True)
+
+    pattern_mapping = deduplicate_patterns(patterns)
+    print("{} unique structures among {} patterns".format(len(pattern_mapping.representatives), len(patterns)))
+
+    with open(args.output_graphs, 'w') as f:
+        f.write(serialize_patterns([patterns[i] for i in pattern_mapping.representatives]))
+    pattern_mapping.save(args.output_mapping)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_graphs', type=str, required=True, help='serialized local patterns')
+    parser.add_argument('--output_graphs', type=str, required=True, help='serialized unique local patterns')
+    parser.add_argument('--output_mapping', type=str, required=True, help='json PatternMapping from the local patterns '
+                                                                          'to the unique ones')
+    args = parser.parse_args()
+
+    main(args)
@@ -1,18 +1,34 @@
 import argparse
 
 import numpy as np
-from distance_metrics import create_distance_matrix, approximate_graph_edit_distance
+from condensed_distance_matrix import exact_path, save_distance_cutoff
+from distance_metrics import DistanceMetrics, create_stripe_distances, create_embedding_stripe_distances, \
+    approximate_graph_edit_distance, normalized_graph_edit_distance
 from ..utils.io_utils import deserialize_patterns
 
 
 def main(args):
     local_patterns = deserialize_patterns(args.input_graphs, is_file_path=True)
-
-    distance_matrix = create_distance_matrix(local_patterns, approximate_graph_edit_distance,
-                                             stripe=args.stripe, num_batches=args.num_batches)
+    metric = DistanceMetrics[args.metric]
+
+    # only this stripe's entries of the upper triangle, combine_distance_matrices.py assembles them
+    if metric == DistanceMetrics.WeisfeilerLehmanCosine:
+        stripe_distances, stripe_exact = create_embedding_stripe_distances(local_patterns, stripe=args.stripe,
+                                                                           num_batches=args.num_batches)
+    else:
+        similarity_measure = {DistanceMetrics.ApproximateGraphEditDistance: approximate_graph_edit_distance,
+                              DistanceMetrics.NormalizedGraphEditDistance: normalized_graph_edit_distance}[metric]
+        stripe_distances, stripe_exact = create_stripe_distances(local_patterns, similarity_measure,
+                                                                 stripe=args.stripe, num_batches=args.num_batches,
+                                                                 distance_cutoff=args.distance_cutoff)
 
     with open(args.output_file_path, 'wb') as f:
-        np.save(f, distance_matrix)
+        np.save(f, stripe_distances)
+
+    if args.distance_cutoff is not None:
+        with open(exact_path(args.output_file_path), 'wb') as f:
+            np.save(f, stripe_exact)
+        save_distance_cutoff(args.output_file_path, args.distance_cutoff)
 
 
 if __name__ == '__main__':
@@ -22,6 +38,11 @@ if __name__ == '__main__':
     parser.add_argument('--num_batches', type=int, required=True)
     parser.add_argument('--output_file_path', type=str, required=True)
     parser.add_argument('--input_graphs', type=str, required=True)
+    parser.add_argument('--distance_cutoff', type=float, default=None,
+                        help='only compute distances whose lower bound is at most this (e.g. the largest DBSCAN '
+                             'epsilon of interest) exactly, store the lower bound for the rest')
+    parser.add_argument('--metric', type=str, default="ApproximateGraphEditDistance",
+                        help='DistanceMetrics option, WeisfeilerLehmanCosine is fast enough for a single batch')
     args = parser.parse_args()
 
     main(args)
\ No newline at end of file
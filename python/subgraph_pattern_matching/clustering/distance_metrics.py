@@ -1,6 +1,26 @@
+import enum
+from collections import Counter
+
 import numpy as np
+from scipy import sparse
 
 from networkx.algorithms.similarity import optimize_graph_edit_distance
+from ..constants.common.attrs.edge.edge_attrs import EdgeAttrs
+from ..constants.common.attrs.edge.syntax_edge_attrs import SyntaxEdgeAttrs
+from ..constants.common.attrs.node.amr_node_attrs import AMRNodeAttrs
+from ..constants.common.attrs.node.node_attrs import NodeAttrs
+from ..constants.common.attrs.node.token_node_attrs import TokenNodeAttrs
+from condensed_distance_matrix import DISTANCE_DTYPE, stripe_columns, stripe_size
+
+
+class DistanceMetrics(enum.Enum):
+    ApproximateGraphEditDistance = enum.auto()
+    NormalizedGraphEditDistance = enum.auto()
+    WeisfeilerLehmanCosine = enum.auto()
+
+
+# rows of the embedding distances computed at once, so that a block has about this many entries
+EMBEDDING_BLOCK_ENTRIES = 1 << 21
 
 
 def approximate_graph_edit_distance(G1, G2):
@@ -17,6 +37,206 @@ def normalized_graph_edit_distance(G1, G2):
     return edit_distance / (G1_size + G2_size)
 
 
+class GraphEditDistanceBounds():
+    '''
+    Cheap bounds on the graph edit distance (with networkx's default unit costs, as in approximate_graph_edit_distance)
+    between a pattern and many others at once, from per-pattern counts in NumPy arrays.
+
+    Lower bound: node edits plus edge edits, each at least the number of elements of the larger graph that can't be
+    substituted for free. Nodes (edges) only match if their node (edge) types match, which node_match (edge_match)
+    always checks, so free substitutions are bounded by the overlap of the type multisets. Edge insertions and
+    deletions are also bounded by the differences of the sorted in- and out-degree sequences.
+
+    Upper bound: substituting the nodes in any order (at most one edit per node of the larger graph) and replacing
+    every edge.
+    '''
+
+    def __init__(self, local_patterns):
+        '''
+        :param local_patterns: list[patterns.pattern.Pattern]
+        '''
+
+        graphs = [pattern.pattern_graph for pattern in local_patterns]
+        self.num_nodes = np.array([len(G) for G in graphs])
+        self.num_edges = np.array([G.number_of_edges() for G in graphs])
+        self.compares_nodes = np.array([pattern.node_match is not None for pattern in local_patterns])
+        self.compares_edges = np.array([pattern.edge_match is not None for pattern in local_patterns])
+
+        self.node_type_counts = self.type_counts([[attrs.get(NodeAttrs.node_type, None)
+                                                   for _, attrs in G.nodes(data=True)] for G in graphs])
+        self.edge_type_counts = self.type_counts([[attrs.get(EdgeAttrs.edge_type, None)
+                                                   for _, _, attrs in G.edges(data=True)] for G in graphs])
+
+        max_nodes = max(self.num_nodes, default=0)
+        self.out_degrees = np.zeros((len(graphs), max_nodes), int)
+        self.in_degrees = np.zeros((len(graphs), max_nodes), int)
+        for i, G in enumerate(graphs):
+            self.out_degrees[i, :len(G)] = sorted((d for _, d in G.out_degree()), reverse=True)
+            self.in_degrees[i, :len(G)] = sorted((d for _, d in G.in_degree()), reverse=True)
+
+    @staticmethod
+    def type_counts(types_per_graph):
+        '''
+        :param types_per_graph: list of lists of node or edge types
+        :return: 2D int ndarray, counts of every type (column) per graph (row)
+        '''
+
+        type_to_column = {}
+        for types in types_per_graph:
+            for t in types:
+                type_to_column.setdefault(t, len(type_to_column))
+
+        counts = np.zeros((len(types_per_graph), len(type_to_column)), int)
+        for i, types in enumerate(types_per_graph):
+            for t in types:
+                counts[i, type_to_column[t]] += 1
+        return counts
+
+    def lower_bounds(self, i, js):
+        '''
+        :param i: int, index of the pattern whose node_match and edge_match are used (first argument of the distance)
+        :param js: int ndarray of indices of the other patterns
+        :return: ndarray of lower bounds of the edit distances between pattern i and patterns js
+        '''
+
+        max_nodes = np.maximum(self.num_nodes[i], self.num_nodes[js])
+        max_edges = np.maximum(self.num_edges[i], self.num_edges[js])
+
+        if self.compares_nodes[i]:
+            node_edits = max_nodes - np.minimum(self.node_type_counts[i], self.node_type_counts[js]).sum(axis=1)
+        else:
+            node_edits = max_nodes - np.minimum(self.num_nodes[i], self.num_nodes[js])
+
+        if self.compares_edges[i]:
+            edge_edits = max_edges - np.minimum(self.edge_type_counts[i], self.edge_type_counts[js]).sum(axis=1)
+        else:
+            edge_edits = max_edges - np.minimum(self.num_edges[i], self.num_edges[js])
+        edge_edits = np.maximum(edge_edits, np.abs(self.out_degrees[js] - self.out_degrees[i]).sum(axis=1))
+        edge_edits = np.maximum(edge_edits, np.abs(self.in_degrees[js] - self.in_degrees[i]).sum(axis=1))
+
+        return node_edits + edge_edits
+
+    def upper_bounds(self, i, js):
+        '''
+        :return: ndarray of upper bounds of the edit distances between pattern i and patterns js
+        '''
+
+        return np.maximum(self.num_nodes[i], self.num_nodes[js]) + self.num_edges[i] + self.num_edges[js]
+
+    def normalized(self, i, js, bounds):
+        '''
+        :return: bounds of normalized_graph_edit_distance from bounds of the edit distance
+        '''
+
+        return bounds / (self.num_nodes[i] + self.num_edges[i] + self.num_nodes[js] + self.num_edges[js])
+
+
+class WeisfeilerLehmanEmbedding():
+    '''
+    Embeds every pattern graph into a sparse vector of Weisfeiler-Lehman subtree label counts: a node's label starts as
+    its node_attrs values, and each iteration relabels it with its previous label and the sorted (edge label, label)
+    pairs of its successors and of its predecessors, where an edge's label is its edge_attrs values. Every label of
+    every iteration (0 to iterations) is a feature, so two patterns are close if they share many rooted subtrees.
+
+    Unlike the graph edit distances, distances between all patterns come from a few sparse matrix products.
+    '''
+
+    NODE_ATTRS = (NodeAttrs.node_type, TokenNodeAttrs.upos, AMRNodeAttrs.content)
+    EDGE_ATTRS = (EdgeAttrs.edge_type, SyntaxEdgeAttrs.dep_rel)
+
+    def __init__(self, local_patterns, iterations=3, node_attrs=NODE_ATTRS, edge_attrs=EDGE_ATTRS):
+        '''
+        :param local_patterns: list[patterns.pattern.Pattern]
+        :param iterations: int, number of relabeling iterations, i.e. depth of the subtrees
+        :param node_attrs: node attributes of the initial node labels, missing attributes are ''
+        :param edge_attrs: edge attributes of the edge labels
+        '''
+
+        self.label_to_feature = {}
+
+        rows, columns, counts = [], [], []
+        for i, pattern in enumerate(local_patterns):
+            feature_counts = Counter(self.subtree_features(pattern.pattern_graph, iterations, node_attrs, edge_attrs))
+            rows.extend([i] * len(feature_counts))
+            columns.extend(feature_counts.keys())
+            counts.extend(feature_counts.values())
+
+        self.vectors = sparse.csr_matrix((np.array(counts, float), (rows, columns)),
+                                         shape=(len(local_patterns), len(self.label_to_feature)))
+        self.squared_norms = np.asarray(self.vectors.multiply(self.vectors).sum(axis=1)).ravel()
+
+    def feature(self, label):
+        '''
+        :param label: hashable tuple, a node label of some iteration
+        :return: int, feature (column) of label, added on first use
+        '''
+
+        return self.label_to_feature.setdefault(label, len(self.label_to_feature))
+
+    def subtree_features(self, G, iterations, node_attrs, edge_attrs):
+        '''
+        :param G: networkx.classes.digraph.DiGraph, a pattern graph
+        :return: list[int], feature of every node at every iteration
+        '''
+
+        labels = {node: self.feature((0, tuple(attrs.get(attr, '') for attr in node_attrs)))
+                  for node, attrs in G.nodes(data=True)}
+        edge_labels = {(u, v): tuple(str(attrs.get(attr, '')) for attr in edge_attrs)  # sortable
+                       for u, v, attrs in G.edges(data=True)}
+
+        features = list(labels.values())
+        for iteration in range(1, iterations + 1):
+            labels = {node: self.feature((iteration, labels[node],
+                                          tuple(sorted((edge_labels[node, v], labels[v]) for v in G.succ[node])),
+                                          tuple(sorted((edge_labels[u, node], labels[u]) for u in G.pred[node]))))
+                      for node in G}
+            features.extend(labels.values())
+
+        return features
+
+    def cosine_distances(self, start, stop):
+        '''
+        :param start: int, first row
+        :param stop: int, row after the last one
+        :return: 2D float64 ndarray of the cosine distances between patterns start:stop (rows) and every pattern
+                 (columns), exactly 0 between patterns with the same vector
+        '''
+
+        # counts are integers, so identical vectors give a dot product equal to both squared norms and a distance of 0
+        dot_products = (self.vectors[start:stop] @ self.vectors.T).toarray()
+        return 1 - dot_products / np.sqrt(np.outer(self.squared_norms[start:stop], self.squared_norms))
+
+
+def create_embedding_stripe_distances(local_patterns, stripe=0, num_batches=1):
+    '''
+    WeisfeilerLehmanEmbedding cosine distances of the upper triangle entries owned by stripe, see
+    create_stripe_distances. A single stripe (num_batches=1) of all distances takes seconds on one machine.
+
+    :param local_patterns: list[patterns.pattern.Pattern]
+    :return: (1D float32 ndarray of the stripe's distances, 1D bool ndarray, all True since every distance is exact)
+    '''
+
+    row_size = len(local_patterns)
+    print("Total length: {}".format(row_size))
+
+    embedding = WeisfeilerLehmanEmbedding(local_patterns)
+    print("{} Weisfeiler-Lehman features".format(embedding.vectors.shape[1]))
+
+    stripe_distances = np.empty(stripe_size(row_size, stripe, num_batches), DISTANCE_DTYPE)
+
+    block_rows = max(1, EMBEDDING_BLOCK_ENTRIES // max(row_size, 1))
+    position = 0
+    for start in range(0, row_size, block_rows):
+        stop = min(start + block_rows, row_size)
+        distances = embedding.cosine_distances(start, stop)
+        for i in range(start, stop):
+            columns = stripe_columns(i, row_size, stripe, num_batches)
+            stripe_distances[position:position + len(columns)] = distances[i - start, columns]
+            position += len(columns)
+
+    return stripe_distances, np.ones(len(stripe_distances), bool)
+
+
 def create_distance_matrix(local_patterns, similarity_measure, stripe=0, num_batches=1):
     '''
 
@@ -44,3 +264,57 @@ def create_distance_matrix(local_patterns, similarity_measure, stripe=0, num_bat
                     distance_matrix[j][i] = distance_matrix[i][j]
 
     return distance_matrix
+
+
+def create_stripe_distances(local_patterns, similarity_measure, stripe=0, num_batches=1, distance_cutoff=None):
+    '''
+    Distances of the upper triangle entries (i, j) owned by stripe ((i * n + j) % num_batches == stripe), see
+    combine_distance_matrices.combine_stripe_distances
+
+    :param local_patterns: list[patterns.pattern.Pattern]
+    :param similarity_measure: approximate_graph_edit_distance or normalized_graph_edit_distance
+    :param distance_cutoff: None or float, largest distance clustering needs exactly (e.g. the largest DBSCAN epsilon
+                            considered); pairs whose GraphEditDistanceBounds lower bound is above it get the bound
+                            instead of running similarity_measure
+
+    :return: (1D float32 ndarray of the stripe's distances, 1D bool ndarray of whether each is exact rather than a
+             lower bound), in row-major order of their entries
+    '''
+
+    row_size = len(local_patterns)
+    print("Total length: {}".format(row_size))
+
+    stripe_distances = np.empty(stripe_size(row_size, stripe, num_batches), DISTANCE_DTYPE)
+    stripe_exact = np.ones(len(stripe_distances), bool)
+
+    bounds = GraphEditDistanceBounds(local_patterns) if distance_cutoff is not None else None
+
+    position = 0
+    for i, pattern_i in enumerate(local_patterns):
+        columns = stripe_columns(i, row_size, stripe, num_batches)
+
+        if bounds is not None:
+            lower_bounds = bounds.lower_bounds(i, columns)
+            upper_bounds = bounds.upper_bounds(i, columns)
+            if similarity_measure is normalized_graph_edit_distance:
+                lower_bounds = bounds.normalized(i, columns, lower_bounds)
+                upper_bounds = bounds.normalized(i, columns, upper_bounds)
+            # distances are known without running similarity_measure if the bounds meet, and only needed as bounds
+            #  above the cutoff
+            tight = lower_bounds == upper_bounds
+            bounded = (lower_bounds > distance_cutoff) & ~tight
+            known = tight | bounded
+            stripe_distances[position:position + len(columns)][known] = lower_bounds[known]
+            stripe_exact[position:position + len(columns)][bounded] = False
+            computed = ~known
+        else:
+            computed = np.ones(len(columns), bool)
+
+        for offset in np.flatnonzero(computed):
+            stripe_distances[position + offset] = similarity_measure(pattern_i, local_patterns[columns[offset]])
+        position += len(columns)
+
+    if bounds is not None:
+        print("Bounded {} of {} distances".format(int((~stripe_exact).sum()), len(stripe_exact)))
+
+    return stripe_distances, stripe_exact
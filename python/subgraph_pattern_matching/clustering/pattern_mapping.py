@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+
+
+class PatternMapping():
+    '''
+    Maps the local patterns of a grid search configuration to their unique structures (see deduplicate_patterns):
+    distances are computed and patterns clustered per unique structure, and results expanded back to every pattern
+    '''
+
+    def __init__(self, pattern_to_unique, representatives):
+        '''
+        :param pattern_to_unique: list[int], index of the unique structure of every pattern
+        :param representatives: list[int], index of the (first) pattern of every unique structure
+        '''
+
+        self.pattern_to_unique = np.asarray(pattern_to_unique, dtype=int)
+        self.representatives = list(representatives)
+        self.weights = np.bincount(self.pattern_to_unique, minlength=len(self.representatives))
+
+    def to_json(self):
+        return {'pattern_to_unique': self.pattern_to_unique.tolist(),
+                'representatives': self.representatives,
+                'weights': self.weights.tolist()}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            json_dict = json.load(f)
+        return cls(json_dict['pattern_to_unique'], json_dict['representatives'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_json(), f)
+
+    def expand_labels(self, unique_labels):
+        '''
+        :param unique_labels: list[int], cluster label of every unique structure
+        :return: list[int], cluster label of every pattern
+        '''
+
+        return np.asarray(unique_labels)[self.pattern_to_unique].tolist()
+
+    def expand_distance_matrix(self, unique_distance_matrix):
+        '''
+        :param unique_distance_matrix: square ndarray or condensed_distance_matrix.CondensedDistanceMatrix over the
+                                       unique structures
+        :return: ExpandedDistanceMatrix over every pattern
+        '''
+
+        return ExpandedDistanceMatrix(unique_distance_matrix, self.pattern_to_unique)
+
+
+class ExpandedDistanceMatrix():
+    '''distance matrix over every pattern, read from the distance matrix of their unique structures'''
+
+    def __init__(self, unique_distance_matrix, pattern_to_unique):
+        self.unique_distance_matrix = unique_distance_matrix
+        self.pattern_to_unique = pattern_to_unique
+
+    def __len__(self):
+        return len(self.pattern_to_unique)
+
+    @property
+    def shape(self):
+        return len(self), len(self)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            return self.unique_distance_matrix[self.pattern_to_unique[i], self.pattern_to_unique[j]]
+        return np.asarray(self.unique_distance_matrix[self.pattern_to_unique[key]])[self.pattern_to_unique]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
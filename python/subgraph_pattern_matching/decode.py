@@ -1,15 +1,27 @@
 import argparse
 import json
 import logging
+import math
+import multiprocessing
 import os
+import pickle
+import queue
+import threading
 
 import networkx as nx
 from .constants.pattern.id.pattern_token_node_ids import PatternTokenNodeIDs
-from .evaluate import evaluate
+from .evaluate import evaluate, EvaluationAccumulator
 from .graph_builder import GraphBuilder
 from .local_pattern_finder import get_parse_type_kwargs
+from .match_utils.attribute_index import AttributeIndex
+from .match_utils.matching_engine import MatchingEngines, create_matcher
+from .match_utils.multi_pattern_matcher import MultiPatternMatcher
+from .match_utils.parse_type_views import ParseTypeViews
 from .match_wrapper import MatchWrapper, MatchCorpus
 from .patterns.pattern import Pattern
+from .utils.graph_validation import ValidationLevel
+from .utils.stripe_utils import select_sentence_stripe, select_stripe, write_sentence_stripe_manifest, \
+    write_stripe_manifest
 from .utils.timer import timer
 from .view_utils.graph_viewer import GraphViewer
 
@@ -67,34 +79,64 @@ def prepare_serialized_patterns(patterns_json_path):
     return patterns
 
 
+def stripe_sentence_indices(serif_doc, per_sentence, stripe=0, num_batches=1):
+    '''
+    :param serif_doc:
+    :param per_sentence: whether the document is decoded per sentence, in which case its sentences are striped
+    :return: None (every sentence) or list[int], indices of the sentences of serif_doc owned by stripe
+    '''
+
+    if not per_sentence or num_batches <= 1:
+        return None
+
+    return select_sentence_stripe(serif_doc.docid, [s.id for s in serif_doc.sentences], stripe, num_batches)
+
+
 @timer
-def serif_doc_to_nx_graphs(serif_doc, graph_builder, per_sentence=False):
+def serif_doc_to_nx_graphs(serif_doc, graph_builder, per_sentence=False, serifxml_path=None, sentence_indices=None):
     '''
     :param serif_doc:
     :param graph_builder: graph_builder.GraphBuilder
     :param per_sentence: boolean indicating whether nx graphs should be created per sentence (depends on dataset)
+    :param serifxml_path: None or path serif_doc was read from, lets graph_builder read through its graph cache
+    :param sentence_indices: None or list[int], with per_sentence only build the graphs of these sentences
     :return:
     '''
 
     if per_sentence:
-        nx_graphs = graph_builder.serif_doc_to_networkx_per_sentence(serif_doc=serif_doc)
+        nx_graphs = graph_builder.serif_doc_to_networkx_per_sentence(serif_doc=serif_doc, serifxml_path=serifxml_path,
+                                                                     sentence_indices=sentence_indices)
     else:
-        nx_graphs = [graph_builder.serif_doc_to_networkx(serif_doc=serif_doc)]
+        nx_graphs = [graph_builder.serif_doc_to_networkx(serif_doc=serif_doc, serifxml_path=serifxml_path)]
 
     return nx_graphs
 
 
 # @timer
-def extract_patterns_from_nx_graph(nx_graph, patterns, serif_doc, serif_sentence, isomorphism=False, vis_path=None):
+def extract_patterns_from_nx_graph(nx_graph, patterns, serif_doc, serif_sentence, isomorphism=False, vis_path=None,
+                                   matching_engine=MatchingEngines.SELECTIVITY, multi_pattern_matcher=None):
     '''
 
     :param nx_graph:
     :param patterns:
     :param serif_doc:
     :param serif_sentence:
+    :param matching_engine: match_utils.matching_engine.MatchingEngines.X
+    :param multi_pattern_matcher: None or match_utils.multi_pattern_matcher.MultiPatternMatcher built over patterns,
+                                  to match sub-patterns shared by several patterns only once
     :return: list[subgraph_pattern_matching.match_wrapper.MatchWrapper]
     '''
 
+    attribute_index = AttributeIndex.from_graph(nx_graph)
+
+    # match each pattern against the subgraph of the parse types it uses, built once per parse type signature
+    parse_type_views = ParseTypeViews(nx_graph)
+
+    shared_match_dicts = {}
+    if multi_pattern_matcher is not None:
+        shared_match_dicts = multi_pattern_matcher.match(nx_graph, isomorphism=isomorphism,
+                                                         attribute_index=attribute_index)
+
     matches = []
     for pattern in patterns:
 
@@ -104,13 +146,25 @@ def extract_patterns_from_nx_graph(nx_graph, patterns, serif_doc, serif_sentence
         if len(pattern.pattern_graph.edges) <= 1:
             continue
 
-        pattern_matcher = nx.algorithms.isomorphism.DiGraphMatcher(nx_graph, pattern.pattern_graph,
-                                                                   node_match=pattern.node_match,
-                                                                   edge_match=pattern.edge_match)
-        if isomorphism:
-            pattern_match_dicts = [g for g in pattern_matcher.subgraph_isomorphisms_iter()]
-        else:  # monomorphism
-            pattern_match_dicts = [g for g in pattern_matcher.subgraph_monomorphisms_iter()]
+        if pattern in shared_match_dicts:
+            pattern_match_dicts = shared_match_dicts[pattern]
+        else:
+            # restrict matching to the candidate domains of the pattern nodes if the graph carries an attribute index
+            candidates = None
+            if attribute_index is not None:
+                candidates = attribute_index.candidate_domains(pattern.compiled_pattern)
+                if candidates is not None and not all(candidates.values()):
+                    continue  # some pattern node can't be hosted by any document node
+
+            # views drop edges between matched nodes that subgraph isomorphism has to see
+            match_graph = nx_graph if isomorphism else parse_type_views.view_for_pattern(pattern.compiled_pattern)
+            pattern_matcher = create_matcher(match_graph, pattern.compiled_pattern,
+                                             matching_engine=matching_engine,
+                                             candidates=candidates)
+            if isomorphism:
+                pattern_match_dicts = [g for g in pattern_matcher.subgraph_isomorphisms_iter()]
+            else:  # monomorphism
+                pattern_match_dicts = [g for g in pattern_matcher.subgraph_monomorphisms_iter()]
 
         # TODO create on-match-filter API that is not ad-hoc
         ###########################################################################################################
@@ -171,6 +225,321 @@ def extract_patterns_from_nx_graph(nx_graph, patterns, serif_doc, serif_sentence
     return matches
 
 
+def extract_patterns_from_serif_doc(serif_doc, nx_graphs, patterns, per_sentence=False, isomorphism=False,
+                                    vis_path=None, matching_engine=MatchingEngines.SELECTIVITY,
+                                    multi_pattern_matcher=None, sentence_indices=None):
+    '''
+    :param serif_doc:
+    :param nx_graphs: output of serif_doc_to_nx_graphs for serif_doc
+    :param per_sentence: whether nx_graphs has one graph per sentence of serif_doc or one graph for the document
+    :param sentence_indices: None or list[int], the sentences nx_graphs were built for (see serif_doc_to_nx_graphs)
+    :return: list[subgraph_pattern_matching.match_wrapper.MatchWrapper]
+    '''
+
+    matches = []
+    if per_sentence:
+        serif_sentences = serif_doc.sentences
+        if sentence_indices is not None:
+            serif_sentences = [serif_sentences[i] for i in sentence_indices]
+        for nx_graph, serif_sentence in zip(nx_graphs, serif_sentences):
+            logging.info("doc:{}/sentence:{}".format(serif_doc.docid, serif_sentence.id))
+            matches.extend(extract_patterns_from_nx_graph(nx_graph=nx_graph,
+                                                          serif_doc=serif_doc,
+                                                          serif_sentence=serif_sentence,
+                                                          patterns=patterns,
+                                                          isomorphism=isomorphism,
+                                                          vis_path=vis_path,
+                                                          matching_engine=matching_engine,
+                                                          multi_pattern_matcher=multi_pattern_matcher))
+    else:  # per-document
+        logging.info("doc:{}".format(serif_doc.docid))
+        matches.extend(extract_patterns_from_nx_graph(nx_graph=nx_graphs[0],
+                                                      serif_doc=serif_doc,
+                                                      serif_sentence=None,
+                                                      patterns=patterns,
+                                                      isomorphism=isomorphism,
+                                                      matching_engine=matching_engine,
+                                                      multi_pattern_matcher=multi_pattern_matcher))
+
+    return matches
+
+
+def iter_serif_docs(serifxml_paths, prefetch=0):
+    '''
+    :param serifxml_paths: list[str]
+    :param prefetch: number of documents to parse ahead of the consumer in a background thread (0: parse on demand)
+    :return: generator of (serifxml_path, serif_doc), in the order of serifxml_paths
+    '''
+
+    if prefetch <= 0:
+        for serifxml_path in serifxml_paths:
+            logging.info(serifxml_path)
+            yield serifxml_path, serifxml3.Document(serifxml_path)
+        return
+
+    # bounded, so at most prefetch parsed documents wait for the consumer
+    prefetched = queue.Queue(maxsize=prefetch)
+
+    def parse_serifxmls():
+        try:
+            for serifxml_path in serifxml_paths:
+                prefetched.put((serifxml_path, serifxml3.Document(serifxml_path), None))
+        except Exception as e:
+            prefetched.put((None, None, e))
+            return
+        prefetched.put(None)
+
+    threading.Thread(target=parse_serifxmls, daemon=True).start()
+
+    while True:
+        item = prefetched.get()
+        if item is None:
+            return
+        serifxml_path, serif_doc, error = item
+        if error is not None:
+            raise error
+        logging.info(serifxml_path)
+        yield serifxml_path, serif_doc
+
+
+@timer
+def stream_decode(serifxml_paths, graph_builder, patterns, per_sentence=False, isomorphism=False, vis_path=None,
+                  matching_engine=MatchingEngines.SELECTIVITY, multi_pattern_matcher=None, output_path=None,
+                  evaluation_corpus=None, prefetch=1, stripe=0, num_batches=1):
+    '''
+    Decode one document at a time: parse, build graphs, match, write the document's matches to output_path and fold
+    them into the evaluation, then release the document, so peak memory depends on the largest document (times
+    prefetch) rather than on the size of the corpus
+
+    :param output_path: pickle file to which one list of MatchWrapper.to_pickle() dicts is appended per document
+    :param evaluation_corpus: if set, evaluate incrementally with evaluate.EvaluationAccumulator
+    :param prefetch: number of documents to parse ahead of matching
+    :param stripe: with per_sentence, only decode the sentences of serifxml_paths owned by stripe of num_batches
+    '''
+
+    accumulator = EvaluationAccumulator(evaluation_corpus) if evaluation_corpus else None
+    output_file = open(output_path, 'wb') if output_path else None
+
+    try:
+        for serifxml_path, serif_doc in iter_serif_docs(serifxml_paths, prefetch=prefetch):
+            sentence_indices = stripe_sentence_indices(serif_doc, per_sentence, stripe, num_batches)
+            nx_graphs = serif_doc_to_nx_graphs(serif_doc=serif_doc,
+                                               graph_builder=graph_builder,
+                                               per_sentence=per_sentence,
+                                               serifxml_path=serifxml_path,
+                                               sentence_indices=sentence_indices)
+
+            doc_matches = extract_patterns_from_serif_doc(serif_doc=serif_doc,
+                                                          nx_graphs=nx_graphs,
+                                                          patterns=patterns,
+                                                          per_sentence=per_sentence,
+                                                          isomorphism=isomorphism,
+                                                          vis_path=vis_path,
+                                                          matching_engine=matching_engine,
+                                                          multi_pattern_matcher=multi_pattern_matcher,
+                                                          sentence_indices=sentence_indices)
+
+            if output_file is not None and doc_matches:
+                pickle.dump([match.to_pickle() for match in doc_matches], output_file)
+            if accumulator is not None:
+                accumulator.add(serif_doc, doc_matches)
+
+            del serif_doc, nx_graphs, doc_matches
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    if accumulator is not None:
+        accumulator.evaluate()
+
+
+# per-process decode state, set up once per worker by init_decode_worker
+_worker_state = {}
+
+
+def init_decode_worker(pattern_jsons, graph_builder_kwargs, share_pattern_cores=False, per_sentence=False,
+                       isomorphism=False, vis_path=None, matching_engine=MatchingEngines.SELECTIVITY,
+                       evaluation_corpus=None, stripe=0, num_batches=1, pickle_matches=True, serifxml_path=None):
+    '''
+    multiprocessing.Pool initializer: rebuild (and compile) the patterns and the GraphBuilder once per worker; patterns
+    are shipped as json because their compiled predicates can't be pickled
+
+    :param pickle_matches: whether workers send back MatchWrapper.to_pickle() dicts, only needed to write an output file
+
+    :param serifxml_path: None or path of a single serifxml whose sentences the worker decodes in chunks (see
+                          decode_sentences_in_worker), read once here
+    '''
+
+    patterns = []
+    for json_dict in pattern_jsons:
+        p = Pattern()
+        p.load_from_json(json_dict)
+        patterns.append(p)
+
+    multi_pattern_matcher = None
+    if share_pattern_cores:
+        multi_pattern_matcher = MultiPatternMatcher([p for p in patterns if len(p.pattern_graph.edges) > 1])
+
+    graph_builder = GraphBuilder(**graph_builder_kwargs)
+
+    _worker_state.clear()
+    _worker_state.update({'patterns': patterns,
+                          'graph_builder': graph_builder,
+                          'multi_pattern_matcher': multi_pattern_matcher,
+                          'per_sentence': per_sentence,
+                          'isomorphism': isomorphism,
+                          'vis_path': vis_path,
+                          'matching_engine': matching_engine,
+                          'evaluation_corpus': evaluation_corpus,
+                          'stripe': stripe,
+                          'num_batches': num_batches,
+                          'pickle_matches': pickle_matches})
+
+    if serifxml_path is not None:
+        _worker_state.update({'serif_doc': serifxml3.Document(serifxml_path),
+                              'cached_graphs': graph_builder.read_graph_cache(serifxml_path, per_sentence=True),
+                              'amr_relations_cache': {}})
+
+
+def decode_serifxml_in_worker(serifxml_path):
+    '''
+    :param serifxml_path: str
+    :return: (docid,
+              list[dict] of MatchWrapper.to_pickle(), or None if the worker doesn't pickle matches,
+              {sent_id: prediction} for evaluate.EvaluationAccumulator, or None if not evaluating)
+    '''
+
+    logging.info(serifxml_path)
+    serif_doc = serifxml3.Document(serifxml_path)
+    sentence_indices = stripe_sentence_indices(serif_doc, _worker_state['per_sentence'], _worker_state['stripe'],
+                                               _worker_state['num_batches'])
+    nx_graphs = serif_doc_to_nx_graphs(serif_doc=serif_doc,
+                                       graph_builder=_worker_state['graph_builder'],
+                                       per_sentence=_worker_state['per_sentence'],
+                                       serifxml_path=serifxml_path,
+                                       sentence_indices=sentence_indices)
+
+    doc_matches = extract_patterns_from_serif_doc(serif_doc=serif_doc,
+                                                  nx_graphs=nx_graphs,
+                                                  patterns=_worker_state['patterns'],
+                                                  per_sentence=_worker_state['per_sentence'],
+                                                  isomorphism=_worker_state['isomorphism'],
+                                                  vis_path=_worker_state['vis_path'],
+                                                  matching_engine=_worker_state['matching_engine'],
+                                                  multi_pattern_matcher=_worker_state['multi_pattern_matcher'],
+                                                  sentence_indices=sentence_indices)
+
+    predictions = None
+    if _worker_state['evaluation_corpus']:
+        accumulator = EvaluationAccumulator(_worker_state['evaluation_corpus'])
+        accumulator.add(serif_doc, doc_matches)
+        predictions = accumulator.predictions_for_doc(serif_doc.docid)
+
+    pkl_matches = [match.to_pickle() for match in doc_matches] if _worker_state['pickle_matches'] else None
+
+    return serif_doc.docid, pkl_matches, predictions
+
+
+def decode_sentences_in_worker(sentence_indices):
+    '''
+    :param sentence_indices: list[int], a chunk of sentences of the worker's serifxml
+    :return: (list[dict] of MatchWrapper.to_pickle(), or None if the worker doesn't pickle matches,
+              {sent_id: prediction} for evaluate.EvaluationAccumulator, or None if not evaluating)
+    '''
+
+    serif_doc = _worker_state['serif_doc']
+    cached_graphs = _worker_state['cached_graphs']
+    if cached_graphs is not None:
+        nx_graphs = [cached_graphs[i] for i in sentence_indices]
+    else:
+        nx_graphs = [_worker_state['graph_builder'].serif_sentence_to_networkx(
+                         serif_doc.sentences[i], amr_relations_cache=_worker_state['amr_relations_cache'])
+                     for i in sentence_indices]
+
+    chunk_matches = extract_patterns_from_serif_doc(serif_doc=serif_doc,
+                                                    nx_graphs=nx_graphs,
+                                                    patterns=_worker_state['patterns'],
+                                                    per_sentence=True,
+                                                    isomorphism=_worker_state['isomorphism'],
+                                                    vis_path=_worker_state['vis_path'],
+                                                    matching_engine=_worker_state['matching_engine'],
+                                                    multi_pattern_matcher=_worker_state['multi_pattern_matcher'],
+                                                    sentence_indices=sentence_indices)
+
+    predictions = None
+    if _worker_state['evaluation_corpus']:
+        accumulator = EvaluationAccumulator(_worker_state['evaluation_corpus'])
+        accumulator.add(serif_doc, chunk_matches)
+        predictions = accumulator.predictions_for_doc(serif_doc.docid)
+
+    pkl_matches = [match.to_pickle() for match in chunk_matches] if _worker_state['pickle_matches'] else None
+
+    return pkl_matches, predictions
+
+
+@timer
+def parallel_decode(serifxml_paths, graph_builder_kwargs, patterns, num_workers, share_pattern_cores=False,
+                    per_sentence=False, isomorphism=False, vis_path=None, matching_engine=MatchingEngines.SELECTIVITY,
+                    output_path=None, evaluation_corpus=None, stripe=0, num_batches=1):
+    '''
+    Decode documents in a pool of num_workers processes. Each worker parses, converts and matches whole documents and
+    sends back only pickle-friendly results; results are consumed in the order of serifxml_paths, so the output is the
+    same regardless of num_workers.
+
+    Per-sentence corpora with fewer documents than workers (e.g. CoNLL or TACRED in a single serifxml) are decoded
+    one document at a time instead: every worker reads the document once and matches chunks of its sentences, and the
+    chunks are reassembled in sentence order. Sentence graphs are read from the graph cache if the document's graphs
+    are cached, but built graphs aren't added to it.
+
+    :param graph_builder_kwargs: kwargs for graph_builder.GraphBuilder
+    :param output_path: pickle file to which one list of MatchWrapper.to_pickle() dicts is appended per document
+    :param evaluation_corpus: if set, evaluate with the predictions the workers made for their documents
+    :param stripe: with per_sentence, only decode the sentences of serifxml_paths owned by stripe of num_batches
+    '''
+
+    accumulator = EvaluationAccumulator(evaluation_corpus) if evaluation_corpus else None
+    output_file = open(output_path, 'wb') if output_path else None
+
+    initargs = ([p.to_json() for p in patterns], graph_builder_kwargs, share_pattern_cores, per_sentence, isomorphism,
+                vis_path, matching_engine, evaluation_corpus, stripe, num_batches, output_file is not None)
+
+    try:
+        if per_sentence and len(serifxml_paths) < num_workers:
+            for serifxml_path, serif_doc in iter_serif_docs(serifxml_paths):
+                sentence_indices = stripe_sentence_indices(serif_doc, per_sentence, stripe, num_batches)
+                if sentence_indices is None:
+                    sentence_indices = list(range(len(serif_doc.sentences)))
+
+                chunk_size = max(1, math.ceil(len(sentence_indices) / (num_workers * 4)))
+                chunks = [sentence_indices[start:start + chunk_size]
+                          for start in range(0, len(sentence_indices), chunk_size)]
+
+                doc_pkl_matches = []
+                with multiprocessing.Pool(processes=num_workers, initializer=init_decode_worker,
+                                          initargs=initargs + (serifxml_path,)) as pool:
+                    for pkl_matches, predictions in pool.imap(decode_sentences_in_worker, chunks):
+                        if pkl_matches is not None:
+                            doc_pkl_matches.extend(pkl_matches)
+                        if accumulator is not None:
+                            accumulator.add_predictions(serif_doc.docid, predictions)
+
+                if output_file is not None and doc_pkl_matches:
+                    pickle.dump(doc_pkl_matches, output_file)
+        else:
+            with multiprocessing.Pool(processes=num_workers, initializer=init_decode_worker, initargs=initargs) as pool:
+                for docid, pkl_matches, predictions in pool.imap(decode_serifxml_in_worker, serifxml_paths):
+                    if output_file is not None and pkl_matches:
+                        pickle.dump(pkl_matches, output_file)
+                    if accumulator is not None:
+                        accumulator.add_predictions(docid, predictions)
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    if accumulator is not None:
+        accumulator.evaluate()
+
+
 @timer
 def main(args):
 
@@ -181,11 +550,28 @@ def main(args):
     else:
         serifxml_paths = [args.input]
 
+    if args.per_sentence:
+        # per-sentence corpora are often a single serifxml, so stripes own sentences (hashed by docid and sentence id)
+        #  and each one only builds the graphs of its own sentences
+        if args.stripe_manifest:
+            write_sentence_stripe_manifest(iter_serif_docs(serifxml_paths), args.num_batches, args.stripe_manifest)
+        logging.info("stripe %d/%d: sentences of %d documents", args.stripe, args.num_batches, len(serifxml_paths))
+    else:
+        # assign documents to stripes before parsing anything, so each runjobs batch only reads its own serifxmls
+        if args.stripe_manifest:
+            write_stripe_manifest(serifxml_paths, args.num_batches, args.stripe_manifest)
+        serifxml_paths = select_stripe(serifxml_paths, args.stripe, args.num_batches)
+        logging.info("stripe %d/%d: %d documents", args.stripe, args.num_batches, len(serifxml_paths))
+
     # GraphBuilder object to construct nx graphs from parsed serif docs
     if args.config:
-        GB = GraphBuilder(get_parse_type_kwargs(args.config))
+        graph_builder_kwargs = dict(attribute_index=args.attribute_index, graph_cache_dir=args.graph_cache_dir,
+                                    validation=ValidationLevel[args.validation], **get_parse_type_kwargs(args.config))
     else:
-        GB = GraphBuilder(dp=True, amr=True, mdp=True, tdp=False)  # DP+MDP (for claim extraction) by default
+        graph_builder_kwargs = dict(dp=True, amr=True, mdp=True, tdp=False,  # DP+MDP (for claim extraction) by default
+                                    attribute_index=args.attribute_index, graph_cache_dir=args.graph_cache_dir,
+                                    validation=ValidationLevel[args.validation])
+    GB = GraphBuilder(**graph_builder_kwargs)
 
     # create patterns
     if args.patterns_path:
@@ -193,49 +579,69 @@ def main(args):
     else:
         patterns = prepare_patterns()
 
+    # match sub-patterns shared across the pattern list once per graph
+    multi_pattern_matcher = None
+    if args.share_pattern_cores:
+        multi_pattern_matcher = MultiPatternMatcher([p for p in patterns if len(p.pattern_graph.edges) > 1])
+
+    if args.workers > 1:
+        parallel_decode(serifxml_paths=serifxml_paths,
+                        graph_builder_kwargs=graph_builder_kwargs,
+                        patterns=patterns,
+                        num_workers=args.workers,
+                        share_pattern_cores=args.share_pattern_cores,
+                        per_sentence=args.per_sentence,
+                        isomorphism=args.isomorphism,
+                        vis_path=args.visualization_path,
+                        matching_engine=MatchingEngines[args.matching_engine],
+                        output_path=args.output,
+                        evaluation_corpus=args.evaluation_corpus,
+                        stripe=args.stripe,
+                        num_batches=args.num_batches)
+        return
+
+    if args.stream:
+        stream_decode(serifxml_paths=serifxml_paths,
+                      graph_builder=GB,
+                      patterns=patterns,
+                      per_sentence=args.per_sentence,
+                      isomorphism=args.isomorphism,
+                      vis_path=args.visualization_path,
+                      matching_engine=MatchingEngines[args.matching_engine],
+                      multi_pattern_matcher=multi_pattern_matcher,
+                      output_path=args.output,
+                      evaluation_corpus=args.evaluation_corpus,
+                      prefetch=args.prefetch,
+                      stripe=args.stripe,
+                      num_batches=args.num_batches)
+        return
+
     # extract patterns from every serifxml
     all_matches = []
     serif_doc_graph_pairs = []
-    serif_docs = []
-    for serifxml_path in serifxml_paths:
-        logging.info(serifxml_path)
+    for serifxml_path, serif_doc in iter_serif_docs(serifxml_paths):
 
         # create serif_doc and convert to networkx graph(s)
-        serif_doc = serifxml3.Document(serifxml_path)
-        serif_docs.append(serif_doc)
+        sentence_indices = stripe_sentence_indices(serif_doc, args.per_sentence, args.stripe, args.num_batches)
         nx_graphs = serif_doc_to_nx_graphs(serif_doc=serif_doc,
                                            graph_builder=GB,
-                                           per_sentence=args.per_sentence)
-
-        if args.per_sentence:
-            for nx_graph, serif_sentence in list(zip(nx_graphs, serif_doc.sentences)):
-                serif_doc_graph_pairs.append((nx_graph, serif_doc, serif_sentence))
-        else:
-            serif_doc_graph_pairs.append((nx_graphs[0], serif_doc))
+                                           per_sentence=args.per_sentence,
+                                           serifxml_path=serifxml_path,
+                                           sentence_indices=sentence_indices)
+        serif_doc_graph_pairs.append((serif_doc, nx_graphs, sentence_indices))
+
+    for serif_doc, nx_graphs, sentence_indices in serif_doc_graph_pairs:
+        all_matches.extend(extract_patterns_from_serif_doc(serif_doc=serif_doc,
+                                                           nx_graphs=nx_graphs,
+                                                           patterns=patterns,
+                                                           per_sentence=args.per_sentence,
+                                                           isomorphism=args.isomorphism,
+                                                           vis_path=args.visualization_path,
+                                                           matching_engine=MatchingEngines[args.matching_engine],
+                                                           multi_pattern_matcher=multi_pattern_matcher,
+                                                           sentence_indices=sentence_indices))
 
-    if args.per_sentence:
-        for i, (nx_graph, serif_doc, serif_sentence) in enumerate(serif_doc_graph_pairs):
-            if i % args.num_batches != args.stripe:
-                continue
-            logging.info("doc:{}/sentence:{}".format(serif_doc.docid, serif_sentence.id))
-            all_matches.extend(extract_patterns_from_nx_graph(nx_graph=nx_graph,
-                                                              serif_doc=serif_doc,
-                                                              serif_sentence=serif_sentence,
-                                                              patterns=patterns,
-                                                              vis_path=args.visualization_path))
-    else:  # per-document
-        for i, (nx_graph, serif_doc) in enumerate(serif_doc_graph_pairs):
-
-            if i % args.num_batches != args.stripe:
-                continue
-            logging.info("doc:{}".format(serif_doc.docid))
-            all_matches.extend(extract_patterns_from_nx_graph(nx_graph=nx_graph,
-                                                              serif_doc=serif_doc,
-                                                              serif_sentence=None,
-                                                              patterns=patterns))
     if args.output:
-        import pickle
-
         pkl_matches = []
         for match in all_matches:
             pkl_matches.append(match.to_pickle())
@@ -278,18 +684,44 @@ if __name__ == '__main__':
                                                                     'have document-level parses such as MDP/TDP or not)')
     parser.add_argument('--isomorphism', action='store_true', help='whether to apply subgraph isomorphism instead of'
                                                             'default subgraph monomorphism during decoding')
+    parser.add_argument('--matching_engine', choices=[e.name for e in MatchingEngines], default=MatchingEngines.SELECTIVITY.name,
+                        help='subgraph matching backend; NETWORKX (VF2) is kept as the reference implementation')
+    parser.add_argument('--share_pattern_cores', action='store_true', help='match sub-patterns common to several patterns '
+                                                                     'once per graph and extend them into each pattern')
     parser.add_argument('-p', '--patterns_path', help='path to serialized patterns to use for extraction',
                         default=None)
     parser.add_argument('-e', '--evaluation_corpus', choices=['TACRED', 'CONLL_ENGLISH', 'ACE_ENGLISH', 'AIDA_TEST', 'AIDA_CLAIMS'],
                         help='if decoding over an annotated corpus, evaluate accuracy over that dataset',  required=False, default=None)
+    parser.add_argument('--stream', action='store_true', help='decode one document at a time and write/evaluate its '
+                                                        'matches before reading the next, instead of holding the '
+                                                        'whole corpus in memory')
+    parser.add_argument('--prefetch', type=int, default=1, help='with --stream, number of serifxmls to parse ahead '
+                                                                'of matching in a background thread')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to decode documents (or, with '
+                                                               '--per_sentence, chunks of sentences) with; output is '
+                                                               'written per document in input order, as with --stream, '
+                                                               'so --stream/--prefetch are not needed')
+    parser.add_argument('--graph_cache_dir', type=str, default=None, help='directory to cache built graphs in, keyed '
+                                                                          'by serifxml path/mtime and parse types')
+    parser.add_argument('--validation', choices=[v.name for v in ValidationLevel], default=ValidationLevel.FULL.name,
+                        help='how to check built graphs for cycles and missing node types: OFF for known-good parses, '
+                             'FAST to check edges as they are inserted, FULL to traverse every finished graph')
     parser.add_argument('-v', '--visualization_path', required=False, default=None)
+    parser.add_argument('--attribute_index', action='store_true', help='index document graph nodes by attribute value '
+                                                                'to prune candidate nodes for each pattern before matching')
 
     # runjobs commands
     parser.add_argument('-m' '--pickle_matches', action='store_true', help="whether to store matches as a pickle object")
     parser.add_argument('--stripe', type=int, required=False, default=0)
     parser.add_argument('-b', '--num_batches', type=int, help="number of batches", required=False, default=1)
+    parser.add_argument('--stripe_manifest', type=str, required=False, default=None,
+                        help="path to write a tab-separated list of every serifxml (with --per_sentence: every "
+                             "serifxml, docid and sentence id) and the stripe that decodes it")
     parser.add_argument('-o', '--output', type=str, required=False, default=None, help="directory to print pickled dicts representing MatchWrapper objects to")
     parser.add_argument('-c', '--config', type=str, required=False, default=None)
     args = parser.parse_args()
 
+    if args.workers > 1 and args.stream:
+        parser.error("--workers already decodes and writes one document at a time, don't combine it with --stream")
+
     main(args)
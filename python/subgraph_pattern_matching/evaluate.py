@@ -2,6 +2,7 @@ import argparse
 import logging
 import os
 import pickle
+from collections import defaultdict
 
 from .evaluation.utils import AnnotationScheme
 from .match_wrapper import MatchWrapper, MatchCorpus
@@ -13,35 +14,154 @@ logging.basicConfig(level=logging.DEBUG)
 logging.getLogger("penman").setLevel(logging.CRITICAL)  # silence penman's default logging (logging.WARNING)
 
 
-def evaluate(evaluation_corpus, matches_by_serif_id, annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION):
+def evaluate(evaluation_corpus, matches_by_serif_id=None, annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION,
+             predictions_by_serif_id=None):
+    '''
+    :param matches_by_serif_id: {docid: {sent_id: list[match_wrapper.MatchWrapper]}}
+    :param predictions_by_serif_id: {docid: {sent_id: prediction}} from EvaluationAccumulator, used instead of
+                                    matches_by_serif_id if given
+    '''
+
+    if isinstance(annotation_scheme, AnnotationScheme):
+        annotation_scheme = annotation_scheme.name
+
     if evaluation_corpus == 'CONLL_ENGLISH':
 
         from evaluation.datasets.conll import score_conll
         score_conll(matches_by_serif_id=matches_by_serif_id,
                     SPLIT='TEST',
-                    annotation_scheme=AnnotationScheme[annotation_scheme])
+                    annotation_scheme=AnnotationScheme[annotation_scheme],
+                    predictions_by_serif_id=predictions_by_serif_id)
 
     elif evaluation_corpus == 'ACE_ENGLISH':
 
         from evaluation.datasets.ace import score_ace
         score_ace(matches_by_serif_id=matches_by_serif_id,
                   SPLIT='TEST',
-                  annotation_scheme=AnnotationScheme[annotation_scheme])
+                  annotation_scheme=AnnotationScheme[annotation_scheme],
+                  predictions_by_serif_id=predictions_by_serif_id)
 
     elif evaluation_corpus == "TACRED":
 
         from evaluation.datasets.tacred import score_tacred
         score_tacred(matches_by_serif_id=matches_by_serif_id,
                   SPLIT='TEST',
-                  annotation_scheme=AnnotationScheme[annotation_scheme])
+                  annotation_scheme=AnnotationScheme[annotation_scheme],
+                  predictions_by_serif_id=predictions_by_serif_id)
 
     elif evaluation_corpus == "AIDA_CLAIMS":
 
         from evaluation.datasets.aida import score_aida
-        score_aida(matches_by_serif_id=matches_by_serif_id, SPLIT='TRAIN')
+        score_aida(matches_by_serif_id=matches_by_serif_id, SPLIT='TRAIN',
+                   predictions_by_serif_id=predictions_by_serif_id)
 
     else:
-        raise NotImplementedError("Corpus {} not implemented".format(args.evaluation_corpus))
+        raise NotImplementedError("Corpus {} not implemented".format(evaluation_corpus))
+
+
+class EvaluationAccumulator():
+    '''
+    Incremental replacement for MatchCorpus-based evaluation: reduces the matches of each document to the (small)
+    per-sentence prediction the scorer for evaluation_corpus compares against gold, so documents and MatchWrappers can
+    be released as soon as they are decoded
+    '''
+
+    def __init__(self, evaluation_corpus, annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION):
+        '''
+        :param evaluation_corpus: 'TACRED', 'CONLL_ENGLISH', 'ACE_ENGLISH', 'AIDA_CLAIMS'
+        :param annotation_scheme: AnnotationScheme.X or its name
+        '''
+
+        if not isinstance(annotation_scheme, AnnotationScheme):
+            annotation_scheme = AnnotationScheme[annotation_scheme]
+
+        self.evaluation_corpus = evaluation_corpus
+        self.annotation_scheme = annotation_scheme
+        self.predict_sentence = self.get_sentence_predictor(evaluation_corpus, annotation_scheme)
+
+        self.predictions_by_serif_id = defaultdict(dict)  # {docid: {sent_id: prediction}}
+
+    @staticmethod
+    def get_sentence_predictor(evaluation_corpus, annotation_scheme):
+        '''
+        :return: function(serif_sentence, list[match_wrapper.MatchWrapper]) -> prediction
+        '''
+
+        if evaluation_corpus == 'CONLL_ENGLISH':
+            from evaluation.datasets.conll import predict_conll_sentence
+            return lambda s, m: predict_conll_sentence(s, m, annotation_scheme=annotation_scheme)
+        elif evaluation_corpus == 'ACE_ENGLISH':
+            from evaluation.datasets.ace import predict_ace_sentence
+            return lambda s, m: predict_ace_sentence(s, m, annotation_scheme=annotation_scheme)
+        elif evaluation_corpus == "TACRED":
+            from evaluation.datasets.tacred import predict_tacred_sentence
+            return lambda s, m: predict_tacred_sentence(s, m, annotation_scheme=annotation_scheme)
+        elif evaluation_corpus == "AIDA_CLAIMS":
+            from evaluation.datasets.aida import predict_aida_sentence
+            return predict_aida_sentence
+        else:
+            raise NotImplementedError("Corpus {} not implemented".format(evaluation_corpus))
+
+    def add(self, serif_doc, matches):
+        '''
+        :param serif_doc: serif.theory.document.Document
+        :param matches: list[match_wrapper.MatchWrapper], all matches for serif_doc
+        '''
+
+        matches_by_sentence_id = defaultdict(list)
+        sentence_by_id = {}
+        for match in matches:
+            serif_sentence = match.serif_sentence
+            if serif_sentence is None:  # document-level match, attribute it to the sentence of its first matched theory
+                serif_sentence = next((t.sentence for t in match.pattern_node_id_to_serif_theory.values()
+                                       if t is not None and t.sentence is not None), None)
+                if serif_sentence is None:
+                    continue
+            matches_by_sentence_id[serif_sentence.id].append(match)
+            sentence_by_id[serif_sentence.id] = serif_sentence
+
+        self.add_predictions(serif_doc.docid, {sentence_id: self.predict_sentence(sentence_by_id[sentence_id], matches)
+                                               for sentence_id, matches in matches_by_sentence_id.items()})
+
+    def predictions_for_doc(self, docid):
+        '''
+        :return: {sent_id: prediction} accumulated for docid
+        '''
+
+        return dict(self.predictions_by_serif_id.get(docid, {}))
+
+    def add_predictions(self, docid, predictions_by_sentence_id):
+        '''
+        merge predictions made elsewhere, e.g. by another EvaluationAccumulator in a decode worker process
+
+        :param predictions_by_sentence_id: {sent_id: prediction}
+        '''
+
+        self.predictions_by_serif_id[docid].update(predictions_by_sentence_id)
+
+    def evaluate(self):
+        evaluate(self.evaluation_corpus,
+                 annotation_scheme=self.annotation_scheme,
+                 predictions_by_serif_id=self.predictions_by_serif_id)
+
+
+def load_pickled_matches(pickle_file_path):
+    '''
+    :param pickle_file_path: output of decode.py, either one pickled list of MatchWrapper.to_pickle() dicts or (when
+                             decoding with --stream) a sequence of such lists, one per document
+    :return: list[dict]
+    '''
+
+    match_dicts = []
+    with open(pickle_file_path, 'rb') as f:
+        while True:
+            try:
+                match_dicts.extend(pickle.load(f))
+            except EOFError:
+                break
+
+    return match_dicts
+
 
 def main(args):
     # read serifxml path(s)
@@ -60,18 +180,18 @@ def main(args):
     match_dicts = []
     for pickle_file in os.listdir(args.matches):
         pickled_file_path = os.path.join(args.matches, pickle_file)
-        with open(pickled_file_path, 'rb') as f:
-            unpickled_matches = pickle.load(f)
-        match_dicts.extend(unpickled_matches)
+        match_dicts.extend(load_pickled_matches(pickled_file_path))
 
     all_matches = []
     for match_dict in match_dicts:
         pattern = Pattern()
         pattern.load_from_json(match_dict['pattern'])
+        serif_doc = docid_to_doc[match_dict['docid']]
+        serif_sentence = serif_doc.sentences[match_dict['sent_no']] if match_dict['sent_no'] is not None else None
         match = MatchWrapper(match_node_id_to_pattern_node_id=match_dict['match_node_id_to_pattern_node_id'],
                              pattern=pattern,
-                             serif_sentence=docid_to_doc[match_dict['docid']].sentences[match_dict['sent_no']],
-                             serif_doc=docid_to_doc[match_dict['docid']],
+                             serif_sentence=serif_sentence,
+                             serif_doc=serif_doc,
                              category=match_dict['category'])
         all_matches.append(match)
 
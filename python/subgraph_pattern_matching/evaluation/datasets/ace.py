@@ -3,11 +3,42 @@ from itertools import chain
 from annotation.ingestion.event_ingester import ACE_ENGLISH
 from ...evaluation.utils import AnnotationScheme, KnowledgeElement, create_corpus_directory, \
     serif_sentence_to_event_trigger_bio_list, \
-    serif_sentence_to_event_argument_bio_list, serif_sentence_to_bio_list_based_on_predictions
+    serif_sentence_to_event_argument_bio_list, serif_sentence_to_bio_list_based_on_predictions, \
+    lookup_sentence_prediction
 from sklearn.metrics import classification_report
 
 
-def score_ace(matches_by_serif_id, SPLIT='TEST', annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION):
+def predict_ace_sentence(serif_sentence, matches_for_sentence,
+                         annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION):
+    '''
+    :param serif_sentence: serif.theory.sentence.Sentence
+    :param matches_for_sentence: list[match_wrapper.MatchWrapper]
+    :return: (event trigger bio list, event argument bio list)
+    '''
+
+    pred_event_trigger_bio = serif_sentence_to_bio_list_based_on_predictions(serif_sentence=serif_sentence,
+                                                                             matches_for_sentence=matches_for_sentence,
+                                                                             ke=KnowledgeElement.EVENT_TRIGGER,
+                                                                             annotation_scheme=annotation_scheme)
+    pred_event_argument_bio = serif_sentence_to_bio_list_based_on_predictions(serif_sentence=serif_sentence,
+                                                                              matches_for_sentence=matches_for_sentence,
+                                                                              ke=KnowledgeElement.EVENT_ARGUMENT,
+                                                                              annotation_scheme=annotation_scheme)
+
+    return pred_event_trigger_bio, pred_event_argument_bio
+
+
+def score_ace(matches_by_serif_id=None, SPLIT='TEST', annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION,
+              predictions_by_serif_id=None):
+    '''
+    :param matches_by_serif_id: {docid: {sent_id: match}}
+    :param SPLIT: 'TRAIN', 'DEV', 'TEST'
+    :param predictions_by_serif_id: {docid: {sent_id: (event trigger bio list, event argument bio list)}}, used instead
+                                    of matches_by_serif_id if given
+    '''
+
+    def predict_sentence(serif_sentence, matches_for_sentence):
+        return predict_ace_sentence(serif_sentence, matches_for_sentence, annotation_scheme=annotation_scheme)
 
     ace_corpus_dir = create_corpus_directory(ACE_ENGLISH)
 
@@ -28,24 +59,18 @@ def score_ace(matches_by_serif_id, SPLIT='TEST', annotation_scheme=AnnotationSch
                                                                                      annotation_scheme=annotation_scheme)
                                            for s in gold_serif_doc.sentences]
 
-        # pred event trigger bio lists
-        pred_matches = matches_by_serif_id[gold_serif_doc.docid]
+        # pred event trigger and event argument bio lists
+        pred_bio_for_doc = [lookup_sentence_prediction(serif_doc=gold_serif_doc,
+                                                       serif_sentence=s,
+                                                       predict_sentence=predict_sentence,
+                                                       matches_by_serif_id=matches_by_serif_id,
+                                                       predictions_by_serif_id=predictions_by_serif_id) \
+                            for s in gold_serif_doc.sentences]
 
-        pred_event_trigger_bio_for_doc = [serif_sentence_to_bio_list_based_on_predictions(serif_sentence=s,
-                                                                                          matches_for_sentence=
-                                                                                          pred_matches[s.id],
-                                                                                          ke=KnowledgeElement.EVENT_TRIGGER,
-                                                                                          annotation_scheme=annotation_scheme) \
-                                          for s in gold_serif_doc.sentences]
+        pred_event_trigger_bio_for_doc = [trigger_bio for trigger_bio, _ in pred_bio_for_doc]
         pred_event_trigger_bio.extend(pred_event_trigger_bio_for_doc)
 
-        # pred event argument bio lists
-        pred_event_argument_bio_for_doc = [serif_sentence_to_bio_list_based_on_predictions(serif_sentence=s,
-                                                                                           matches_for_sentence=
-                                                                                           pred_matches[s.id],
-                                                                                           ke=KnowledgeElement.EVENT_ARGUMENT,
-                                                                                           annotation_scheme=annotation_scheme) \
-                                           for s in gold_serif_doc.sentences]
+        pred_event_argument_bio_for_doc = [argument_bio for _, argument_bio in pred_bio_for_doc]
 
         for i, (g, p) in enumerate(list(zip(gold_event_trigger_bio_for_doc, pred_event_trigger_bio_for_doc))):
             if g != p:
@@ -21,11 +21,43 @@ def get_governed_text(match, node_id):
     return " ".join(governed_texts)
 
 
-def score_aida(matches_by_serif_id, SPLIT='TEST'):
+def predict_aida_sentence(serif_sentence, matches_for_sentence):
+    '''
+    :param serif_sentence: serif.theory.sentence.Sentence
+    :param matches_for_sentence: list[match_wrapper.MatchWrapper]
+    :return: list[(claimer token id, event trigger token id, governed author, event trigger text, governed text,
+                   sentence text, pattern id, grid search)], one per match
+    '''
+
+    claim_candidates = []
+    for match in matches_for_sentence:
+        # finding tokens for match
+        claimant_node_ids = list(match.pattern.get_named_entity_node_ids())
+        event_trigger_node_ids = list(match.pattern.get_event_trigger_node_ids())
+        assert len(claimant_node_ids) == 1
+        assert len(event_trigger_node_ids) == 1
+        match_claimant_node_id = match.pattern_node_id_to_match_node_id[claimant_node_ids[0]]
+        match_event_node_id =  match.pattern_node_id_to_match_node_id[event_trigger_node_ids[0]]
+        claimer_serif_token = match.match_to_serif_theory(match_id=match_claimant_node_id, serif_doc=match.serif_doc)
+        event_trigger_serif_token = match.match_to_serif_theory(match_id=match_event_node_id, serif_doc=match.serif_doc)
+
+        governed_text = get_governed_text(match, match_event_node_id)
+        governed_author = get_governed_text(match, match_claimant_node_id)
+
+        claim_candidates.append((claimer_serif_token.id, event_trigger_serif_token.id, governed_author,
+                                 event_trigger_serif_token.text, governed_text, serif_sentence.text,
+                                 match.pattern.pattern_id, match.pattern.grid_search))
+
+    return claim_candidates
+
+
+def score_aida(matches_by_serif_id=None, SPLIT='TEST', predictions_by_serif_id=None):
     '''
 
     :param matches_by_serif_id: {docid: {sent_id: match}}
     :param SPLIT: 'TRAIN', 'DEV', 'TEST'
+    :param predictions_by_serif_id: {docid: {sent_id: claim candidates (see predict_aida_sentence)}}, used instead of
+                                    matches_by_serif_id if given
     :return:
     '''
     aida_corpus = ClaimIngester().ingest_aida(small=False)
@@ -56,21 +88,17 @@ def score_aida(matches_by_serif_id, SPLIT='TEST'):
     for serif_doc_id, serif_sentence_to_annotation_list in serif_docs.items():
 
         print(serif_doc_id)
-        for sentence_id, matches in matches_by_serif_id[serif_doc_id].items():
-
-            for match in matches:
-                # finding tokens for match
-                claimant_node_ids = list(match.pattern.get_named_entity_node_ids())
-                event_trigger_node_ids = list(match.pattern.get_event_trigger_node_ids())
-                assert len(claimant_node_ids) == 1
-                assert len(event_trigger_node_ids) == 1
-                match_claimant_node_id = match.pattern_node_id_to_match_node_id[claimant_node_ids[0]]
-                match_event_node_id =  match.pattern_node_id_to_match_node_id[event_trigger_node_ids[0]]
-                claimer_serif_token = match.match_to_serif_theory(match_id=match_claimant_node_id, serif_doc=match.serif_doc)
-                event_trigger_serif_token = match.match_to_serif_theory(match_id=match_event_node_id, serif_doc=match.serif_doc)
-
-                governed_text = get_governed_text(match, match_event_node_id)
-                governed_author = get_governed_text(match, match_claimant_node_id)
+        if predictions_by_serif_id is not None:
+            claim_candidates_by_sentence_id = predictions_by_serif_id.get(serif_doc_id, {})
+        else:
+            claim_candidates_by_sentence_id = {sentence_id: predict_aida_sentence(matches[0].serif_sentence, matches)
+                                               for sentence_id, matches in matches_by_serif_id[serif_doc_id].items()
+                                               if matches}
+
+        for sentence_id, claim_candidates in claim_candidates_by_sentence_id.items():
+
+            for claim_candidate in claim_candidates:
+                claimer_id, event_trigger_id = claim_candidate[:2]
                 annotations = serif_sentence_to_annotation_list.get(sentence_id, None)
 
                 if annotations is None:
@@ -81,19 +109,20 @@ def score_aida(matches_by_serif_id, SPLIT='TEST'):
                     _, anno_claimer_id = annotation._frame.claimer.token_node_ids[0].split("__")
                     _, anno_event_trigger_id = annotation._frame.claim_trigger.token_node_ids[0].split("__")
 
-                    if anno_claimer_id == claimer_serif_token.id and anno_event_trigger_id == event_trigger_serif_token.id:
+                    if anno_claimer_id == claimer_id and anno_event_trigger_id == event_trigger_id:
                         existing_claim = True
                         print("Match found!")
                         break
 
-                claim_tuple = (governed_author, event_trigger_serif_token.text, governed_text, match.serif_sentence.text, existing_claim, match.pattern.pattern_id, match.pattern.grid_search)
+                governed_author, event_trigger_text, governed_text, sentence_text, pattern_id, grid_search = claim_candidate[2:]
+                claim_tuple = (governed_author, event_trigger_text, governed_text, sentence_text, existing_claim, pattern_id, grid_search)
                 if claim_tuple in found_claims:
                     continue
 
                 if existing_claim:
                     old_claims_found += 1
                     # print("Old claim:")
-                    # print("Author: {}\n Event Trigger: {}\n Inner claim: {}\n Sentence: {}".format(governed_author, event_trigger_serif_token.text, governed_text, match.serif_sentence.text))
+                    # print("Author: {}\n Event Trigger: {}\n Inner claim: {}\n Sentence: {}".format(governed_author, event_trigger_text, governed_text, sentence_text))
                 else:
                     new_claims_found += 1
                     # print("New claim:")
@@ -3,15 +3,31 @@ from itertools import chain
 from ...annotation.ingestion.ner_ingester import CONLL_ENGLISH
 from ...evaluation.utils import AnnotationScheme, KnowledgeElement, create_corpus_directory, \
     serif_sentence_to_ner_bio_list, \
-    serif_sentence_to_bio_list_based_on_predictions
+    serif_sentence_to_bio_list_based_on_predictions, lookup_sentence_prediction
 from sklearn.metrics import classification_report
 
 
-def score_conll(matches_by_serif_id, SPLIT='TEST', annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION):
+def predict_conll_sentence(serif_sentence, matches_for_sentence,
+                           annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION):
+    '''
+    :param serif_sentence: serif.theory.sentence.Sentence
+    :param matches_for_sentence: list[match_wrapper.MatchWrapper]
+    :return: list[str], predicted bio list
+    '''
+
+    return serif_sentence_to_bio_list_based_on_predictions(serif_sentence=serif_sentence,
+                                                           matches_for_sentence=matches_for_sentence,
+                                                           ke=KnowledgeElement.NAMED_ENTITY,
+                                                           annotation_scheme=annotation_scheme)
+
+
+def score_conll(matches_by_serif_id=None, SPLIT='TEST', annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION,
+                predictions_by_serif_id=None):
     '''
 
     :param matches_by_serif_id: {docid: {sent_id: match}}
     :param SPLIT: 'TRAIN', 'DEV', 'TEST'
+    :param predictions_by_serif_id: {docid: {sent_id: bio list}}, used instead of matches_by_serif_id if given
     :return:
     '''
 
@@ -25,11 +41,14 @@ def score_conll(matches_by_serif_id, SPLIT='TEST', annotation_scheme=AnnotationS
                 for s in gold_serif_doc.sentences]
 
     # get pred test bio list
-    pred_matches = matches_by_serif_id[gold_serif_doc.docid]
-    pred_bio = [serif_sentence_to_bio_list_based_on_predictions(serif_sentence=s,
-                                                                matches_for_sentence=pred_matches[s.id],
-                                                                ke=KnowledgeElement.NAMED_ENTITY,
-                                                                annotation_scheme=annotation_scheme) \
+    def predict_sentence(serif_sentence, matches_for_sentence):
+        return predict_conll_sentence(serif_sentence, matches_for_sentence, annotation_scheme=annotation_scheme)
+
+    pred_bio = [lookup_sentence_prediction(serif_doc=gold_serif_doc,
+                                           serif_sentence=s,
+                                           predict_sentence=predict_sentence,
+                                           matches_by_serif_id=matches_by_serif_id,
+                                           predictions_by_serif_id=predictions_by_serif_id) \
                      for s in gold_serif_doc.sentences]
 
     for i, (g, p) in enumerate(list(zip(gold_bio, pred_bio))):
@@ -62,6 +62,29 @@ def create_corpus_directory(corpus_paths_dict):
     return corpus_dir
 
 
+def lookup_sentence_prediction(serif_doc, serif_sentence, predict_sentence,
+                               matches_by_serif_id=None, predictions_by_serif_id=None):
+    '''
+    Prediction for a gold sentence, computed from its matches or taken from the predictions accumulated while decoding
+    (see evaluate.EvaluationAccumulator)
+
+    :param serif_doc: serif.theory.document.Document
+    :param serif_sentence: serif.theory.sentence.Sentence
+    :param predict_sentence: function(serif_sentence, list[match_wrapper.MatchWrapper]) -> prediction
+    :param matches_by_serif_id: {docid: {sent_id: list[match_wrapper.MatchWrapper]}}
+    :param predictions_by_serif_id: {docid: {sent_id: prediction}}, only for sentences with matches
+    :return: prediction
+    '''
+
+    if predictions_by_serif_id is not None:
+        prediction = predictions_by_serif_id.get(serif_doc.docid, {}).get(serif_sentence.id, None)
+        if prediction is None:
+            prediction = predict_sentence(serif_sentence, [])
+        return prediction
+
+    return predict_sentence(serif_sentence, matches_by_serif_id[serif_doc.docid][serif_sentence.id])
+
+
 def serif_sentence_to_ner_bio_list(serif_sentence, annotation_scheme=AnnotationScheme.IDENTIFICATION_CLASSIFICATION):
     '''
 
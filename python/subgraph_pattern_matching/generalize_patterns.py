@@ -7,7 +7,6 @@ from collections import Counter
 
 import networkx as nx
 from networkx.algorithms import isomorphism
-import numpy as np
 from .constants.common.attrs.edge.edge_attrs import EdgeAttrs
 from .constants.common.attrs.node.node_attrs import NodeAttrs
 from .graph_builder import GraphBuilder
@@ -23,15 +22,29 @@ class GeneralizationStrategy(enum.Enum):
     GSpan = enum.auto()
     SPMiner = enum.auto()
 
-def central_graph_strategy(patterns_list, distance_matrix_path, labels_path):
-    from clustering.central_graph_utils import get_central_graph_per_cluster, find_pattern_for_cluster
+def central_graph_strategy(patterns_list, distance_matrix_path, labels_path, pattern_mapping_path=None):
+    from clustering.central_graph_utils import get_central_graph_per_cluster, get_clusters_with_bounded_distances, \
+        find_pattern_for_cluster
+    from clustering.condensed_distance_matrix import load_distance_matrix, load_exact_flags
+    from clustering.pattern_mapping import PatternMapping
 
-    with open(distance_matrix_path, 'rb') as f:
-        distance_matrix = np.load(f)
+    distance_matrix = load_distance_matrix(distance_matrix_path)
+    exact = load_exact_flags(distance_matrix_path)
+    if pattern_mapping_path is not None:  # distances between unique local patterns
+        pattern_mapping = PatternMapping.load(pattern_mapping_path)
+        distance_matrix = pattern_mapping.expand_distance_matrix(distance_matrix)
+        if exact is not None:
+            exact = pattern_mapping.expand_distance_matrix(exact)
 
     with open(labels_path, 'r') as f:
         labels = json.load(f)
 
+    if exact is not None:
+        bounded_clusters = get_clusters_with_bounded_distances(labels, exact)
+        if bounded_clusters:
+            print("Warning: the central graphs of clusters {} are chosen from lower bounds of some of their distances, "
+                  "recompute the distance matrix with a larger --distance_cutoff".format(bounded_clusters))
+
     # Find a representative graph for each cluster of digraphs
     cluster_to_central_graph_indexes = get_central_graph_per_cluster(labels, distance_matrix)
     cluster_num_to_cluster_patterns = [None] * (max(labels) + 1)
@@ -280,7 +293,8 @@ def main(args):
     elif GeneralizationStrategy[args.strategy] == GeneralizationStrategy.GSpan:
         generalized_patterns_lists = gspan_strategy(args, pattern_list)
     elif GeneralizationStrategy[args.strategy] == GeneralizationStrategy.CentralGraph:
-        generalized_patterns_lists = central_graph_strategy(pattern_list, args.distance_matrix, args.labels)
+        generalized_patterns_lists = central_graph_strategy(pattern_list, args.distance_matrix, args.labels,
+                                                            args.pattern_mapping)
     elif GeneralizationStrategy[args.strategy] == GeneralizationStrategy.SPMiner:
         generalized_patterns_lists = spminer_strategy(args, pattern_list)
     else:
@@ -320,6 +334,8 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--strategy', type=str, required=True)
     parser.add_argument('-d', '--distance_matrix', type=str, default=None)
     parser.add_argument('-l', '--labels', type=str, default=None)
+    parser.add_argument('--pattern_mapping', type=str, default=None,
+                        help="PatternMapping json if the distance matrix is between unique local patterns")
     parser.add_argument('--min_support', type=int, default=40, help="Minimum number of supporting graphs for gspan")
     parser.add_argument('--min_num_vertices', type=int, default=7, help="Minimum number of vertices in gspan pattern")
     parser.add_argument('--max_num_vertices', type=float, default=float('inf'), help="Maximum number of vertices in gspan pattern")
@@ -1,6 +1,10 @@
 import json
 import logging
 import re
+import sys
+import weakref
+from collections import deque
+from types import MappingProxyType
 
 import networkx as nx
 from .constants.common.attrs.edge.amr_edge_attrs import AMREdgeAttrs
@@ -16,6 +20,9 @@ from .constants.common.attrs.node.token_node_attrs import TokenNodeAttrs
 from .constants.common.types.edge_types import EdgeTypes
 from .constants.common.types.node_types import NodeTypes
 from .constants.special_symbols import ID_DELIMITER
+from .match_utils.attribute_index import AttributeIndex
+from .utils.graph_cache import GraphCache
+from .utils.graph_validation import IncrementalGraphValidator, ValidationLevel
 from .utils.verify_graph_compliance import verify_graph_compliance
 
 from serif.theory.event_mention import EventMention
@@ -25,92 +32,253 @@ from serif.theory.value_mention import ValueMention
 logging.basicConfig(level=logging.INFO)
 
 
+class TokenFeatureTable():
+    '''
+    Node features and indices of every token in a serif sentence, computed in one pass over the sentence (instead of
+    one token.index() scan per token_to_feats call). Tables are shared by every GraphBuilder (and ingester) and live as
+    long as the sentence object, i.e. for the lifetime of its document.
+    '''
+
+    _tables = weakref.WeakKeyDictionary()  # serif sentence -> TokenFeatureTable
+
+    def __init__(self, serif_sentence):
+        '''
+        :param serif_sentence: serif.theory.sentence.Sentence
+        '''
+
+        sent_no = str(serif_sentence.sent_no)
+
+        self.index_by_token_id = {}
+        self.feats_by_token_id = {}
+        for i, token in enumerate(serif_sentence.token_sequence):
+            index = str(i)
+            self.index_by_token_id[token.id] = i
+            self.feats_by_token_id[token.id] = MappingProxyType({
+                NodeAttrs.id: ID_DELIMITER.join([token.text, token.id]),
+                NodeAttrs.node_type: NodeTypes.token,
+                TokenNodeAttrs.text: token.text,
+                TokenNodeAttrs.upos: token.upos,
+                TokenNodeAttrs.xpos: token.xpos,
+                TokenNodeAttrs.index_in_doc: "_".join([sent_no, index, index]),
+                TokenNodeAttrs.incoming_dep_rel: token.dep_rel})
+
+    @classmethod
+    def for_sentence(cls, serif_sentence):
+        '''
+        :return: TokenFeatureTable of serif_sentence (built on first use), or None if it can't be memoized
+        '''
+
+        try:
+            table = cls._tables.get(serif_sentence)
+        except TypeError:  # sentence can't be weakly referenced
+            return None
+
+        if table is None:
+            table = cls(serif_sentence)
+            cls._tables[serif_sentence] = table
+
+        return table
+
+
 class GraphBuilder():
 
-    def __init__(self, dp=True, amr=True, mdp=False, tdp=False):
-        '''specify which parse types we want to load into nx graph'''
+    def __init__(self, dp=True, amr=True, mdp=False, tdp=False, attribute_index=False, graph_cache_dir=None,
+                 validation=ValidationLevel.FULL):
+        '''
+        specify which parse types we want to load into nx graph
+
+        :param attribute_index: whether to attach a match_utils.attribute_index.AttributeIndex to every built graph
+        :param graph_cache_dir: None or directory of a utils.graph_cache.GraphCache, read through whenever graphs are
+                                requested together with the path of the serifxml they come from
+        :param validation: utils.graph_validation.ValidationLevel.X, how to check built graphs for cycles and
+                           compliance
+        '''
 
         self.dp = dp
         self.amr = amr
         self.mdp = mdp
         self.tdp = tdp
+        self.attribute_index = attribute_index
+        self.graph_cache = GraphCache(graph_cache_dir) if graph_cache_dir else None
+        self.validation = validation
 
-    def serif_doc_to_networkx(self, serif_doc):
+    def parse_types(self):
+        return {'dp': self.dp, 'amr': self.amr, 'mdp': self.mdp, 'tdp': self.tdp}
+
+    def create_validator(self, G, description, check_compliance=True):
+        '''
+        :return: IncrementalGraphValidator checking edges as they're added to G at ValidationLevel.FAST, else None
+        '''
+
+        if self.validation != ValidationLevel.FAST:
+            return None
+        return IncrementalGraphValidator(G, description, check_compliance=check_compliance)
+
+    def validate_graph(self, G, description, check_compliance=True):
+        '''
+        ValidationLevel.FULL checks of a finished graph
+
+        :param description: str, what G is, for the warning logged when a cycle is detected
+        '''
+
+        if self.validation != ValidationLevel.FULL:
+            return
+
+        if not nx.algorithms.dag.is_directed_acyclic_graph(G):
+            logging.warning("Cycle detected in %s" % description)
+            logging.warning(str(nx.algorithms.cycles.find_cycle(G)))
+        if check_compliance:
+            verify_graph_compliance(G)
+
+    def read_graph_cache(self, serifxml_path, per_sentence):
+        '''
+        :param serifxml_path: None or path of the serifxml the graphs are built from
+        :param per_sentence: whether the graphs are per sentence or for the whole document
+        :return: list[networkx.classes.digraph.DiGraph] from the graph cache, or None if they aren't cached
+        '''
+
+        if self.graph_cache is None or serifxml_path is None:
+            return None
+
+        graphs = self.graph_cache.get(serifxml_path, self.parse_types(), per_sentence)
+        if graphs is not None and self.attribute_index:
+            for G in graphs:
+                AttributeIndex.attach(G)
+        return graphs
+
+    def read_through_graph_cache(self, serifxml_path, per_sentence, build_graphs):
+        '''
+        :param serifxml_path: None or path of the serifxml the graphs are built from
+        :param per_sentence: whether the graphs are per sentence or for the whole document
+        :param build_graphs: function() -> list[networkx.classes.digraph.DiGraph], called on a cache miss
+        :return: list[networkx.classes.digraph.DiGraph]
+        '''
+
+        if self.graph_cache is None or serifxml_path is None:
+            return build_graphs()
+
+        graphs = self.read_graph_cache(serifxml_path, per_sentence)
+        if graphs is not None:
+            return graphs
+
+        graphs = build_graphs()
+
+        # attribute indexes are cheap to rebuild and depend on the builder, not on the serifxml, so don't cache them
+        attribute_indexes = [G.graph.pop(AttributeIndex.GRAPH_KEY, None) for G in graphs]
+        try:
+            self.graph_cache.put(serifxml_path, self.parse_types(), per_sentence, graphs)
+        finally:
+            for G, attribute_index in zip(graphs, attribute_indexes):
+                if attribute_index is not None:
+                    G.graph[AttributeIndex.GRAPH_KEY] = attribute_index
+
+        return graphs
+
+    def serif_doc_to_networkx(self, serif_doc, serifxml_path=None):
+        '''
+        :param serif_doc: serif.theory.document.Document
+        :param serifxml_path: None or path serif_doc was read from, to read the graph through the graph cache
+        :return: networkx.classes.digraph.DiGraph
+        '''
+
+        return self.read_through_graph_cache(serifxml_path, per_sentence=False,
+                                             build_graphs=lambda: [self.build_document_graph(serif_doc)])[0]
+
+    def build_document_graph(self, serif_doc):
         '''
         :param serif_doc: serif.theory.document.Document
         :return: networkx.classes.digraph.DiGraph
         '''
 
+        # every layer is written straight into G (rather than composing one graph per layer and sentence)
+        G = nx.DiGraph()
+        description = "graph for %s" % serif_doc.id
+        validator = self.create_validator(G, description)
+
         # make sure all the tokens in the document exist beforehand to prevent creating empty token nodes
         # when adding modal_constituent_token edges
-        disconnected_tokens_digraph = nx.DiGraph()
         for sentence in serif_doc.sentences:
-            for token in sentence.token_sequence:
-                token_feats = self.token_to_feats(token)
-                token_id = token_feats['id']
-                disconnected_tokens_digraph.add_node(token_id, **token_feats)
+            self.add_tokens(G, sentence.token_sequence)
 
-        union_of_parse_graphs = [disconnected_tokens_digraph]
         if self.mdp:
-            # document_level_modal_dependencies_graphs = [self.modal_dependency_parse_to_networkx(serif_doc)]
-            union_of_parse_graphs.append(self.modal_dependency_parse_to_networkx(serif_doc))
+            self.add_modal_dependency_parse(G, serif_doc, validator=validator)
         if self.tdp:
-            # document_level_temporal_dependencies_graphs = [self.temporal_dependency_parse_to_networkx(serif_doc)]
-            union_of_parse_graphs.append(self.temporal_dependency_parse_to_networkx(serif_doc))
+            self.add_temporal_dependency_parse(G, serif_doc, validator=validator)
         if self.dp:
-            # sentence_level_dependency_syntax_graphs = [self.syntactic_dependency_parse_to_networkx(s) for s in serif_doc.sentences]
-            union_of_parse_graphs.extend([self.syntactic_dependency_parse_to_networkx(s) for s in serif_doc.sentences])
+            for sentence in serif_doc.sentences:
+                self.add_syntactic_dependency_parse(G, sentence, validator=validator)
         if self.amr:
-            # sentence_level_amr_graphs = [self.amr_parse_to_networkx(s) for s in serif_doc.sentences]
-            union_of_parse_graphs.extend([self.amr_parse_to_networkx(s) for s in serif_doc.sentences])
+            self.add_amr_parses(G, serif_doc.sentences, validator=validator)
 
-        # compose into one document-level networkx DiGraph
-        G = nx.algorithms.operators.compose_all(union_of_parse_graphs)
+        self.validate_graph(G, description)
 
-        if not nx.algorithms.dag.is_directed_acyclic_graph(G):
-            logging.warning("Cycle detected in graph for %s" % serif_doc.id)
-            logging.warning(str(nx.algorithms.cycles.find_cycle(G)))
-        verify_graph_compliance(G)
+        if self.attribute_index:
+            AttributeIndex.attach(G)
 
         return G
 
-    def serif_doc_to_networkx_per_sentence(self, serif_doc):
+    def serif_doc_to_networkx_per_sentence(self, serif_doc, serifxml_path=None, sentence_indices=None):
         '''
         :param serif_doc: serif.theory.document.Document
-        :return: list[networkx.classes.digraph.DiGraph]
+        :param serifxml_path: None or path serif_doc was read from, to read the graphs through the graph cache
+        :param sentence_indices: None or list[int], only build the graphs of these sentences (e.g. a decode stripe's),
+                                 taken from the graph cache if the document's graphs are cached, but never cached
+                                 themselves since they aren't the whole document
+        :return: list[networkx.classes.digraph.DiGraph], one per sentence (of sentence_indices)
         '''
 
-        return [self.serif_sentence_to_networkx(s) for s in serif_doc.sentences]
+        if sentence_indices is not None:
+            graphs = self.read_graph_cache(serifxml_path, per_sentence=True)
+            if graphs is not None:
+                return [graphs[i] for i in sentence_indices]
 
-    def serif_sentence_to_networkx(self, serif_sentence):
+            amr_relations_cache = {}
+            return [self.serif_sentence_to_networkx(serif_doc.sentences[i], amr_relations_cache=amr_relations_cache)
+                    for i in sentence_indices]
+
+        def build_sentence_graphs():
+            amr_relations_cache = {}  # decode each distinct AMR relation list once per document
+            return [self.serif_sentence_to_networkx(s, amr_relations_cache=amr_relations_cache)
+                    for s in serif_doc.sentences]
+
+        return self.read_through_graph_cache(serifxml_path, per_sentence=True, build_graphs=build_sentence_graphs)
+
+    def serif_sentence_to_networkx(self, serif_sentence, amr_relations_cache=None):
         '''
         :param serif_sentence: serif.theory.sentence.Sentence
+        :param amr_relations_cache: None or dict shared across sentences, see add_amr_parse
         :return: networkx.classes.digraph.DiGraph
         '''
 
+        G = nx.DiGraph()
+        description = "graph for %s" % serif_sentence.id
+        validator = self.create_validator(G, description)
+
         # make sure all the tokens in the sentence exist beforehand
-        disconnected_tokens_digraph = nx.DiGraph()
-        for token in serif_sentence.token_sequence:
-            token_feats = self.token_to_feats(token)
-            token_id = token_feats['id']
-            disconnected_tokens_digraph.add_node(token_id, **token_feats)
+        self.add_tokens(G, serif_sentence.token_sequence)
 
-        union_of_parse_graphs = [disconnected_tokens_digraph]
         if self.dp:
-            union_of_parse_graphs.append(self.syntactic_dependency_parse_to_networkx(serif_sentence))
+            self.add_syntactic_dependency_parse(G, serif_sentence, validator=validator)
         if self.amr:
-            union_of_parse_graphs.append(self.amr_parse_to_networkx(serif_sentence))
+            self.add_amr_parse(G, serif_sentence, amr_relations_cache=amr_relations_cache, validator=validator)
 
-        # compose into one sentence-level networkx DiGraph
-        G = nx.algorithms.operators.compose_all(union_of_parse_graphs)
+        self.validate_graph(G, description)
 
-        if not nx.algorithms.dag.is_directed_acyclic_graph(G):
-            logging.warning("Cycle detected in graph for %s" % serif_sentence.id)
-            logging.warning(str(nx.algorithms.cycles.find_cycle(G)))
-        verify_graph_compliance(G)
+        if self.attribute_index:
+            AttributeIndex.attach(G)
 
         return G
 
+    def add_tokens(self, G, tokens):
+        '''
+        :param G: networkx.classes.digraph.DiGraph to add token nodes to
+        :param tokens: iterable of serif.theory.token.Token
+        '''
+
+        for token in tokens:
+            token_feats = self.token_to_feats(token)
+            G.add_node(token_feats['id'], **token_feats)
+
     def modal_dependency_parse_to_networkx(self, serif_doc):
         '''
         :param serif_doc: serif.theory.document.Document
@@ -118,9 +286,24 @@ class GraphBuilder():
         '''
 
         G = nx.DiGraph()
+        description = "MDP for %s" % serif_doc.id
+
+        # token nodes aren't part of the parse graph, so only check for cycles
+        validator = self.create_validator(G, description, check_compliance=False)
+        self.add_modal_dependency_parse(G, serif_doc, validator=validator)
+        self.validate_graph(G, description, check_compliance=False)
+
+        return G
+
+    def add_modal_dependency_parse(self, G, serif_doc, validator=None):
+        '''
+        :param G: networkx.classes.digraph.DiGraph to add the parse to
+        :param serif_doc: serif.theory.document.Document
+        :param validator: None or utils.graph_validation.IncrementalGraphValidator of G
+        '''
 
         if serif_doc.modal_temporal_relation_mention_set is None:
-            return G
+            return
 
         mtrm_list = [m for m in serif_doc.modal_temporal_relation_mention_set if re.match("(.*)_modal", m.node.model)]
 
@@ -136,6 +319,8 @@ class GraphBuilder():
             G.add_edges_from(list(map(lambda t: (parent_mtrm_id, t), parent_token_ids)),
                              **{EdgeAttrs.label: EdgeTypes.modal_constituent_token,
                                 EdgeAttrs.edge_type: EdgeTypes.modal_constituent_token})
+            if validator is not None:
+                validator.check_nodes(parent_token_ids)  # tokens can't reach back to parent_mtrm_id
 
             for child_mtrm in parent_mtrm.children:
 
@@ -149,32 +334,42 @@ class GraphBuilder():
                 G.add_edges_from(list(map(lambda t: (child_mtrm_id, t), child_token_ids)),
                                  **{EdgeAttrs.label: EdgeTypes.modal_constituent_token,
                                     EdgeAttrs.edge_type: EdgeTypes.modal_constituent_token})
+                if validator is not None:
+                    validator.check_nodes(child_token_ids)  # tokens can't reach back to child_mtrm_id
 
                 # modal dependency edge between parent and child nodes
                 G.add_edge(parent_mtrm_id, child_mtrm_id,
                            **{EdgeAttrs.label: child_mtrm_feats[ModalNodeAttrs.modal_relation],
                               ModalEdgeAttrs.modal_relation: child_mtrm_feats[ModalNodeAttrs.modal_relation],
                               EdgeAttrs.edge_type: EdgeTypes.modal})
-
-        try:
-            assert nx.algorithms.dag.is_directed_acyclic_graph(G)
-        except AssertionError:
-            logging.warning("Cycle detected in MDP for %s" % serif_doc.id)
-            logging.warning(str(nx.algorithms.cycles.find_cycle(G)))
-
-        return G
+                if validator is not None:
+                    validator.check_edge(parent_mtrm_id, child_mtrm_id)
 
     def temporal_dependency_parse_to_networkx(self, serif_doc):
-
         '''
         :param serif_doc: serif.theory.document.Document
         :return: networkx.classes.digraph.DiGraph
         '''
 
         G = nx.DiGraph()
+        description = "MDP for %s" % serif_doc.id
+
+        # token nodes aren't part of the parse graph, so only check for cycles
+        validator = self.create_validator(G, description, check_compliance=False)
+        self.add_temporal_dependency_parse(G, serif_doc, validator=validator)
+        self.validate_graph(G, description, check_compliance=False)
+
+        return G
+
+    def add_temporal_dependency_parse(self, G, serif_doc, validator=None):
+        '''
+        :param G: networkx.classes.digraph.DiGraph to add the parse to
+        :param serif_doc: serif.theory.document.Document
+        :param validator: None or utils.graph_validation.IncrementalGraphValidator of G
+        '''
 
         if serif_doc.modal_temporal_relation_mention_set is None:
-            return G
+            return
 
         mtrm_list = [m for m in serif_doc.modal_temporal_relation_mention_set if re.match("(.*)_time", m.node.model)]
 
@@ -190,6 +385,8 @@ class GraphBuilder():
             G.add_edges_from(list(map(lambda t: (parent_mtrm_id, t), parent_token_ids)),
                              **{EdgeAttrs.label: EdgeTypes.temporal_constituent_token,
                                 EdgeAttrs.edge_type: EdgeTypes.temporal_constituent_token})
+            if validator is not None:
+                validator.check_nodes(parent_token_ids)  # tokens can't reach back to parent_mtrm_id
 
             for child_mtrm in parent_mtrm.children:
 
@@ -203,20 +400,16 @@ class GraphBuilder():
                 G.add_edges_from(list(map(lambda t: (child_mtrm_id, t), child_token_ids)),
                                  **{EdgeAttrs.label: EdgeTypes.temporal_constituent_token,
                                     EdgeAttrs.edge_type: EdgeTypes.temporal_constituent_token})
+                if validator is not None:
+                    validator.check_nodes(child_token_ids)  # tokens can't reach back to child_mtrm_id
 
                 # temporal dependency edge between parent and child nodes
                 G.add_edge(parent_mtrm_id, child_mtrm_id,
                            **{EdgeAttrs.label: child_mtrm_feats[TemporalNodeAttrs.temporal_relation],
                               TemporalEdgeAttrs.temporal_relation: child_mtrm_feats[TemporalNodeAttrs.temporal_relation],
                               EdgeAttrs.edge_type: EdgeTypes.temporal})
-
-        try:
-            assert nx.algorithms.dag.is_directed_acyclic_graph(G)
-        except AssertionError:
-            logging.warning("Cycle detected in MDP for %s" % serif_doc.id)
-            logging.warning(str(nx.algorithms.cycles.find_cycle(G)))
-
-        return G
+                if validator is not None:
+                    validator.check_edge(parent_mtrm_id, child_mtrm_id)
 
     def syntactic_dependency_parse_to_networkx(self, serif_sentence):
         '''
@@ -228,11 +421,17 @@ class GraphBuilder():
 
         # Add all nodes first, to handle case where sentence consists of
         # a single token.
+        self.add_tokens(G, serif_sentence.token_sequence)
+        self.add_syntactic_dependency_parse(G, serif_sentence)
 
-        for i, token in enumerate(serif_sentence.token_sequence):
-            child_feats = self.token_to_feats(token)
-            child_id = child_feats['id']
-            G.add_node(child_id, **child_feats)
+        return G
+
+    def add_syntactic_dependency_parse(self, G, serif_sentence, validator=None):
+        '''
+        :param G: networkx.classes.digraph.DiGraph to add the parse to, expected to contain the sentence's tokens
+        :param serif_sentence: serif.theory.sentence.Sentence
+        :param validator: None or utils.graph_validation.IncrementalGraphValidator of G
+        '''
 
         for i, token in enumerate(serif_sentence.token_sequence):
             if token.head == None:  # root token, can't be child
@@ -248,8 +447,8 @@ class GraphBuilder():
                        **{EdgeAttrs.label: token.dep_rel,
                           SyntaxEdgeAttrs.dep_rel: token.dep_rel,
                           EdgeAttrs.edge_type: EdgeTypes.syntax})
-
-        return G
+            if validator is not None:
+                validator.check_edge(parent_id, child_id)
 
     def amr_parse_to_networkx(self, serif_sentence):
         '''
@@ -258,30 +457,53 @@ class GraphBuilder():
         '''
 
         G = nx.DiGraph()
+        self.add_amr_parse(G, serif_sentence)
+
+        return G
+
+    def add_amr_parses(self, G, serif_sentences, validator=None):
+        '''
+        batch mode of add_amr_parse, e.g. over all sentences of a document; each distinct relation list is decoded once
+
+        :param G: networkx.classes.digraph.DiGraph to add the parses to
+        :param serif_sentences: iterable of serif.theory.sentence.Sentence
+        :param validator: None or utils.graph_validation.IncrementalGraphValidator of G
+        '''
+
+        amr_relations_cache = {}
+        for serif_sentence in serif_sentences:
+            self.add_amr_parse(G, serif_sentence, amr_relations_cache=amr_relations_cache, validator=validator)
+
+    def add_amr_parse(self, G, serif_sentence, amr_relations_cache=None, validator=None):
+        '''
+        :param G: networkx.classes.digraph.DiGraph to add the parse to
+        :param serif_sentence: serif.theory.sentence.Sentence
+        :param amr_relations_cache: None or dict from raw outgoing relations json to decoded relations, shared across
+                                    sentences in batch mode
+        :param validator: None or utils.graph_validation.IncrementalGraphValidator of G
+        '''
 
         amr_parse = serif_sentence.amr_parse
         if amr_parse is None:
-            return G
+            return
+
+        if amr_relations_cache is None:
+            amr_relations_cache = {}
 
         root_amr_node = amr_parse.root
         root_amr_node_feats = self.amr_node_to_feats(root_amr_node)
         root_amr_node_id = root_amr_node_feats['id']
+        G.add_node(root_amr_node_id, **{k: v for k, v in root_amr_node_feats.items() if type(v) == str})
 
-        # perform BFS starting from root amr node
-
-        visited = []  # List to keep track of visited nodes.
-        queue = []  # Initialize a queue
+        # perform BFS starting from root amr node; a node is added when it is first reached and only the edge
+        # through which it is first reached is kept, so AMR edges form a tree (and need no validation)
 
-        visited.append(root_amr_node_id)
-        queue.append(root_amr_node)
+        visited = {root_amr_node_id}
+        queue = deque([(root_amr_node, root_amr_node_id)])
 
         while queue:
 
-            curr_amr_node = queue.pop(0)
-
-            curr_amr_node_feats = self.amr_node_to_feats(curr_amr_node)
-            curr_amr_node_id = curr_amr_node_feats['id']
-            G.add_node(curr_amr_node_id, **{k: v for k, v in curr_amr_node_feats.items() if type(v) == str})
+            curr_amr_node, curr_amr_node_id = queue.popleft()
 
             # add edges to aligned tokens (if there are any)
             if curr_amr_node.tokens is not None:
@@ -294,33 +516,57 @@ class GraphBuilder():
                     G.add_edge(curr_amr_node_id, aligned_token_id,
                                **{EdgeAttrs.label: EdgeTypes.amr_aligned_token,
                                   EdgeAttrs.edge_type: EdgeTypes.amr_aligned_token})
+                    if validator is not None:
+                        validator.check_node(aligned_token_id)  # tokens can't reach back to AMR nodes
+
+            if not curr_amr_node._children:
+                continue
+
+            outgoing_amr_rels = self.decode_amr_relations(curr_amr_node._outgoing_amr_rels, amr_relations_cache)
 
             # iterate over child nodes
             for i, child_amr_node in enumerate(curr_amr_node._children):
 
-                child_amr_node_feats = self.amr_node_to_feats(child_amr_node)
-                child_amr_node_id = child_amr_node_feats['id']
+                child_amr_node_id = self.amr_node_id(child_amr_node)
 
                 if child_amr_node_id not in visited:
 
+                    child_amr_node_feats = self.amr_node_to_feats(child_amr_node)
                     G.add_node(child_amr_node_id, **{k: v for k, v in child_amr_node_feats.items() if type(v) == str})
 
                     G.add_edge(curr_amr_node_id, child_amr_node_id,
-                               **{EdgeAttrs.label: json.loads(curr_amr_node._outgoing_amr_rels)[i],
-                                  AMREdgeAttrs.amr_relation: json.loads(curr_amr_node._outgoing_amr_rels)[i],
+                               **{EdgeAttrs.label: outgoing_amr_rels[i],
+                                  AMREdgeAttrs.amr_relation: outgoing_amr_rels[i],
                                   EdgeAttrs.edge_type: EdgeTypes.amr})
 
-                    visited.append(child_amr_node_id)
-                    queue.append(child_amr_node)
+                    visited.add(child_amr_node_id)
+                    queue.append((child_amr_node, child_amr_node_id))
 
-        return G
+    @staticmethod
+    def decode_amr_relations(outgoing_amr_rels, amr_relations_cache):
+        '''
+        :param outgoing_amr_rels: json list of an AMR node's outgoing relations, e.g. '[":ARG0", ":ARG1"]'
+        :param amr_relations_cache: dict, memoizes the decoded (and interned) relations per json string
+        :return: tuple[str]
+        '''
+
+        relations = amr_relations_cache.get(outgoing_amr_rels, None)
+        if relations is None:
+            relations = tuple(sys.intern(r) if type(r) == str else r for r in json.loads(outgoing_amr_rels))
+            amr_relations_cache[outgoing_amr_rels] = relations
+
+        return relations
 
     def token_to_feats(self, token):
         '''
         :type token: serif.theory.token.Token
-        :return: dict
+        :return: read-only dict, shared by all calls for the same token
         '''
 
+        table = TokenFeatureTable.for_sentence(token.sentence)
+        if table is not None and token.id in table.feats_by_token_id:
+            return table.feats_by_token_id[token.id]
+
         feats = {NodeAttrs.id: ID_DELIMITER.join([token.text, token.id]),
                  NodeAttrs.node_type: NodeTypes.token,
                  TokenNodeAttrs.text: token.text,
@@ -331,6 +577,18 @@ class GraphBuilder():
 
         return feats
 
+    def token_index(self, token):
+        '''
+        :type token: serif.theory.token.Token
+        :return: int, same as token.index()
+        '''
+
+        table = TokenFeatureTable.for_sentence(token.sentence)
+        if table is not None and token.id in table.index_by_token_id:
+            return table.index_by_token_id[token.id]
+
+        return token.index()
+
     def modal_relation_mention_to_feats(self, mtrm):
         '''
         :param mtrm: serif.theory.modal_temporal_relation_mention.ModalTemporalRelationMention
@@ -356,7 +614,7 @@ class GraphBuilder():
                 sentence = event_mention.sentence
                 start_token = event_mention.anchor_node.start_token
                 end_token = event_mention.anchor_node.end_token
-                tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+                tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
             else:
                 sentence = event_mention.sentence
@@ -370,13 +628,13 @@ class GraphBuilder():
                 sentence = mention.sentence
                 start_token = mention.syn_node.start_token
                 end_token = mention.syn_node.end_token
-                tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+                tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
             else:
                 sentence = mention.sentence
                 start_token = mention.start_token
                 end_token = mention.end_token
-                tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+                tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
         elif value_type == ValueMention:
             value_mention = mtra.value
@@ -384,7 +642,7 @@ class GraphBuilder():
             sentence = value_mention.sentence
             start_token = value_mention.start_token
             end_token = value_mention.end_token
-            tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+            tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
         else:
             raise TypeError
@@ -433,7 +691,7 @@ class GraphBuilder():
                 sentence = event_mention.sentence
                 start_token = event_mention.anchor_node.start_token
                 end_token = event_mention.anchor_node.end_token
-                tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+                tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
             else:
                 sentence = event_mention.sentence
@@ -447,13 +705,13 @@ class GraphBuilder():
                 sentence = mention.sentence
                 start_token = mention.syn_node.start_token
                 end_token = mention.syn_node.end_token
-                tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+                tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
             else:
                 sentence = mention.sentence
                 start_token = mention.start_token
                 end_token = mention.end_token
-                tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+                tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
         elif value_type == ValueMention:
             value_mention = mtra.value
@@ -461,7 +719,7 @@ class GraphBuilder():
             sentence = value_mention.sentence
             start_token = value_mention.start_token
             end_token = value_mention.end_token
-            tokens = sentence.token_sequence[start_token.index():end_token.index()+1]
+            tokens = sentence.token_sequence[self.token_index(start_token):self.token_index(end_token)+1]
 
         else:
             raise TypeError
@@ -485,19 +743,31 @@ class GraphBuilder():
 
         return feats
 
+    def amr_node_id(self, amr_node):
+        '''
+        :param amr_node: serif.theory.amr_node.AMRNode
+        :return: str, id of the AMR node in the networkx graph (same as amr_node_to_feats(amr_node)['id'])
+        '''
+
+        return ID_DELIMITER.join([amr_node.varname, amr_node.content, amr_node.id])
+
     def amr_node_to_feats(self, amr_node):
         '''
         :param amr_node: serif.theory.amr_node.AMRNode
         :return: dict
         '''
 
+        # AMR variable names and concepts repeat across nodes and sentences, keep one copy of each
+        varname = sys.intern(amr_node.varname) if type(amr_node.varname) == str else amr_node.varname
+        content = sys.intern(amr_node.content) if type(amr_node.content) == str else amr_node.content
+
         feats = {
 
-            NodeAttrs.id: ID_DELIMITER.join([amr_node.varname, amr_node.content, amr_node.id]),
+            NodeAttrs.id: self.amr_node_id(amr_node),
             NodeAttrs.node_type: NodeTypes.amr,
 
-            AMRNodeAttrs.varname: amr_node.varname,
-            AMRNodeAttrs.content: amr_node.content
+            AMRNodeAttrs.varname: varname,
+            AMRNodeAttrs.content: content
 
         }
 
@@ -1,14 +1,17 @@
 import argparse
 import re
+import weakref
 from enum import Enum
 
 import networkx as nx
 from .constants.common.attrs.edge.edge_attrs import EdgeAttrs
 from .constants.common.attrs.node.node_attrs import NodeAttrs
 from .constants.common.types.edge_types import EdgeTypes
+from .patterns.annotation_overlay import annotation_overlay_graph
 from .patterns.pattern import Pattern
 from tqdm import tqdm
 from .utils.io_utils import serialize_patterns, serialize_graphs
+from .utils.networkx_internals import pred_dict, succ_dict
 
 
 class ParseTypes(Enum):
@@ -47,6 +50,165 @@ PARSE_TYPE_COMBINATIONS = [
     [ParseTypes.DP, ParseTypes.MDP, ParseTypes.TDP, ParseTypes.AMR]
 ]
 
+# bit of every parse type in LayeredGraph edge layer masks
+PARSE_TYPE_TO_LAYER_BIT = {parse_type: 1 << (parse_type.value - 1) for parse_type in ParseTypes}
+EDGE_TYPE_TO_LAYER_BIT = {edge_type: PARSE_TYPE_TO_LAYER_BIT[parse_type]
+                          for parse_type, edge_types in PARSE_TYPE_TO_EDGE_TYPES.items()
+                          for edge_type in edge_types}
+
+
+class LayeredGraph():
+    '''
+    Graph holding every parse layer once (e.g. built by GraphBuilder with dp, mdp, tdp and amr), with a layer bitmask
+    per edge, that serves the graph of any parse type combination as a read-only view instead of a copy. Layered graphs
+    are built on first use and live as long as the graph they wrap (which they only reference weakly).
+    '''
+
+    _layered_graphs = weakref.WeakKeyDictionary()  # networkx graph -> LayeredGraph
+
+    def __init__(self, G):
+        '''
+        :param G: networkx.classes.digraph.DiGraph
+        '''
+
+        self._graph_ref = weakref.ref(G)
+        self.edge_layers = {(u, v): EDGE_TYPE_TO_LAYER_BIT.get(attrs.get(EdgeAttrs.edge_type, None), 0)
+                            for u, v, attrs in G.edges(data=True)}
+        self.edge_layer_masks = set(self.edge_layers.values())
+
+    @classmethod
+    def for_graph(cls, G):
+        '''
+        :return: LayeredGraph of G (built on first use)
+        '''
+
+        layered_graph = cls._layered_graphs.get(G, None)
+        if layered_graph is None:
+            layered_graph = cls(G)
+            cls._layered_graphs[G] = layered_graph
+
+        return layered_graph
+
+    @staticmethod
+    def layer_mask(parse_types):
+        '''
+        :param parse_types: list[ParseTypes.X]
+        :return: int
+        '''
+
+        mask = 0
+        for parse_type in parse_types:
+            mask |= PARSE_TYPE_TO_LAYER_BIT[parse_type]
+        return mask
+
+    def view(self, parse_types):
+        '''
+        :param parse_types: list[ParseTypes.X]
+        :return: read-only networkx.classes.digraph.DiGraph view with every node of G and only the edges of parse_types
+        '''
+
+        G = self._graph_ref()
+        mask = self.layer_mask(parse_types)
+        if all(layers & mask for layers in self.edge_layer_masks):
+            return G  # no edge to hide
+
+        # views are cheap to create (and would keep G alive if kept here), so don't cache them
+        edge_layers = self.edge_layers
+        return nx.subgraph_view(G, filter_edge=lambda u, v: edge_layers[(u, v)] & mask)
+
+    def hop_distances(self, source_node_ids, k, search_direction, parse_types=None):
+        '''
+        Bounded breadth-first search from all source nodes at once, directly over G's adjacency dicts (no reversed
+        copy of G for UP, and no shortest paths kept)
+
+        :param source_node_ids: iterable of node ids in G
+        :param k: int, maximal number of hops
+        :param search_direction: DAGSearchDirection.X; BOTH searches DOWN and UP separately (not along paths that
+                                 change direction)
+        :param parse_types: None or list[ParseTypes.X], to only follow edges of these parse types
+        :return: {node id: hops from the nearest source node} for every node at most k hops away
+        '''
+
+        return self.hop_distances_per_parse_types(source_node_ids, k, search_direction, [parse_types])[0]
+
+    def hop_distances_per_parse_types(self, source_node_ids, k, search_direction, parse_type_combinations):
+        '''
+        hop_distances for several parse type combinations in a single traversal: every node reached carries the
+        bitset of combinations it was reached in at the current hop, and edges only pass on the combinations holding
+        their layer
+
+        :param parse_type_combinations: list of None or list[ParseTypes.X] (None follows every edge)
+        :return: list of {node id: hops from the nearest source node}, one per parse type combination
+        '''
+
+        if search_direction == DAGSearchDirection.BOTH:
+            return [self.merge_hop_distances(down_distances, up_distances)
+                    for down_distances, up_distances
+                    in zip(self.hop_distances_per_parse_types(source_node_ids, k, DAGSearchDirection.DOWN,
+                                                              parse_type_combinations),
+                           self.hop_distances_per_parse_types(source_node_ids, k, DAGSearchDirection.UP,
+                                                              parse_type_combinations))]
+
+        G = self._graph_ref()
+        down = search_direction == DAGSearchDirection.DOWN
+        adj = succ_dict(G) if down else pred_dict(G)
+        edge_layers = self.edge_layers
+
+        # bitset of the combinations that follow edges of each layer mask
+        masks = [None if parse_types is None else self.layer_mask(parse_types)
+                 for parse_types in parse_type_combinations]
+        layers_to_combinations = {}
+        for layers in self.edge_layer_masks:
+            combinations = 0
+            for i, mask in enumerate(masks):
+                if mask is None or layers & mask:
+                    combinations |= 1 << i
+            layers_to_combinations[layers] = combinations
+
+        distances = [{} for _ in masks]
+        reached = {}  # node id -> bitset of the combinations it was reached in
+        all_combinations = (1 << len(masks)) - 1
+        for node_id in source_node_ids:
+            if node_id not in adj:
+                raise nx.NodeNotFound("Source {} is not in G".format(node_id))
+            reached[node_id] = all_combinations
+            for combination_distances in distances:
+                combination_distances[node_id] = 0
+
+        frontier = dict(reached)
+        for hops in range(1, k + 1):
+            next_frontier = {}
+            for u, u_combinations in frontier.items():
+                for v in adj[u]:
+                    v_combinations = (u_combinations & ~reached.get(v, 0) &
+                                      layers_to_combinations[edge_layers[(u, v) if down else (v, u)]])
+                    if v_combinations:
+                        reached[v] = reached.get(v, 0) | v_combinations
+                        next_frontier[v] = next_frontier.get(v, 0) | v_combinations
+            if not next_frontier:
+                break
+
+            for v, v_combinations in next_frontier.items():
+                for i, combination_distances in enumerate(distances):
+                    if v_combinations >> i & 1:
+                        combination_distances[v] = hops
+            frontier = next_frontier
+
+        return distances
+
+    @staticmethod
+    def merge_hop_distances(down_distances, up_distances):
+        '''
+        :return: {node id: hops} of a DAGSearchDirection.BOTH search from the DOWN and UP searches' hop distances
+        '''
+
+        distances = dict(down_distances)
+        for node_id, hops in up_distances.items():
+            if hops < distances.get(node_id, hops + 1):
+                distances[node_id] = hops
+        return distances
+
+
 def get_parse_type_kwargs(str_encoding):
     k, search_direction, parse_type_str = re.split('\.|_', str_encoding)
     parse_types = [ParseTypes(int(p)) for p in parse_type_str.split("-")]
@@ -61,43 +223,43 @@ class LocalPatternFinder():
         pass
 
 
-    def return_k_hop_neighborhood_of_node(self, G, node_id, k=1, parse_types_to_prune=None, search_direction=DAGSearchDirection.BOTH):
+    def return_k_hop_neighborhood_nodes(self, G, node_ids, k=1, parse_types_to_prune=None, search_direction=DAGSearchDirection.BOTH):
         '''
 
         :param G: networkx.classes.digraph.DiGraph
-        :param node_id: str, source node id in G
+        :param node_ids: list[str], source node ids in G (e.g. every token of a multi-token annotation)
         :param k: int, size of neighborhood
-        :param parse_type: list[ParseTypes.X]
+        :param parse_types_to_prune: None or list[ParseTypes.X], to only follow edges of these parse types
         :param search_direction: DAGSearchDirection.X
 
-        :return: DiGraph for k-hop neighborhood of source node with edges for only specified parse types
+        :return: set of node ids in the k-hop neighborhood of any of the source nodes
         '''
 
-        # nx.single_source_shortest_path returns dictionary from target node id to list of node ids corresponding to the
-        #  shortest path from source to target; we only need to know which nodes are in the k-hop neighborhood of source
-        #  node so we'll take the keys of that dictionary.
+        return set(LayeredGraph.for_graph(G).hop_distances(node_ids, k, search_direction, parse_types=parse_types_to_prune))
 
-        if search_direction == DAGSearchDirection.BOTH:
-            down_nodes = set(nx.single_source_shortest_path(G, node_id, cutoff=k).keys())
-            up_nodes = set(nx.single_source_shortest_path(G.reverse(copy=True), node_id, cutoff=k).keys())
-            neighborhood_nodes = down_nodes.union(up_nodes)
 
-        elif search_direction == DAGSearchDirection.DOWN:
-            neighborhood_nodes = set(nx.single_source_shortest_path(G, node_id, cutoff=k).keys())
+    def return_k_hop_neighborhood_of_node(self, G, node_id, k=1, parse_types_to_prune=None, search_direction=DAGSearchDirection.BOTH):
+        '''
+
+        :param G: networkx.classes.digraph.DiGraph
+        :param node_id: str, source node id in G
+        :param k: int, size of neighborhood
+        :param parse_types_to_prune: None or list[ParseTypes.X], to only follow (and keep) edges of these parse types
+        :param search_direction: DAGSearchDirection.X
+
+        :return: DiGraph for k-hop neighborhood of source node with edges for only specified parse types
+        '''
 
-        else: # search_direction == DAGSearchDirection.UP:
-            neighborhood_nodes = set(nx.single_source_shortest_path(G.reverse(copy=True), node_id, cutoff=k).keys())
+        neighborhood_nodes = self.return_k_hop_neighborhood_nodes(G, [node_id], k=k,
+                                                                  parse_types_to_prune=parse_types_to_prune,
+                                                                  search_direction=search_direction)
 
         # get subgraph induced by nodes in k-hop neighborhood of source node
+        if parse_types_to_prune is not None:
+            G = LayeredGraph.for_graph(G).view(parse_types_to_prune)
         neighborhood_subgraph = G.subgraph(neighborhood_nodes)
 
-        # prune neighborhood subgraph by specified parse types (remove all other edges)
-        if parse_types_to_prune != None:
-            pruned_neighborhood_subgraph = self.get_edge_induced_subgraph_for_parse_types(neighborhood_subgraph, parse_types=parse_types)
-        else:
-            pruned_neighborhood_subgraph = neighborhood_subgraph
-
-        return pruned_neighborhood_subgraph
+        return neighborhood_subgraph
 
 
     def get_edge_induced_subgraph_for_parse_types(self, G, parse_types):
@@ -108,18 +270,72 @@ class LocalPatternFinder():
         :return:
         '''
 
-        # determine edge types allowed for specified parse types
-        allowed_edge_types = set().union(*[PARSE_TYPE_TO_EDGE_TYPES[pt] for pt in parse_types])
-
-        # retrieve allowed graph edges
-        edges_for_parse_types = [e for e in G.edges if G.edges[e][EdgeAttrs.edge_type] in allowed_edge_types]
+        # view of G with only the edges of specified parse types
+        parse_types_view = LayeredGraph.for_graph(G).view(parse_types)
 
         # get edge induced subgraph for allowed edges
-        edge_induced_subgraph = G.edge_subgraph(edges_for_parse_types)
+        edge_induced_subgraph = parse_types_view.subgraph([n for n in parse_types_view
+                                                          if parse_types_view.succ[n] or parse_types_view.pred[n]])
 
         return edge_induced_subgraph
 
 
+    def annotation_neighborhood_to_pattern(self, ann, i, ann_k_hop_neighborhood, k, parse_types, search_direction,
+                                           annotation_category=None, all_attrs=False, return_graphs_only=False):
+        '''
+        :param ann: annotation.annotation.Annotation
+        :param i: int, index of the annotation (for the pattern id)
+        :param ann_k_hop_neighborhood: networkx.classes.digraph.DiGraph, (view of the) k-hop neighborhood of ann
+        :return: patterns.pattern.Pattern of the neighborhood with ann's tokens marked, or the marked neighborhood
+                 graph itself if return_graphs_only. The Pattern's graph shares attribute dicts with the document graph
+                 (see patterns.annotation_overlay) and must not be mutated; the graph returned for return_graphs_only
+                 is a real copy, since callers modify it (e.g. GraphBuilder.numerize_graphs)
+        '''
+
+        node_attr_overlay = {}
+        for token_node_id in ann.token_node_ids:
+            token_overlay = node_attr_overlay.setdefault(token_node_id, {})
+            token_overlay[NodeAttrs.annotated] = True
+            for node_attr, label in ann.token_node_ids_to_node_attr_label[token_node_id]:
+                token_overlay[node_attr] = label
+
+        if return_graphs_only:
+
+            neighborhood_copy = ann_k_hop_neighborhood.copy()
+            for node_id, attrs in node_attr_overlay.items():
+                neighborhood_copy.nodes[node_id].update(attrs)
+            return neighborhood_copy
+
+        else:
+
+            # mark the annotated tokens in an overlay, instead of copying every attribute dict of the neighborhood
+            neighborhood_copy = annotation_overlay_graph(ann_k_hop_neighborhood, node_attr_overlay)
+
+            parse_type_string = "-".join([str(p.value) for p in parse_types])
+
+            all_node_attrs = set()
+            all_edge_attrs = set()
+            if all_attrs:
+                for __, attr_dict in list(neighborhood_copy.nodes(data=True)):
+                    for attr, __ in attr_dict.items():
+                        if attr is NodeAttrs.annotated:
+                            continue
+                        all_node_attrs.add(attr)
+                for __, __, attr_dict in list(neighborhood_copy.edges(data=True)):
+                    for attr, __ in attr_dict.items():
+                        all_edge_attrs.add(attr)
+            else:
+                all_node_attrs.add(NodeAttrs.node_type)
+                all_edge_attrs.add(EdgeAttrs.edge_type)
+
+            grid_search_config = "{}_{}_{}".format(k, search_direction.value, parse_type_string)
+            annotation_pattern = Pattern("id_{}_{}".format(i, grid_search_config), neighborhood_copy,
+                                         list(all_node_attrs), list(all_edge_attrs),
+                                         grid_search=grid_search_config,
+                                         category=annotation_category)
+            return annotation_pattern
+
+
     def get_annotation_subgraphs(self, annotations, k, parse_types, search_direction, annotation_category=None, all_attrs=False,
                                  return_graphs_only=False, prune_subgraphs=False):
 
@@ -127,7 +343,8 @@ class LocalPatternFinder():
 
         annotation_patterns_for_configuration = []
 
-        print("# annotations: {}".format(len(annotations)))
+        if hasattr(annotations, '__len__'):  # annotations may be streamed
+            print("# annotations: {}".format(len(annotations)))
 
         # loop over annotations
         for i, ann in enumerate(tqdm(annotations, desc="annotations", position=3, leave=False)):
@@ -136,56 +353,24 @@ class LocalPatternFinder():
                 if ann.category != annotation_category:
                     continue
 
-            # if annotation consists of multiple tokens, compose their k-hop subgraphs
-            token_k_hop_neighborhoods = []
-            for token_node_id in ann.token_node_ids:
-                token_k_hop_neighborhoods.append(
-                    self.return_k_hop_neighborhood_of_node(G=ann.networkx_graph,
-                                                           node_id=token_node_id,
-                                                           k=k,
-                                                           parse_types_to_prune=parse_types_to_prune,
-                                                           search_direction=search_direction))
-
-            ann_k_hop_neighborhood = nx.algorithms.operators.compose_all(token_k_hop_neighborhoods)
-            ann_k_hop_neighborhood = ann.networkx_graph.subgraph(ann_k_hop_neighborhood.nodes())  # get node-induced subgraph, assume it will have no edges of unwanted parse types
-            if len(ann_k_hop_neighborhood) == 0:
-                continue
-
-            neighborhood_copy = ann_k_hop_neighborhood.copy()
-            for token_node_id in ann.token_node_ids:
-                neighborhood_copy.nodes[token_node_id][NodeAttrs.annotated] = True
-                for node_attr, label in ann.token_node_ids_to_node_attr_label[token_node_id]:
-                    neighborhood_copy.nodes[token_node_id][node_attr] = label
-
-            if return_graphs_only:
-
-                annotation_patterns_for_configuration.append(neighborhood_copy)
+            # if annotation consists of multiple tokens, search from all of them at once
+            ann_k_hop_nodes = self.return_k_hop_neighborhood_nodes(G=ann.networkx_graph,
+                                                                   node_ids=ann.token_node_ids,
+                                                                   k=k,
+                                                                   parse_types_to_prune=parse_types_to_prune,
+                                                                   search_direction=search_direction)
 
+            if parse_types_to_prune is not None:  # get node-induced subgraph of the layers of the specified parse types
+                ann_k_hop_neighborhood = LayeredGraph.for_graph(ann.networkx_graph).view(parse_types_to_prune).subgraph(ann_k_hop_nodes)
             else:
+                ann_k_hop_neighborhood = ann.networkx_graph.subgraph(ann_k_hop_nodes)  # get node-induced subgraph, assume it will have no edges of unwanted parse types
+            if len(ann_k_hop_neighborhood) == 0:
+                continue
 
-                parse_type_string = "-".join([str(p.value) for p in parse_types])
-
-                all_node_attrs = set()
-                all_edge_attrs = set()
-                if all_attrs:
-                    for __, attr_dict in list(neighborhood_copy.nodes(data=True)):
-                        for attr, __ in attr_dict.items():
-                            if attr is NodeAttrs.annotated:
-                                continue
-                            all_node_attrs.add(attr)
-                    for __, __, attr_dict in list(neighborhood_copy.edges(data=True)):
-                        for attr, __ in attr_dict.items():
-                            all_edge_attrs.add(attr)
-                else:
-                    all_node_attrs.add(NodeAttrs.node_type)
-                    all_edge_attrs.add(EdgeAttrs.edge_type)
-
-                grid_search_config = "{}_{}_{}".format(k, search_direction.value, parse_type_string)
-                annotation_pattern = Pattern("id_{}_{}".format(i, grid_search_config), neighborhood_copy,
-                                             list(all_node_attrs), list(all_edge_attrs),
-                                             grid_search=grid_search_config,
-                                             category=annotation_category)
-                annotation_patterns_for_configuration.append(annotation_pattern)
+            annotation_patterns_for_configuration.append(
+                self.annotation_neighborhood_to_pattern(ann, i, ann_k_hop_neighborhood, k, parse_types, search_direction,
+                                                        annotation_category=annotation_category, all_attrs=all_attrs,
+                                                        return_graphs_only=return_graphs_only))
 
         return annotation_patterns_for_configuration
 
@@ -197,7 +382,10 @@ class LocalPatternFinder():
                     search_directions=[DAGSearchDirection.DOWN, DAGSearchDirection.UP, DAGSearchDirection.BOTH]):
         '''
 
-        :param annotations: list[annotation.annotation.Annotation]
+        :param annotations: list[annotation.annotation.Annotation], whose graphs hold the layers of every parse type
+                            in parse_type_combinations (e.g. from read_corpus(..., all_layers=True)); each combination
+                            is searched in a view of those graphs; annotations are iterated once (so they may be
+                            streamed)
         :param k_values: list[int]
         :param parse_type_combinations: list[list[ParseTypes.X]]
         :param search_directions: list[DAGSearchDirections.X]
@@ -205,47 +393,83 @@ class LocalPatternFinder():
         :return: {tup: list[networkx.classes.digraph.DiGraph]}
         '''
 
-        config_to_annotation_subgraphs = dict()
-
-        # loop over k-hop neighborhood configurations
-        for k in tqdm(k_values, desc='k-hop neighborhoods', position=0):
-            for parse_types in tqdm(parse_type_combinations, desc='parse type combinations', position=1, leave=False):
-                for search_direction in tqdm(search_directions, desc='search combinations', position=2, leave=False):
-
-                    config = (k, tuple(parse_types), search_direction)
-                    annotation_subgraphs_for_configuration = self.get_annotation_subgraphs(annotations, k, parse_types, search_direction,
-                                                                                           prune_subgraphs=True)
-
-                    config_to_annotation_subgraphs[config] = annotation_subgraphs_for_configuration
+        config_to_annotation_subgraphs = {(k, tuple(parse_types), search_direction): []
+                                          for k in k_values
+                                          for parse_types in parse_type_combinations
+                                          for search_direction in search_directions}
+
+        # the k-hop neighborhoods of every configuration are derived from one search per annotation and direction (up
+        #  to the largest k, for every parse type combination at once), by thresholding hop distances
+        max_k = max(k_values)
+        directions_to_search = set(search_directions)
+        if DAGSearchDirection.BOTH in directions_to_search:
+            directions_to_search.discard(DAGSearchDirection.BOTH)
+            directions_to_search.update([DAGSearchDirection.DOWN, DAGSearchDirection.UP])
+
+        for i, ann in enumerate(tqdm(annotations, desc="annotations", position=0)):
+
+            layered_graph = LayeredGraph.for_graph(ann.networkx_graph)
+            direction_to_hop_distances = {
+                search_direction: layered_graph.hop_distances_per_parse_types(ann.token_node_ids, max_k,
+                                                                              search_direction, parse_type_combinations)
+                for search_direction in directions_to_search}
+            if DAGSearchDirection.BOTH in search_directions:
+                direction_to_hop_distances[DAGSearchDirection.BOTH] = [
+                    layered_graph.merge_hop_distances(down_distances, up_distances)
+                    for down_distances, up_distances in zip(direction_to_hop_distances[DAGSearchDirection.DOWN],
+                                                            direction_to_hop_distances[DAGSearchDirection.UP])]
+
+            for j, parse_types in enumerate(parse_type_combinations):
+                parse_types_view = layered_graph.view(parse_types)
+                for search_direction in search_directions:
+                    hop_distances = direction_to_hop_distances[search_direction][j]
+                    for k in k_values:
+
+                        ann_k_hop_neighborhood = parse_types_view.subgraph([n for n, hops in hop_distances.items()
+                                                                            if hops <= k])
+                        if len(ann_k_hop_neighborhood) == 0:
+                            continue
+
+                        config = (k, tuple(parse_types), search_direction)
+                        config_to_annotation_subgraphs[config].append(
+                            self.annotation_neighborhood_to_pattern(ann, i, ann_k_hop_neighborhood, k, parse_types,
+                                                                    search_direction))
 
         return config_to_annotation_subgraphs
 
 
-def read_corpus(corpus_id, parse_types=None):
+def read_corpus(corpus_id, parse_types=None, graph_cache_dir=None, all_layers=False, workers=1):
     '''
 
     :param corpus_id: str
     :param parse_types: None or {'dp': True, 'mdp': False, 'tdp': False, 'amr': True}
+    :param graph_cache_dir: None or directory to cache built graphs in (see utils.graph_cache.GraphCache)
+    :param all_layers: build graphs with every parse type (instead of parse_types) once, so that any parse type
+                       combination can be served from them as a LayeredGraph view
+    :param workers: number of processes to build graphs with
     :return:
     '''
 
+    if all_layers:
+        parse_types = {parse_type.name.lower(): True for parse_type in ParseTypes}
+
     from annotation.ingestion.event_ingester import EventIngester
     from annotation.ingestion.ner_ingester import NERIngester
     from annotation.ingestion.relation_ingester import RelationIngester
     from annotation.ingestion.claim_injester import ClaimIngester
 
     if corpus_id == "TACRED":
-        corpus = RelationIngester(parse_types).ingest_tacred()
+        corpus = RelationIngester(parse_types, graph_cache_dir=graph_cache_dir, workers=workers).ingest_tacred()
     elif corpus_id == "CONLL_ENGLISH":
-        corpus = NERIngester(parse_types).ingest_conll()
+        corpus = NERIngester(parse_types, graph_cache_dir=graph_cache_dir, workers=workers).ingest_conll()
     elif corpus_id == "ACE_ENGLISH":
-        corpus = EventIngester(parse_types).ingest_ace()
+        corpus = EventIngester(parse_types, graph_cache_dir=graph_cache_dir, workers=workers).ingest_ace()
     elif corpus_id == "AIDA_TEST":
-        corpus = EventIngester(parse_types).ingest_aida()
+        corpus = EventIngester(parse_types, graph_cache_dir=graph_cache_dir, workers=workers).ingest_aida()
     elif corpus_id == "AIDA_CLAIMS":
-        corpus = ClaimIngester(parse_types).ingest_aida(small=False)
+        corpus = ClaimIngester(parse_types, graph_cache_dir=graph_cache_dir, workers=workers).ingest_aida(small=False)
     elif corpus_id == "AIDA_CLAIMS_SMALL":
-        corpus = ClaimIngester(parse_types).ingest_aida(small=True)
+        corpus = ClaimIngester(parse_types, graph_cache_dir=graph_cache_dir, workers=workers).ingest_aida(small=True)
     else:
         raise NotImplementedError("Corpus {} not implemented".format(corpus_id))
 
@@ -257,17 +481,25 @@ def main(args):
     parse_types = [ParseTypes[p] for p in args.parse_types]
     parse_types_kwargs = {parse_type.name.lower(): (parse_type in parse_types) for parse_type in ParseTypes}
 
-    corpus = read_corpus(args.annotation_corpus, parse_types=parse_types_kwargs)
+    corpus = read_corpus(args.annotation_corpus, parse_types=parse_types_kwargs, graph_cache_dir=args.graph_cache_dir,
+                         all_layers=args.all_layers, workers=args.workers)
 
     LPF = LocalPatternFinder()
 
-    annotation_patterns = LPF.get_annotation_subgraphs(annotations=corpus.train_annotations,
+    # only the TRAIN split is ingested
+    if args.stream_annotations:
+        train_annotations = corpus.iter_annotations('TRAIN')
+    else:
+        train_annotations = corpus.train_annotations
+
+    annotation_patterns = LPF.get_annotation_subgraphs(annotations=train_annotations,
                                                        k=args.k_hop_neighborhoods,
                                                        parse_types=parse_types,
                                                        search_direction=DAGSearchDirection[args.search_direction],
                                                        annotation_category=args.annotation_category,
                                                        all_attrs=args.all_attrs,
-                                                       return_graphs_only=args.create_graphs_for_spminer)
+                                                       return_graphs_only=args.create_graphs_for_spminer,
+                                                       prune_subgraphs=args.all_layers)
 
     if args.create_graphs_for_spminer:
 
@@ -310,6 +542,15 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--search_direction', type=str, default=DAGSearchDirection.BOTH)
     parser.add_argument('-c', '--annotation_category', type=str, default="all_categories")
     parser.add_argument('--all_attrs', action='store_true')
+    parser.add_argument('--graph_cache_dir', type=str, default=None, help='directory to cache built graphs in, keyed '
+                                                                          'by serifxml path/mtime and parse types')
+    parser.add_argument('--stream_annotations', action='store_true', help='find patterns while annotations are ingested, '
+                                                                        'one document at a time, instead of after '
+                                                                        'ingesting the whole split')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to build the corpus graphs with')
+    parser.add_argument('--all_layers', action='store_true', help='build graphs with every parse type once and search '
+                                                                  'views of the specified parse types, so all parse '
+                                                                  'type configurations share one ingest (and cache)')
 
     # if outputting graphs for SPMiner
     parser.add_argument('--create_graphs_for_spminer', action='store_true')
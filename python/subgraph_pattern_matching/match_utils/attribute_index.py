@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from ..constants.common.attrs.node.node_attrs import NodeAttrs
+from ..patterns.compiled_pattern import WILDCARD
+
+
+class AttributeIndex():
+    '''
+    Inverted index over a document graph from (nodeType, attr, value) to node ids, e.g. (token, upos, VERB) or
+    (modal, modalNodeType, Conceiver), used to compute the candidate domain of every pattern node before matching
+    '''
+
+    GRAPH_KEY = 'attribute_index'  # key under which the index is stored in networkx graph attributes (G.graph)
+
+    def __init__(self, G=None):
+        '''
+        :param G: networkx.classes.digraph.DiGraph, document graph to index
+        '''
+
+        self._nodes_by_type = defaultdict(set)  # nodeType -> node ids
+        self._nodes_with_attr = defaultdict(set)  # (nodeType, attr) -> node ids that specify attr
+        self._nodes_by_value = defaultdict(set)  # (nodeType, attr, value) -> node ids
+
+        if G is not None:
+            for node_id, attrs in G.nodes(data=True):
+                self.add_node(node_id, attrs)
+
+    @classmethod
+    def attach(cls, G):
+        '''build index for G and store it in G.graph'''
+
+        index = cls(G)
+        G.graph[cls.GRAPH_KEY] = index
+        return index
+
+    @classmethod
+    def from_graph(cls, G):
+        '''
+        :return: AttributeIndex attached to G, or None if G was built without one
+        '''
+
+        return G.graph.get(cls.GRAPH_KEY, None)
+
+    def add_node(self, node_id, attrs):
+
+        node_type = attrs.get(NodeAttrs.node_type)
+        self._nodes_by_type[node_type].add(node_id)
+
+        for attr, value in attrs.items():
+            if attr == NodeAttrs.node_type:
+                continue
+            self._nodes_with_attr[(node_type, attr)].add(node_id)
+            try:
+                self._nodes_by_value[(node_type, attr, value)].add(node_id)
+            except TypeError:  # unhashable values can't be looked up
+                continue
+
+    def lookup(self, node_type, attr, value):
+        return self._nodes_by_value.get((node_type, attr, value), set())
+
+    def nodes_of_type(self, node_type):
+        return self._nodes_by_type.get(node_type, set())
+
+    def candidates(self, node_predicate):
+        '''
+        :param node_predicate: patterns.compiled_pattern.NodePredicate
+        :return: set of node ids that may host the pattern node (a superset if the pattern uses unhashable values)
+        '''
+
+        domain = set(self.nodes_of_type(node_predicate.node_type))
+
+        for attr, allowed in node_predicate.constraints:
+            if allowed is WILDCARD or not isinstance(allowed, frozenset):
+                continue
+
+            # nodes that don't specify attr are compatible with any pattern value
+            attr_domain = domain - self._nodes_with_attr.get((node_predicate.node_type, attr), set())
+            for value in allowed:
+                attr_domain |= self.lookup(node_predicate.node_type, attr, value)
+
+            domain = domain & attr_domain
+            if not domain:
+                break
+
+        return domain
+
+    def candidate_domains(self, compiled_pattern):
+        '''
+        :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+        :return: {pattern_node_id: set of document node ids}, or None if the pattern doesn't compare nodes
+        '''
+
+        if compiled_pattern.node_predicates is None:
+            return None
+
+        return {pattern_node_id: self.candidates(node_predicate)
+                for pattern_node_id, node_predicate in compiled_pattern.node_predicates.items()}
@@ -0,0 +1,64 @@
+from networkx.algorithms.isomorphism import DiGraphMatcher
+
+
+class CompiledDiGraphMatcher(DiGraphMatcher):
+    '''
+    VF2 matcher of a document graph (G1) against a pattern graph (G2) whose semantic feasibility check is driven by
+    the precomputed predicate tables of a patterns.compiled_pattern.CompiledPattern
+    '''
+
+    def __init__(self, G1, compiled_pattern, candidates=None):
+        '''
+        :param G1: networkx.classes.digraph.DiGraph, document graph
+        :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+        :param candidates: None or {pattern_node_id: set of G1 node ids}, e.g. from AttributeIndex.candidate_domains
+        '''
+
+        super().__init__(G1, compiled_pattern.pattern_graph)
+
+        self.candidates = candidates
+
+        self.node_predicates = compiled_pattern.node_predicates
+        self.edge_predicates = compiled_pattern.edge_predicates
+
+    def semantic_feasibility(self, G1_node, G2_node):
+        '''Returns True if mapping G1_node to G2_node is semantically feasible.'''
+
+        if self.candidates is not None and G1_node not in self.candidates[G2_node]:
+            return False
+
+        if self.node_predicates is not None:
+            if not self.node_predicates[G2_node].check(self.G1.nodes[G1_node]):
+                return False
+
+        if self.edge_predicates is None:
+            return True
+
+        # walk the (small) pattern neighborhood rather than the document neighborhood; since core_2 is the inverse of
+        # core_1 this visits exactly the edge pairs networkx's _semantic_feasibility compares
+        core_2 = self.core_2
+        edge_predicates = self.edge_predicates
+
+        G1_succ = self.G1.succ[G1_node]
+        for G2_nbr in self.G2.succ[G2_node]:
+            if G2_nbr == G2_node:
+                G1_nbr = G1_node
+            elif G2_nbr in core_2:
+                G1_nbr = core_2[G2_nbr]
+            else:
+                continue
+            if G1_nbr in G1_succ and not edge_predicates[(G2_node, G2_nbr)].check(G1_succ[G1_nbr]):
+                return False
+
+        G1_pred = self.G1.pred[G1_node]
+        for G2_nbr in self.G2.pred[G2_node]:
+            if G2_nbr == G2_node:
+                G1_nbr = G1_node
+            elif G2_nbr in core_2:
+                G1_nbr = core_2[G2_nbr]
+            else:
+                continue
+            if G1_nbr in G1_pred and not edge_predicates[(G2_nbr, G2_node)].check(G1_pred[G1_nbr]):
+                return False
+
+        return True
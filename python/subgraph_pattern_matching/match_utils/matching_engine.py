@@ -0,0 +1,279 @@
+from enum import Enum
+
+from .compiled_matcher import CompiledDiGraphMatcher
+
+
+class MatchingEngines(Enum):
+    '''which subgraph matching backend to use in decode'''
+
+    NETWORKX = 1  # networkx VF2 (reference backend)
+    SELECTIVITY = 2  # backtracking over pattern nodes ordered by candidate count
+
+
+def create_matcher(G1, compiled_pattern, matching_engine=MatchingEngines.SELECTIVITY, candidates=None):
+    '''
+    :param G1: networkx.classes.digraph.DiGraph, document graph
+    :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+    :param matching_engine: MatchingEngines.X
+    :param candidates: None or {pattern_node_id: set of G1 node ids}, e.g. from AttributeIndex.candidate_domains
+
+    :return: matcher exposing subgraph_monomorphisms_iter() and subgraph_isomorphisms_iter(), both yielding
+             {document_node_id: pattern_node_id} dicts
+    '''
+
+    if matching_engine == MatchingEngines.NETWORKX:
+        if candidates is not None:
+            # VF2 can't be told about domains up front, so hand it the subgraph induced by them instead
+            candidate_node_ids = set().union(*candidates.values())
+            if len(candidate_node_ids) < len(G1):
+                G1 = G1.subgraph(candidate_node_ids).copy()
+        return CompiledDiGraphMatcher(G1, compiled_pattern, candidates=candidates)
+    elif matching_engine == MatchingEngines.SELECTIVITY:
+        return SelectivityOrderedMatcher(G1, compiled_pattern, candidates=candidates)
+    else:
+        raise NotImplementedError("Matching engine {} not implemented".format(matching_engine))
+
+
+class SelectivityOrderedMatcher():
+    '''
+    Subgraph matcher with the same monomorphism/isomorphism semantics as networkx's DiGraphMatcher. Pattern nodes are
+    visited in order of increasing candidate count, each new pattern node is extended only from the document
+    neighbors of an already matched pattern node, and edge predicates are checked as each node is added.
+    '''
+
+    def __init__(self, G1, compiled_pattern, candidates=None, seed_nodes=None):
+        '''
+        :param G1: networkx.classes.digraph.DiGraph, document graph
+        :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+        :param candidates: None or {pattern_node_id: set of G1 node ids}
+        :param seed_nodes: None or list of pattern node ids that are bound by the seed passed to match_iter (e.g. the
+                           nodes of a shared core pattern); they are visited first, and the remaining nodes are checked
+                           with their node predicates on the fly instead of through precomputed domains
+        '''
+
+        self.G1 = G1
+        self.G2 = compiled_pattern.pattern_graph
+        self.compiled_pattern = compiled_pattern
+        self.seed_nodes = list(seed_nodes) if seed_nodes is not None else []
+
+        self.domains = self.compute_domains(candidates) if seed_nodes is None else None
+        self.order = self.selectivity_order()
+        self.plan = self.build_plan()
+
+    def compute_domains(self, candidates=None):
+        '''
+        :return: {pattern_node_id: set of G1 node ids that satisfy the pattern node's predicate}
+        '''
+
+        G1_nodes = self.G1.nodes
+        node_predicates = self.compiled_pattern.node_predicates
+
+        domains = {}
+        for G2_node in self.G2:
+            if candidates is not None:
+                pool = [n for n in candidates[G2_node] if n in G1_nodes]
+            else:
+                pool = G1_nodes
+
+            if node_predicates is None:
+                domains[G2_node] = set(pool)
+            else:
+                check = node_predicates[G2_node].check
+                domains[G2_node] = {n for n in pool if check(G1_nodes[n])}
+
+        return domains
+
+    def selectivity_order(self):
+        '''
+        :return: list of pattern node ids; seed nodes first, otherwise the most selective node first, then greedily the
+                 most selective node connected to those already ordered (so that each node after the first of a
+                 component has a matched neighbor). Without domains, selectivity is estimated by constraint count.
+        '''
+
+        G2 = self.G2
+        domains = self.domains
+        node_predicates = self.compiled_pattern.node_predicates
+
+        def estimated_candidates(n):
+            if domains is not None:
+                return len(domains[n])
+            if node_predicates is None:
+                return 0
+            return -len(node_predicates[n].constraints)
+
+        order = list(self.seed_nodes)
+        ordered = set(order)
+        remaining = set(G2) - ordered
+        while remaining:
+            frontier = [n for n in remaining if any(nbr in ordered for nbr in G2.succ[n]) or
+                                                any(nbr in ordered for nbr in G2.pred[n])]
+            pool = frontier if frontier else remaining
+
+            def selectivity(n):
+                num_ordered_nbrs = len(ordered.intersection(G2.succ[n])) + len(ordered.intersection(G2.pred[n]))
+                return estimated_candidates(n), -num_ordered_nbrs, -G2.degree(n), str(n)
+
+            next_node = min(pool, key=selectivity)
+            order.append(next_node)
+            ordered.add(next_node)
+            remaining.remove(next_node)
+
+        return order
+
+    def build_plan(self):
+        '''
+        :return: list (one entry per position in self.order) of
+                 (pattern_node_id, domain, node_check, anchors, edge_checks, non_edges, self_loop)
+                 domain: set of G1 node ids, or None if node_check is applied on the fly (or the node is seeded)
+                 anchors: [(position, direction)] of earlier nodes whose G1 neighbors generate candidates
+                 edge_checks: [(position, direction, check)] for pattern edges to earlier nodes
+                 non_edges: [(position, direction)] for pattern non-edges to earlier nodes (isomorphism only)
+                 direction is 'succ' if the pattern edge goes from the current node to the earlier node, else 'pred'
+        '''
+
+        G2 = self.G2
+        edge_predicates = self.compiled_pattern.edge_predicates
+        position = {n: i for i, n in enumerate(self.order)}
+        num_seeded = len(self.seed_nodes)
+
+        def edge_check(u, v):
+            return None if edge_predicates is None else edge_predicates[(u, v)].check
+
+        plan = []
+        for i, G2_node in enumerate(self.order):
+            anchors = []
+            edge_checks = []
+            non_edges = []
+            for earlier in self.order[:i]:
+                j = position[earlier]
+                if earlier in G2.succ[G2_node]:
+                    edge_checks.append((j, 'succ', edge_check(G2_node, earlier)))
+                    anchors.append((j, 'succ'))
+                else:
+                    non_edges.append((j, 'succ'))
+                if earlier in G2.pred[G2_node]:
+                    edge_checks.append((j, 'pred', edge_check(earlier, G2_node)))
+                    anchors.append((j, 'pred'))
+                else:
+                    non_edges.append((j, 'pred'))
+
+            if G2_node in G2.succ[G2_node]:
+                self_loop = (True, edge_check(G2_node, G2_node))
+            else:
+                self_loop = (False, None)
+
+            if self.domains is not None:
+                domain, node_check = self.domains[G2_node], None
+            elif i < num_seeded:
+                domain, node_check = None, None  # seed mapping already satisfies the node predicate
+            else:
+                domain, node_check = None, self.compiled_pattern.node_check(G2_node)
+
+            plan.append((G2_node, domain, node_check, anchors, edge_checks, non_edges, self_loop))
+
+        return plan
+
+    def subgraph_monomorphisms_iter(self):
+        return self.match_iter(induced=False)
+
+    def subgraph_isomorphisms_iter(self):
+        return self.match_iter(induced=True)
+
+    def match_iter(self, induced=False, seed=None):
+        '''
+        :param induced: whether the match must be a node-induced subgraph of G1 (subgraph isomorphism) or may have
+                        extra G1 edges between matched nodes (subgraph monomorphism)
+        :param seed: None or {pattern_node_id: document_node_id} binding every node in self.seed_nodes
+        :return: generator of {document_node_id: pattern_node_id}
+        '''
+
+        if not self.plan:
+            yield {}
+            return
+        if len(self.G2) > len(self.G1):
+            return
+        if self.domains is not None and any(len(d) == 0 for d in self.domains.values()):
+            return
+
+        G1_nodes = self.G1.nodes
+        G1_succ = self.G1.succ
+        G1_pred = self.G1.pred
+        plan = self.plan
+        num_positions = len(plan)
+        seeded = [(seed[n],) for n in self.seed_nodes]
+        num_seeded = len(seeded)
+        mapped = [None] * num_positions  # position -> G1 node
+        used = set()
+
+        def extend(i):
+            G2_node, domain, node_check, anchors, edge_checks, non_edges, (has_self_loop, self_loop_check) = plan[i]
+
+            if i < num_seeded:
+                pool = seeded[i]
+            elif anchors:
+                # generate candidates from the smallest G1 neighborhood of an already matched neighbor
+                pool = None
+                for j, direction in anchors:
+                    # a pattern edge G2_node -> earlier means the candidate is a G1 predecessor of mapped[j]
+                    nbrs = G1_pred[mapped[j]] if direction == 'succ' else G1_succ[mapped[j]]
+                    if pool is None or len(nbrs) < len(pool):
+                        pool = nbrs
+                        if not pool:
+                            return
+            elif domain is not None:
+                pool = domain
+            else:
+                pool = G1_nodes
+
+            for candidate in pool:
+                if candidate in used:
+                    continue
+                if domain is not None:
+                    if candidate not in domain:
+                        continue
+                elif node_check is not None and not node_check(G1_nodes[candidate]):
+                    continue
+
+                candidate_succ = G1_succ[candidate]
+                candidate_pred = G1_pred[candidate]
+
+                # self loops
+                if has_self_loop:
+                    if candidate not in candidate_succ:
+                        continue
+                    if self_loop_check is not None and not self_loop_check(candidate_succ[candidate]):
+                        continue
+                elif induced and candidate in candidate_succ:
+                    continue
+
+                # pattern edges to matched nodes must exist in G1 and satisfy the edge predicates
+                feasible = True
+                for j, direction, check in edge_checks:
+                    adj = candidate_succ if direction == 'succ' else candidate_pred
+                    other = mapped[j]
+                    if other not in adj or (check is not None and not check(adj[other])):
+                        feasible = False
+                        break
+                if not feasible:
+                    continue
+
+                # pattern non-edges to matched nodes must also be G1 non-edges for subgraph isomorphism
+                if induced:
+                    for j, direction in non_edges:
+                        adj = candidate_succ if direction == 'succ' else candidate_pred
+                        if mapped[j] in adj:
+                            feasible = False
+                            break
+                    if not feasible:
+                        continue
+
+                mapped[i] = candidate
+                if i + 1 == num_positions:
+                    yield {mapped[k]: plan[k][0] for k in range(num_positions)}
+                else:
+                    used.add(candidate)
+                    yield from extend(i + 1)
+                    used.discard(candidate)
+                mapped[i] = None
+
+        yield from extend(0)
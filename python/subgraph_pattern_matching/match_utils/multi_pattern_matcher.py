@@ -0,0 +1,357 @@
+from collections import defaultdict
+from itertools import combinations, permutations, product
+from math import factorial
+
+import networkx as nx
+from ..patterns.compiled_pattern import CompiledPattern, WILDCARD
+from .matching_engine import MatchingEngines, SelectivityOrderedMatcher, create_matcher
+
+
+MAX_ENUMERATED_CORE_EDGES = 3  # largest sub-patterns compared up to isomorphism across patterns
+MAX_CANONICAL_ORDERS = 5040  # node orders tried when computing the canonical form of a candidate core
+
+
+def predicate_key(predicate):
+    '''
+    :param predicate: patterns.compiled_pattern.{Node,Edge}Predicate
+    :return: hashable key that is equal for predicates with identical semantics, or None if it can't be hashed
+    '''
+
+    checked = tuple(sorted(((attr, allowed) for attr, allowed in predicate.constraints if allowed is not WILDCARD),
+                           key=lambda c: c[0]))
+    key = (predicate[0], checked)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def pattern_keys(compiled_pattern):
+    '''
+    :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+    :return: set of node keys ('n', node_id, predicate) and edge keys ('e', (u, v), predicate); two patterns share a
+             node/edge iff they share its key, i.e. same id and same matching semantics
+    '''
+
+    node_predicates = compiled_pattern.node_predicates
+    edge_predicates = compiled_pattern.edge_predicates
+
+    keys = set()
+    for node_id in compiled_pattern.pattern_graph.nodes:
+        if node_predicates is None:
+            keys.add(('n', node_id))
+        else:
+            key = predicate_key(node_predicates[node_id])
+            if key is not None:
+                keys.add(('n', node_id, key))
+    for edge in compiled_pattern.pattern_graph.edges:
+        if edge_predicates is None:
+            keys.add(('e', edge))
+        else:
+            key = predicate_key(edge_predicates[edge])
+            if key is not None:
+                keys.add(('e', edge, key))
+
+    return keys
+
+
+def connected_core(shared_keys):
+    '''
+    :param shared_keys: set of node/edge keys common to some patterns
+    :return: frozenset of the keys of the largest weakly connected sub-pattern (with at least one edge), or None
+    '''
+
+    node_keys = {k[1]: k for k in shared_keys if k[0] == 'n'}
+    edge_keys = {k[1]: k for k in shared_keys if k[0] == 'e' and k[1][0] in node_keys and k[1][1] in node_keys}
+    if not edge_keys:
+        return None
+
+    core_graph = nx.DiGraph()
+    core_graph.add_edges_from(edge_keys)
+    largest_component = max(nx.weakly_connected_components(core_graph),
+                            key=lambda c: (len(core_graph.subgraph(c).edges), len(c), sorted(map(str, c))))
+
+    return frozenset([node_keys[n] for n in largest_component] +
+                     [k for e, k in edge_keys.items() if e[0] in largest_component])
+
+
+def pattern_labels(compiled_pattern):
+    '''
+    :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+    :return: ({node_id: label}, {(u, v): label}) where two nodes/edges have the same label iff their predicates have
+             the same matching semantics; nodes/edges whose predicates can't be hashed are left out
+    '''
+
+    node_predicates = compiled_pattern.node_predicates
+    edge_predicates = compiled_pattern.edge_predicates
+
+    node_labels = {}
+    for node_id in compiled_pattern.pattern_graph.nodes:
+        key = () if node_predicates is None else predicate_key(node_predicates[node_id])
+        if key is not None:
+            node_labels[node_id] = repr(key)
+    edge_labels = {}
+    for u, v in compiled_pattern.pattern_graph.edges:
+        if u not in node_labels or v not in node_labels:
+            continue
+        key = () if edge_predicates is None else predicate_key(edge_predicates[(u, v)])
+        if key is not None:
+            edge_labels[(u, v)] = repr(key)
+
+    return node_labels, edge_labels
+
+
+def canonical_form(edges, node_labels, edge_labels):
+    '''
+    Canonical form of a small labelled sub-pattern: the lexicographically smallest (node labels, labelled edges) over
+    all node orders that sort the nodes by label, so isomorphic sub-patterns of different patterns get the same form.
+
+    :param edges: list of (u, v) pattern edges spanning the sub-pattern
+    :return: (form, tuple of node ids in canonical order), or None if there are too many orders to try
+    '''
+
+    node_ids = {n for edge in edges for n in edge}
+    label_groups = defaultdict(list)
+    for n in node_ids:
+        label_groups[node_labels[n]].append(n)
+    groups = [label_groups[label] for label in sorted(label_groups)]
+
+    num_orders = 1
+    for group in groups:
+        num_orders *= factorial(len(group))
+    if num_orders > MAX_CANONICAL_ORDERS:
+        return None
+
+    node_label_form = tuple(node_labels[group[0]] for group in groups for _ in group)
+    best = None
+    for group_orders in product(*[permutations(group) for group in groups]):
+        order = tuple(n for group_order in group_orders for n in group_order)
+        position = {n: i for i, n in enumerate(order)}
+        edge_form = tuple(sorted((position[u], position[v], edge_labels[(u, v)]) for u, v in edges))
+        if best is None or edge_form < best[0]:
+            best = (edge_form, order)
+
+    return (node_label_form, best[0]), best[1]
+
+
+def connected_edge_subsets(edges, max_edges):
+    '''
+    :param edges: list of (u, v) edges of a pattern
+    :param max_edges: largest subset size
+    :return: generator of every weakly connected frozenset of at most max_edges edges
+    '''
+
+    edges_per_node = defaultdict(list)
+    for edge in edges:
+        edges_per_node[edge[0]].append(edge)
+        edges_per_node[edge[1]].append(edge)
+
+    seen = set()
+    frontier = [frozenset([edge]) for edge in edges]
+    for size in range(1, max_edges + 1):
+        grown = []
+        for subset in frontier:
+            yield subset
+            if size == max_edges:
+                continue
+            for n in {n for edge in subset for n in edge}:
+                for edge in edges_per_node[n]:
+                    if edge not in subset:
+                        larger = subset | {edge}
+                        if larger not in seen:
+                            seen.add(larger)
+                            grown.append(larger)
+        frontier = grown
+
+
+class SharedCore():
+    '''sub-pattern common to several patterns, matched once per graph and extended into each pattern'''
+
+    def __init__(self, core_edges, patterns, node_orders):
+        '''
+        :param core_edges: list of (i, j) edges between core nodes, core nodes are numbered 0..n-1
+        :param patterns: list[patterns.pattern.Pattern] that all contain the core
+        :param node_orders: list (one per pattern) of tuples, core node i is pattern node node_orders[k][i] of
+                            patterns[k]; the node ids of a core need not be the same across patterns
+        '''
+
+        self.patterns = patterns
+        self.node_orders = node_orders
+
+        # take attributes and compiled predicates from any member, they agree on the core by construction
+        member = patterns[0].compiled_pattern
+        order = node_orders[0]
+        core_graph = nx.DiGraph()
+        core_graph.add_nodes_from((i, member.pattern_graph.nodes[n]) for i, n in enumerate(order))
+        core_graph.add_edges_from((i, j, member.pattern_graph.edges[order[i], order[j]]) for i, j in core_edges)
+
+        node_predicates = None if member.node_predicates is None else \
+            {i: member.node_predicates[n] for i, n in enumerate(order)}
+        edge_predicates = None if member.edge_predicates is None else \
+            {(i, j): member.edge_predicates[(order[i], order[j])] for i, j in core_edges}
+
+        self.compiled_pattern = CompiledPattern.from_predicates(core_graph, node_predicates, edge_predicates)
+
+
+def find_shared_cores(patterns, min_patterns_per_core=2):
+    '''
+    Detect sub-patterns common to several patterns, e.g. build_basic_claim_pattern() in every dp_mdp claim pattern, or
+    the same labelled sub-structure under different node ids in mined patterns. Candidate cores are the (connected)
+    intersections of every pair of patterns that share a node id, and every connected sub-pattern of at most
+    MAX_ENUMERATED_CORE_EDGES edges; candidates are compared up to isomorphism by their canonical form over the
+    predicate-labelled nodes and edges. The largest candidates are formed first, and each pattern joins the largest
+    formed core it contains.
+
+    :param patterns: list[patterns.pattern.Pattern]
+    :return: (list[SharedCore], list[patterns.pattern.Pattern] not assigned to any core)
+    '''
+
+    labels_per_pattern = [pattern_labels(p.compiled_pattern) for p in patterns]
+
+    # (predicate flags, canonical form) -> {pattern index: core node order in that pattern}
+    core_members = defaultdict(dict)
+
+    def add_occurrence(i, edges):
+        node_labels, edge_labels = labels_per_pattern[i]
+        canonical = canonical_form(edges, node_labels, edge_labels)
+        if canonical is None:
+            return
+        form, order = canonical
+        compiled_pattern = patterns[i].compiled_pattern
+        core = (compiled_pattern.node_predicates is None, compiled_pattern.edge_predicates is None, form)
+        core_members[core].setdefault(i, order)
+
+    # candidate cores from pairwise intersections of patterns that share at least one node
+    keys_per_pattern = [pattern_keys(p.compiled_pattern) for p in patterns]
+
+    patterns_per_key = defaultdict(set)
+    for i, keys in enumerate(keys_per_pattern):
+        for key in keys:
+            patterns_per_key[key].add(i)
+
+    pairs = set()
+    for key, pattern_indices in patterns_per_key.items():
+        if key[0] == 'n' and len(pattern_indices) > 1:
+            pairs.update(combinations(sorted(pattern_indices), 2))
+
+    candidate_cores = set()
+    for i, j in pairs:
+        core_keys = connected_core(keys_per_pattern[i] & keys_per_pattern[j])
+        if core_keys is not None:
+            candidate_cores.add(core_keys)
+
+    for core_keys in candidate_cores:
+        edges = [k[1] for k in core_keys if k[0] == 'e']
+        for i in set.intersection(*[patterns_per_key[k] for k in core_keys]):
+            add_occurrence(i, edges)
+
+    # candidate cores from the small sub-patterns of every pattern, whatever their node ids
+    for i, (node_labels, edge_labels) in enumerate(labels_per_pattern):
+        for edges in connected_edge_subsets(list(edge_labels), MAX_ENUMERATED_CORE_EDGES):
+            add_occurrence(i, edges)
+
+    core_members = {core: members for core, members in core_members.items() if len(members) >= min_patterns_per_core}
+
+    def core_size(core):
+        node_label_form, edge_form = core[2]
+        return len(edge_form), len(node_label_form), repr(core)
+
+    # largest cores first claim the patterns containing them, as long as they are shared by enough patterns
+    remaining = set(range(len(patterns)))
+    assignment = {}
+    for core in sorted(core_members, key=core_size, reverse=True):
+        members = set(core_members[core]) & remaining
+        if len(members) >= min_patterns_per_core:
+            assignment[core] = members
+            remaining -= members
+
+    # leftover patterns join the largest already formed core they contain
+    unshared_patterns = []
+    for i in sorted(remaining):
+        containing_cores = [c for c in assignment if i in core_members[c]]
+        if containing_cores:
+            assignment[max(containing_cores, key=core_size)].add(i)
+        else:
+            unshared_patterns.append(patterns[i])
+
+    shared_cores = []
+    for core, members in assignment.items():
+        core_edges = [(i, j) for i, j, _ in core[2][1]]
+        members = sorted(members)
+        shared_cores.append(SharedCore(core_edges, [patterns[i] for i in members],
+                                       [core_members[core][i] for i in members]))
+
+    return shared_cores, unshared_patterns
+
+
+class MultiPatternMatcher():
+    '''
+    Matches a list of patterns against a graph, matching every shared core only once and extending its embeddings
+    into each pattern that contains it
+    '''
+
+    def __init__(self, patterns):
+        '''
+        :param patterns: list[patterns.pattern.Pattern]
+        '''
+
+        self.patterns = patterns
+        self.shared_cores, self.unshared_patterns = find_shared_cores(patterns)
+
+    def match(self, G1, isomorphism=False, attribute_index=None):
+        '''
+        :param G1: networkx.classes.digraph.DiGraph, document graph
+        :param isomorphism: subgraph isomorphism if True, else subgraph monomorphism
+        :param attribute_index: None or match_utils.attribute_index.AttributeIndex for G1
+        :return: {patterns.pattern.Pattern: list[{document_node_id: pattern_node_id}]}
+        '''
+
+        pattern_to_match_dicts = {}
+
+        for shared_core in self.shared_cores:
+
+            for pattern in shared_core.patterns:
+                pattern_to_match_dicts[pattern] = []
+
+            candidates = None
+            if attribute_index is not None:
+                candidates = attribute_index.candidate_domains(shared_core.compiled_pattern)
+                if candidates is not None and not all(candidates.values()):
+                    continue
+
+            # the core itself is matched with monomorphism, pattern-specific (non-)edges are checked when extending
+            core_matcher = SelectivityOrderedMatcher(G1, shared_core.compiled_pattern, candidates=candidates)
+            core_embeddings = []
+            for m in core_matcher.subgraph_monomorphisms_iter():
+                embedding = [None] * len(m)
+                for document_node_id, core_node_id in m.items():
+                    embedding[core_node_id] = document_node_id
+                core_embeddings.append(embedding)
+            if not core_embeddings:
+                continue
+
+            for pattern, node_order in zip(shared_core.patterns, shared_core.node_orders):
+                extension_matcher = SelectivityOrderedMatcher(G1, pattern.compiled_pattern, seed_nodes=node_order)
+                for embedding in core_embeddings:
+                    seed = dict(zip(node_order, embedding))
+                    pattern_to_match_dicts[pattern].extend(extension_matcher.match_iter(induced=isomorphism, seed=seed))
+
+        for pattern in self.unshared_patterns:
+
+            candidates = None
+            if attribute_index is not None:
+                candidates = attribute_index.candidate_domains(pattern.compiled_pattern)
+                if candidates is not None and not all(candidates.values()):
+                    pattern_to_match_dicts[pattern] = []
+                    continue
+
+            pattern_matcher = create_matcher(G1, pattern.compiled_pattern,
+                                             matching_engine=MatchingEngines.SELECTIVITY,
+                                             candidates=candidates)
+            if isomorphism:
+                pattern_to_match_dicts[pattern] = list(pattern_matcher.subgraph_isomorphisms_iter())
+            else:
+                pattern_to_match_dicts[pattern] = list(pattern_matcher.subgraph_monomorphisms_iter())
+
+        return pattern_to_match_dicts
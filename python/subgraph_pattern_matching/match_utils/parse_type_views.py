@@ -0,0 +1,106 @@
+import weakref
+
+import networkx as nx
+from ..constants.common.attrs.edge.edge_attrs import EdgeAttrs
+from ..local_pattern_finder import ParseTypes, PARSE_TYPE_TO_EDGE_TYPES
+from ..utils.networkx_internals import digraph_from_dicts, node_dict, pred_dict, succ_dict
+
+
+EDGE_TYPE_TO_PARSE_TYPE = {edge_type: parse_type
+                           for parse_type, edge_types in PARSE_TYPE_TO_EDGE_TYPES.items()
+                           for edge_type in edge_types}
+
+ALL_PARSE_TYPES = frozenset(ParseTypes)
+
+_signatures = weakref.WeakKeyDictionary()  # compiled pattern -> parse type signature
+
+
+def parse_type_signature(compiled_pattern):
+    '''
+    :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+    :return: frozenset of ParseTypes.X whose edges the pattern's edges can map onto, or None if the pattern may map
+             onto any edge or node of the document graph (edges aren't compared, or it has an isolated node)
+    '''
+
+    try:
+        return _signatures[compiled_pattern]
+    except KeyError:
+        pass
+
+    signature = None
+    pattern_graph = compiled_pattern.pattern_graph
+    edge_predicates = compiled_pattern.edge_predicates
+    if edge_predicates is not None and all(pattern_graph.degree(n) > 0 for n in pattern_graph):
+        parse_types = set(EDGE_TYPE_TO_PARSE_TYPE.get(p.edge_type, None) for p in edge_predicates.values())
+        if None not in parse_types:
+            signature = frozenset(parse_types)
+
+    _signatures[compiled_pattern] = signature
+    return signature
+
+
+class ParseTypeViews():
+    '''
+    Read-only views of a document graph restricted to the edges of some parse types (see
+    local_pattern_finder.PARSE_TYPE_TO_EDGE_TYPES) and the nodes they connect, e.g. only tokens and modal nodes for a
+    pattern made of syntax and modal edges. Each view is built on first use and shared by every pattern with the same
+    parse type signature; views share their node and edge attribute dicts with the document graph.
+
+    Only use views for subgraph monomorphism: they drop edges that a subgraph isomorphism must not see between matched
+    nodes.
+    '''
+
+    def __init__(self, G):
+        '''
+        :param G: networkx.classes.digraph.DiGraph, document graph
+        '''
+
+        self.G = G
+        self._views = {}  # frozenset of ParseTypes.X -> view
+
+    def view_for_pattern(self, compiled_pattern):
+        '''
+        :param compiled_pattern: patterns.compiled_pattern.CompiledPattern
+        :return: smallest view of the document graph holding every possible match of the pattern (possibly the
+                 document graph itself)
+        '''
+
+        return self.view(parse_type_signature(compiled_pattern))
+
+    def view(self, parse_types):
+        '''
+        :param parse_types: None or frozenset of ParseTypes.X
+        :return: networkx.classes.digraph.DiGraph restricted to the edges of parse_types (the document graph itself
+                 for None or all parse types)
+        '''
+
+        if parse_types is None or parse_types == ALL_PARSE_TYPES:
+            return self.G
+
+        view = self._views.get(parse_types, None)
+        if view is None:
+            view = self.build_view(set().union(*[PARSE_TYPE_TO_EDGE_TYPES[pt] for pt in parse_types]))
+            self._views[parse_types] = view
+
+        return view
+
+    def build_view(self, edge_types):
+        '''
+        :param edge_types: set of EdgeTypes.X to keep
+        :return: frozen networkx.classes.digraph.DiGraph over the nodes incident to kept edges, in document order
+        '''
+
+        G_node = node_dict(self.G)
+        G_succ = succ_dict(self.G)
+        G_pred = pred_dict(self.G)
+
+        node, succ, pred = {}, {}, {}
+        for n in G_node:
+            n_succ = {v: attrs for v, attrs in G_succ[n].items() if attrs.get(EdgeAttrs.edge_type, None) in edge_types}
+            n_pred = {u: attrs for u, attrs in G_pred[n].items() if attrs.get(EdgeAttrs.edge_type, None) in edge_types}
+            if n_succ or n_pred:
+                node[n] = G_node[n]
+                succ[n] = n_succ
+                pred[n] = n_pred
+
+        return nx.freeze(digraph_from_dicts(node, succ, pred))
@@ -38,11 +38,14 @@ class MatchWrapper():
         self.nx_graph = nx_graph
 
     def to_pickle(self):
-        '''NOTE: serif objects can't be pickled, so pickle docid + sent_no instead for access'''
+        '''
+        NOTE: serif objects can't be pickled, so pickle docid + sent_no instead for access; sent_no is None for
+        document-level matches (decoded without per_sentence), which have no serif_sentence
+        '''
 
         return {
             "docid": self.docid,
-            "sent_no": self.serif_sentence.sent_no,
+            "sent_no": self.serif_sentence.sent_no if self.serif_sentence is not None else None,
             "pattern": self.pattern.to_json(),
             "match_node_id_to_pattern_node_id": self.match_node_id_to_pattern_node_id,
             "category": self.category
@@ -129,6 +132,27 @@ class MatchCorpus():
         print("# inter-sentence conceive-event edges:", n)
         return n
 
+    def to_conceiver_event_match_node_ids(self):
+        '''
+        Assumes each match contains 'CONCEIVER_NODE' (or 'AUTHOR_CONCEIVER_NODE') and 'EVENT_NODE' (claim pattern
+        extractions)
+
+        :return: list[(conceiver match node id, event match node id)], see to_mtra_pairs for the mtras they map to
+        '''
+
+        conceiver_event_match_node_ids = []
+
+        for match in self.matches:
+            if PatternModalNodeIDs.CONCEIVER_NODE_ID in match.pattern_node_id_to_match_node_id:
+                conceiver_node_id = match.pattern_node_id_to_match_node_id[PatternModalNodeIDs.CONCEIVER_NODE_ID]
+            else:  # must be AUTHOR_CONCEIVER
+                conceiver_node_id = match.pattern_node_id_to_match_node_id[PatternModalNodeIDs.AUTHOR_CONCEIVER_NODE_ID]
+            event_node_id = match.pattern_node_id_to_match_node_id[PatternModalNodeIDs.EVENT_NODE_ID]
+
+            conceiver_event_match_node_ids.append((conceiver_node_id, event_node_id))
+
+        return conceiver_event_match_node_ids
+
     def to_mtra_pairs(self, include_pattern_id=False):
         '''
         Assumes each match contains 'CONCEIVER_NODE' and 'EVENT_NODE' (claim pattern extractions)
@@ -0,0 +1,33 @@
+from collections import ChainMap
+
+from ..utils.networkx_internals import digraph_from_dicts
+
+
+def annotation_overlay_graph(neighborhood, node_attr_overlay):
+    '''
+    Copy-on-write copy of (a view of) a document graph neighborhood with some node attributes changed, e.g. the
+    annotated tokens of a local pattern. Only the graph structure is new: edges and unchanged nodes share their
+    attribute dicts with the document graph, and a changed node's attribute dict is a ChainMap of its overlay over the
+    document graph's dict (so writes to it only go to the overlay).
+
+    Behaves, serializes (Pattern.to_json, serialize_graphs) and matches like neighborhood.copy() with the overlay
+    attributes set; copy() it before modifying attributes of unchanged nodes or of edges.
+
+    :param neighborhood: networkx.classes.digraph.DiGraph or view of it
+    :param node_attr_overlay: {node id: {attr: value}} of attributes to set on nodes of neighborhood
+    :return: networkx.classes.digraph.DiGraph
+    '''
+
+    # same node and edge order as neighborhood.copy()
+    node = {node_id: (attrs if node_id not in node_attr_overlay else ChainMap(dict(node_attr_overlay[node_id]), attrs))
+            for node_id, attrs in neighborhood.nodes(data=True)}
+    succ = {node_id: {} for node_id in node}
+    pred = {node_id: {} for node_id in node}
+    for u, v, attrs in neighborhood.edges(data=True):
+        succ[u][v] = attrs
+        pred[v][u] = attrs
+
+    H = digraph_from_dicts(node, succ, pred, graph_class=neighborhood.__class__)
+    H.graph.update(neighborhood.graph)
+
+    return H
@@ -0,0 +1,169 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+from ..constants.common.attrs.edge.edge_attrs import EdgeAttrs
+from ..constants.common.attrs.node.node_attrs import NodeAttrs
+from ..constants.special_symbols import DISJUNCTION
+
+
+WILDCARD = None  # pattern node/edge does not specify the attribute, so any value matches
+
+
+# frozen predicate table entries; constraints is a tuple of (attr, frozenset-of-allowed-values or WILDCARD) pairs
+NodePredicate = namedtuple('NodePredicate', ['node_type', 'constraints', 'check'])
+EdgePredicate = namedtuple('EdgePredicate', ['edge_type', 'constraints', 'check'])
+
+
+def allowed_values(pattern_value):
+    '''
+    :param pattern_value: attribute value on a pattern node/edge, e.g. "VERB" or "nsubj|||dobj"
+    :return: frozenset of values a document node/edge may take for the attribute
+    '''
+
+    if isinstance(pattern_value, str):
+        return frozenset(pattern_value.split(DISJUNCTION))  # permit pattern to specify disjunction of attrs
+    try:
+        return frozenset([pattern_value])
+    except TypeError:  # unhashable pattern value (e.g. list), fall back to equality
+        return (pattern_value,)
+
+
+def compile_constraints(pattern_attrs, attrs, type_attr):
+    '''
+    :param pattern_attrs: attribute dict of a pattern node/edge
+    :param attrs: list of attributes used for matching (Pattern._node_attrs or Pattern._edge_attrs)
+    :param type_attr: NodeAttrs.node_type or EdgeAttrs.edge_type, which is always checked and never a constraint
+    :return: tuple of (attr, frozenset-of-allowed-values or WILDCARD) pairs
+    '''
+
+    constraints = []
+    seen = set()
+    for attr in attrs:
+        if attr == type_attr or attr in seen:
+            continue
+        seen.add(attr)
+        if attr in pattern_attrs:
+            constraints.append((attr, allowed_values(pattern_attrs[attr])))
+        else:
+            constraints.append((attr, WILDCARD))
+
+    return tuple(constraints)
+
+
+def fuse_predicate(type_attr, type_value, constraints):
+    '''
+    Fuse the type check and all attribute checks into a single function over a document node/edge attribute dict.
+    Semantics are those of match_utils.{node,edge}_attr_match: the types must agree, and an attribute only constrains
+    the match if it is specified on both the pattern and the document node/edge.
+
+    :return: function(dict) -> bool
+    '''
+
+    checked = tuple((attr, allowed) for attr, allowed in constraints if allowed is not WILDCARD)
+
+    if not checked:
+        def check(attrs):
+            return attrs[type_attr] == type_value
+    elif len(checked) == 1:
+        ((attr, allowed),) = checked
+
+        def check(attrs):
+            if attrs[type_attr] != type_value:
+                return False
+            return attr not in attrs or attrs[attr] in allowed
+    else:
+        def check(attrs):
+            if attrs[type_attr] != type_value:
+                return False
+            for attr, allowed in checked:
+                if attr in attrs and attrs[attr] not in allowed:
+                    return False
+            return True
+
+    return check
+
+
+class CompiledPattern():
+    '''
+    Precomputed per-node and per-edge predicate tables for a Pattern, so that matching calls one fused check per
+    candidate pair instead of one closure (and one DISJUNCTION split) per attribute
+    '''
+
+    def __init__(self, pattern_graph, node_attrs=None, edge_attrs=None):
+        '''
+        :param pattern_graph: networkx.classes.digraph.DiGraph
+        :param node_attrs: list[str], node attributes used for matching; None/empty means nodes are not compared
+        :param edge_attrs: list[str], edge attributes used for matching; None/empty means edges are not compared
+        '''
+
+        self._pattern_graph = pattern_graph
+
+        if node_attrs:
+            self._node_predicates = MappingProxyType({
+                node_id: self.compile_node(attrs, node_attrs) for node_id, attrs in pattern_graph.nodes(data=True)})
+        else:
+            self._node_predicates = None
+
+        if edge_attrs:
+            self._edge_predicates = MappingProxyType({
+                (u, v): self.compile_edge(attrs, edge_attrs) for u, v, attrs in pattern_graph.edges(data=True)})
+        else:
+            self._edge_predicates = None
+
+    @classmethod
+    def from_predicates(cls, pattern_graph, node_predicates, edge_predicates):
+        '''
+        Assemble a CompiledPattern from already compiled predicates, e.g. for a sub-pattern shared by several patterns
+
+        :param node_predicates: {pattern_node_id: NodePredicate} or None
+        :param edge_predicates: {(pattern_u_id, pattern_v_id): EdgePredicate} or None
+        '''
+
+        compiled_pattern = cls(pattern_graph)
+        compiled_pattern._node_predicates = MappingProxyType(dict(node_predicates)) if node_predicates is not None else None
+        compiled_pattern._edge_predicates = MappingProxyType(dict(edge_predicates)) if edge_predicates is not None else None
+        return compiled_pattern
+
+    @staticmethod
+    def compile_node(pattern_node_attrs, node_attrs):
+        node_type = pattern_node_attrs.get(NodeAttrs.node_type)
+        constraints = compile_constraints(pattern_node_attrs, node_attrs, NodeAttrs.node_type)
+        return NodePredicate(node_type, constraints, fuse_predicate(NodeAttrs.node_type, node_type, constraints))
+
+    @staticmethod
+    def compile_edge(pattern_edge_attrs, edge_attrs):
+        edge_type = pattern_edge_attrs.get(EdgeAttrs.edge_type)
+        constraints = compile_constraints(pattern_edge_attrs, edge_attrs, EdgeAttrs.edge_type)
+        return EdgePredicate(edge_type, constraints, fuse_predicate(EdgeAttrs.edge_type, edge_type, constraints))
+
+    @property
+    def pattern_graph(self):
+        return self._pattern_graph
+
+    @property
+    def node_predicates(self):
+        '''{pattern_node_id: NodePredicate} or None if nodes are not compared'''
+        return self._node_predicates
+
+    @property
+    def edge_predicates(self):
+        '''{(pattern_u_id, pattern_v_id): EdgePredicate} or None if edges are not compared'''
+        return self._edge_predicates
+
+    def node_check(self, pattern_node_id):
+        '''
+        :return: function(document node attr dict) -> bool, or None if nodes are not compared
+        '''
+
+        if self._node_predicates is None:
+            return None
+        return self._node_predicates[pattern_node_id].check
+
+    def edge_check(self, pattern_u_id, pattern_v_id):
+        '''
+        :return: function(document edge attr dict) -> bool, or None if edges are not compared
+        '''
+
+        if self._edge_predicates is None:
+            return None
+        return self._edge_predicates[(pattern_u_id, pattern_v_id)].check
@@ -2,6 +2,7 @@ from ..constants.common.attrs.edge.edge_attrs import EdgeAttrs
 from ..constants.common.attrs.node.node_attrs import NodeAttrs
 from ..match_utils.edge_match_functions import edge_multiple_attrs_match, edge_attr_match, edge_type_match
 from ..match_utils.node_match_functions import node_multiple_attrs_match, node_attr_match, node_type_match
+from .compiled_pattern import CompiledPattern
 from networkx.readwrite import json_graph
 
 
@@ -15,10 +16,13 @@ class Pattern():
         self._edge_attrs = edge_attrs
         self._node_match = None
         self._edge_match = None
+        self._compiled_pattern = None
         if node_attrs:
             self.make_node_match()
         if edge_attrs:
             self.make_edge_match()
+        if pattern_graph is not None:
+            self.compile()
         self.grid_search = grid_search
         self.category = category
 
@@ -61,6 +65,18 @@ class Pattern():
             match_funcs.append(edge_match_closure)
         self._edge_match = edge_multiple_attrs_match(*match_funcs)
 
+    def compile(self):
+        '''(re)build the frozen predicate tables used during decoding; call again if pattern_graph is modified'''
+
+        self._compiled_pattern = CompiledPattern(self._pattern_graph, self._node_attrs, self._edge_attrs)
+        return self._compiled_pattern
+
+    @property
+    def compiled_pattern(self):
+        if self._compiled_pattern is None:
+            self.compile()
+        return self._compiled_pattern
+
     @property
     def node_match(self):
         return self._node_match
@@ -92,6 +108,7 @@ class Pattern():
             self.make_node_match()
         if self._edge_attrs:
             self.make_edge_match()
+        self.compile()
 
     def get_node_ids_with_attr(self, attr=NodeAttrs.annotated):
 
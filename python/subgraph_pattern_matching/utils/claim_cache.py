@@ -0,0 +1,48 @@
+import hashlib
+import json
+
+from .graph_cache import GRAPH_CACHE_VERSION, SerifxmlCache
+
+
+# bump whenever claim extraction (decode.prepare_patterns' matching, or how matches become claims) changes
+CLAIM_CACHE_VERSION = 1
+
+
+def pattern_set_fingerprint(patterns):
+    '''
+    :param patterns: list[patterns.pattern.Pattern]
+    :return: str, sha1 of the patterns' json, independent of their order
+    '''
+
+    serialized = sorted(json.dumps(p.to_json(), sort_keys=True, default=str) for p in patterns)
+    return hashlib.sha1("\n".join(serialized).encode('utf-8')).hexdigest()
+
+
+class ClaimCache(SerifxmlCache):
+    '''
+    On-disk cache of the (conceiver, event) match node id pairs that claim patterns extract from a serifxml, keyed by
+    the serifxml (see SerifxmlCache) and the fingerprint of the pattern set. Match node ids end in the serif ids of the
+    matched theories, so claims are rebuilt from the serif document without building or matching any graph.
+    '''
+
+    VERSION = CLAIM_CACHE_VERSION
+    VALUE_NAME = 'claims'
+
+    def key(self, serifxml_path, patterns_fingerprint):
+        # match node ids are graph node ids, so entries also go stale with the graphs
+        return self.serifxml_key(serifxml_path, kind='claims', patterns=patterns_fingerprint,
+                                 graph_version=GRAPH_CACHE_VERSION)
+
+    def get(self, serifxml_path, patterns_fingerprint):
+        '''
+        :return: list[(conceiver match node id, event match node id)], or None on a cache miss
+        '''
+
+        return self.read_entry(self.key(serifxml_path, patterns_fingerprint))
+
+    def put(self, serifxml_path, patterns_fingerprint, claims):
+        '''
+        :param claims: list[(conceiver match node id, event match node id)]
+        '''
+
+        self.write_entry(self.key(serifxml_path, patterns_fingerprint), claims)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+
+# bump whenever GraphBuilder changes the graphs it builds, so stale cache entries are ignored
+GRAPH_CACHE_VERSION = 1
+
+
+class SerifxmlCache():
+    '''
+    On-disk cache of values derived from a serifxml, keyed by the serifxml's path and modification time (or content
+    hash) and whatever else the value depends on. Subclasses set VERSION and name their value in the entry (VALUE_NAME).
+    '''
+
+    VERSION = None
+    VALUE_NAME = None
+
+    def __init__(self, cache_dir, hash_contents=False):
+        '''
+        :param cache_dir: directory holding one pickle per entry
+        :param hash_contents: key entries by the sha1 of the serifxml instead of its mtime and size (slower, but
+                              survives copies/touches of unchanged files)
+        '''
+
+        self.cache_dir = cache_dir
+        self.hash_contents = hash_contents
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_signature(self, serifxml_path):
+        if self.hash_contents:
+            sha1 = hashlib.sha1()
+            with open(serifxml_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha1.update(block)
+            return sha1.hexdigest()
+
+        stat = os.stat(serifxml_path)
+        return "{}:{}".format(stat.st_mtime_ns, stat.st_size)
+
+    def serifxml_key(self, serifxml_path, **fields):
+        '''
+        :param fields: json serializable values the cached value depends on besides the serifxml
+        :return: json str uniquely identifying the cache entry
+        '''
+
+        return json.dumps(dict(fields,
+                               version=self.VERSION,
+                               path=os.path.abspath(serifxml_path),
+                               signature=self.file_signature(serifxml_path)), sort_keys=True)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+    def read_entry(self, key):
+        '''
+        :return: the cached value, or None on a cache miss
+        '''
+
+        entry_path = self.entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with open(entry_path, 'rb') as f:
+                entry = pickle.load(f)
+        except (EOFError, pickle.UnpicklingError, OSError) as e:
+            logging.warning("Ignoring unreadable %s cache entry %s (%s)", self.VALUE_NAME, entry_path, e)
+            return None
+
+        if entry.get('version') != self.VERSION or entry.get('key') != key:
+            return None
+
+        return entry[self.VALUE_NAME]
+
+    def write_entry(self, key, value):
+        entry_path = self.entry_path(key)
+
+        # write to a private file first, so concurrent jobs never read a partially written entry
+        tmp_path = "{}.{}.tmp".format(entry_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': self.VERSION, 'key': key, self.VALUE_NAME: value}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+
+class GraphCache(SerifxmlCache):
+    '''
+    On-disk cache of the networkx graphs GraphBuilder builds for a serifxml, keyed by the serifxml's path and
+    modification time (or content hash) and the parse types (dp/amr/mdp/tdp) the graphs were built with
+    '''
+
+    VERSION = GRAPH_CACHE_VERSION
+    VALUE_NAME = 'graphs'
+
+    def key(self, serifxml_path, parse_types, per_sentence):
+        '''
+        :param parse_types: {'dp': True, 'amr': True, 'mdp': False, 'tdp': False}
+        :return: json str uniquely identifying the cache entry
+        '''
+
+        return self.serifxml_key(serifxml_path, parse_types=parse_types, per_sentence=per_sentence)
+
+    def get(self, serifxml_path, parse_types, per_sentence):
+        '''
+        :return: list[networkx.classes.digraph.DiGraph], or None on a cache miss
+        '''
+
+        return self.read_entry(self.key(serifxml_path, parse_types, per_sentence))
+
+    def put(self, serifxml_path, parse_types, per_sentence, graphs):
+        '''
+        :param graphs: list[networkx.classes.digraph.DiGraph]
+        '''
+
+        self.write_entry(self.key(serifxml_path, parse_types, per_sentence), graphs)
@@ -0,0 +1,43 @@
+from .networkx_internals import digraph_from_dicts
+
+
+def encode_graph(G):
+    '''
+    Compact, picklable encoding of a graph for sending it between processes: node ids are listed once and edges refer
+    to them by position (instead of pickling both of networkx's nested adjacency dicts)
+
+    :param G: networkx.classes.digraph.DiGraph
+    :return: tuple (node ids, node attr dicts, (source position, target position, edge attr dict) triples, graph attrs)
+    '''
+
+    node_ids = list(G)
+    position = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    return (node_ids,
+            [G.nodes[node_id] for node_id in node_ids],
+            [(position[u], position[v], attrs) for u, v, attrs in G.edges(data=True)],
+            dict(G.graph))
+
+
+def decode_graph(encoded_graph):
+    '''
+    :param encoded_graph: output of encode_graph
+    :return: networkx.classes.digraph.DiGraph with the nodes and (successor) edges of the encoded graph in their
+             original order
+    '''
+
+    node_ids, node_attrs, edges, graph_attrs = encoded_graph
+
+    # fill networkx's adjacency dicts directly, this runs in the (single) receiving process for every graph
+    succ = {node_id: {} for node_id in node_ids}
+    pred = {node_id: {} for node_id in node_ids}
+    for u, v, attrs in edges:
+        u = node_ids[u]
+        v = node_ids[v]
+        succ[u][v] = attrs
+        pred[v][u] = attrs
+
+    G = digraph_from_dicts(dict(zip(node_ids, node_attrs)), succ, pred)
+    G.graph.update(graph_attrs)
+
+    return G
@@ -0,0 +1,104 @@
+import logging
+from enum import Enum
+
+from ..constants.common.attrs.edge.edge_attrs import EdgeAttrs
+from ..constants.common.attrs.node.node_attrs import NodeAttrs
+from .networkx_internals import node_dict, succ_dict
+
+
+class ValidationLevel(Enum):
+    '''how thoroughly GraphBuilder checks the graphs it builds'''
+
+    OFF = 1  # no checks (known-good parses)
+    FAST = 2  # check every edge as it is inserted (see IncrementalGraphValidator)
+    FULL = 3  # global DAG check and verify_graph_compliance pass over every finished graph
+
+
+class IncrementalGraphValidator():
+    '''
+    Checks a graph under construction one inserted edge at a time, instead of traversing the finished graph:
+    - both endpoints must carry a node type (verify_graph_compliance), i.e. the edge didn't implicitly create a node
+    - the edge must not close a cycle; like nx.find_cycle on the finished graph, only the first cycle is reported
+    Edges that can't close a cycle only need their endpoints that may be missing from G checked (check_node).
+
+    Cycles are only searched for along edges of the new edge's type. GraphBuilder's layers only meet at token nodes,
+    which only have (syntax) edges to other tokens, so no cycle can mix edge types.
+    '''
+
+    def __init__(self, G, description, check_compliance=True):
+        '''
+        :param G: networkx.classes.digraph.DiGraph the checked edges are inserted into
+        :param description: str, what G is, for the warning logged when a cycle is detected
+        :param check_compliance: whether to require node types on edge endpoints (off for graphs of a single layer,
+                                 whose edges may point to token nodes that aren't part of the graph)
+        '''
+
+        self.G = G
+        self.description = description
+        self.check_compliance = check_compliance
+        self.cycle = None
+
+    def check_node(self, node_id):
+        '''
+        :param node_id: endpoint of an edge already inserted into G that can't close a cycle (e.g. a token node)
+        '''
+
+        if self.check_compliance:
+            assert NodeAttrs.node_type in node_dict(self.G)[node_id], node_dict(self.G)[node_id]
+
+    def check_nodes(self, node_ids):
+        '''
+        :param node_ids: iterable of node ids, see check_node
+        '''
+
+        if self.check_compliance:
+            G_node = node_dict(self.G)
+            for node_id in node_ids:
+                assert NodeAttrs.node_type in G_node[node_id], G_node[node_id]
+
+    def check_edge(self, u, v):
+        '''
+        :param u: source node id of an edge already inserted into G
+        :param v: target node id of an edge already inserted into G
+        '''
+
+        # networkx's adjacency dicts, views over them cost more than the checks themselves
+        G_node = node_dict(self.G)
+        G_succ = succ_dict(self.G)
+
+        if self.check_compliance:
+            assert NodeAttrs.node_type in G_node[u], G_node[u]
+            assert NodeAttrs.node_type in G_node[v], G_node[v]
+
+        # an edge into a node without successors (e.g. a new AMR node, or a leaf token) can't close a cycle
+        if self.cycle is None and G_succ[v]:
+            path = self.find_path(v, u, G_succ[u][v].get(EdgeAttrs.edge_type, None))
+            if path is not None:
+                self.cycle = [(u, v)] + list(zip(path, path[1:]))
+                logging.warning("Cycle detected in %s" % self.description)
+                logging.warning(str(self.cycle))
+
+    def find_path(self, source, target, edge_type):
+        '''
+        :return: list of node ids from source to target along edges of edge_type, or None if there is no such path
+        '''
+
+        if source == target:
+            return [source]
+
+        parents = {source: None}
+        stack = [source]
+        while stack:
+            node = stack.pop()
+            for succ, attrs in succ_dict(self.G)[node].items():
+                if succ in parents or attrs.get(EdgeAttrs.edge_type, None) != edge_type:
+                    continue
+                parents[succ] = node
+                if succ == target:
+                    path = [succ]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return path[::-1]
+                stack.append(succ)
+
+        return None
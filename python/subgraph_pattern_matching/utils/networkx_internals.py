@@ -0,0 +1,55 @@
+import networkx as nx
+
+
+# The functions below read and assign the plain dicts a networkx DiGraph keeps its nodes and adjacency in (G._node,
+# G._succ = G._adj, G._pred), skipping the per-access views and per-edge bookkeeping of the public API where those cost
+# more than the work done on the graph. This layout is private to networkx and only relied upon under the
+# networkx == 2.8 pin in requirements.txt; all such access goes through this module, so it is the only place to check
+# (or switch to nx.DiGraph.add_edges_from / G.nodes / G.succ / G.pred) when networkx is upgraded.
+
+
+def node_dict(G):
+    '''
+    :param G: networkx.classes.digraph.DiGraph
+    :return: {node id: node attr dict} of G, must not be modified
+    '''
+
+    return G._node
+
+
+def succ_dict(G):
+    '''
+    :param G: networkx.classes.digraph.DiGraph
+    :return: {node id: {successor id: edge attr dict}} of G, must not be modified
+    '''
+
+    return G._succ
+
+
+def pred_dict(G):
+    '''
+    :param G: networkx.classes.digraph.DiGraph
+    :return: {node id: {predecessor id: edge attr dict}} of G, must not be modified
+    '''
+
+    return G._pred
+
+
+def digraph_from_dicts(node, succ, pred, graph_class=nx.DiGraph):
+    '''
+    Wrap already built node and adjacency dicts in a graph without copying them. Unlike add_nodes_from/add_edges_from,
+    the attribute dicts are shared as they are (e.g. with another graph, or ChainMap overlays of its dicts).
+
+    :param node: {node id: node attr dict}, in node order
+    :param succ: {node id: {successor id: edge attr dict}} with an entry for every node
+    :param pred: {node id: {predecessor id: edge attr dict}} with an entry for every node, consistent with succ
+    :param graph_class: networkx.classes.digraph.DiGraph or a subclass of it
+    :return: graph_class instance
+    '''
+
+    G = graph_class()
+    G._node = node
+    G._adj = G._succ = succ
+    G._pred = pred
+
+    return G
@@ -0,0 +1,105 @@
+import hashlib
+import os
+
+
+def stripe_for_path(serifxml_path, num_batches):
+    '''
+    Stable shard assignment of a document: depends only on the serifxml file name, so the same document lands in the
+    same stripe regardless of list order, list length or the machine that runs the job
+
+    :param serifxml_path: str
+    :param num_batches: int
+    :return: int in [0, num_batches)
+    '''
+
+    digest = hashlib.md5(os.path.basename(serifxml_path).encode('utf-8')).hexdigest()
+    return int(digest, 16) % num_batches
+
+
+def stripe_for_sentence(docid, sentence_id, num_batches):
+    '''
+    Stable shard assignment of a sentence, for per-sentence corpora held in a single serifxml (e.g. CoNLL, TACRED)
+    where striping by file would give every sentence to one stripe
+
+    :param docid: str, serif document id
+    :param sentence_id: str, serif sentence id
+    :param num_batches: int
+    :return: int in [0, num_batches)
+    '''
+
+    digest = hashlib.md5("{}\t{}".format(docid, sentence_id).encode('utf-8')).hexdigest()
+    return int(digest, 16) % num_batches
+
+
+def select_sentence_stripe(docid, sentence_ids, stripe, num_batches):
+    '''
+    :param docid: str
+    :param sentence_ids: list[str], ids of the sentences of document docid
+    :param stripe: int, index of the runjobs batch
+    :param num_batches: int
+    :return: list[int], indices of the sentences owned by stripe (in document order)
+    '''
+
+    if num_batches <= 1:
+        return list(range(len(sentence_ids)))
+
+    return [i for i, sentence_id in enumerate(sentence_ids)
+            if stripe_for_sentence(docid, sentence_id, num_batches) == stripe]
+
+
+def select_stripe(serifxml_paths, stripe, num_batches):
+    '''
+    :param serifxml_paths: list[str]
+    :param stripe: int, index of the runjobs batch
+    :param num_batches: int
+    :return: list[str], the paths owned by stripe (in input order)
+    '''
+
+    if num_batches <= 1:
+        return list(serifxml_paths)
+
+    return [p for p in serifxml_paths if stripe_for_path(p, num_batches) == stripe]
+
+
+def write_manifest_lines(lines, manifest_path):
+    '''
+    All stripes write identical content, so the file is written to a temporary path and moved into place to keep
+    concurrent jobs from interleaving.
+
+    :param lines: iterable of tuples, written tab-separated one per line
+    :param manifest_path: str
+    '''
+
+    tmp_path = "{}.{}.tmp".format(manifest_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        for line in lines:
+            f.write("\t".join(str(field) for field in line) + "\n")
+    os.replace(tmp_path, manifest_path)
+
+
+def write_stripe_manifest(serifxml_paths, num_batches, manifest_path):
+    '''
+    Write a "<serifxml_path>\t<stripe>" line for every document.
+
+    :param serifxml_paths: list[str]
+    :param num_batches: int
+    :param manifest_path: str
+    '''
+
+    write_manifest_lines(((serifxml_path, stripe_for_path(serifxml_path, num_batches))
+                          for serifxml_path in serifxml_paths), manifest_path)
+
+
+def write_sentence_stripe_manifest(serif_docs, num_batches, manifest_path):
+    '''
+    Write a "<serifxml_path>\t<docid>\t<sentence id>\t<stripe>" line for every sentence.
+
+    :param serif_docs: iterable of (serifxml_path, serif.theory.document.Document)
+    :param num_batches: int
+    :param manifest_path: str
+    '''
+
+    write_manifest_lines(((serifxml_path, serif_doc.docid, serif_sentence.id,
+                           stripe_for_sentence(serif_doc.docid, serif_sentence.id, num_batches))
+                          for serifxml_path, serif_doc in serif_docs
+                          for serif_sentence in serif_doc.sentences), manifest_path)